@@ -0,0 +1,61 @@
+import React, { useEffect, useState } from 'react';
+
+// Shapes written by src/scrapers/analytics.py
+export interface RatingBucket { name: string; value: number; percentage: string; color: string; }
+export interface Topic { name: string; value: number; sentiment: 'positive' | 'mixed' | 'negative'; color: string; }
+export interface NamedCount { name: string; value: number; }
+export interface KeyIssue { name: string; value: number; percentage: string; }
+export interface TrendPoint { month: string; rating: number; reviews: number; }
+export interface PlatformSummary { name: string; rating: number; reviews: number; color: string; }
+
+export interface DashboardData {
+  platform: 'appstore' | 'googleplay';
+  generated: string | null;
+  totalReviews: number;
+  averageRating: number;
+  ratingDistribution: RatingBucket[];
+  commonTopics: Topic[];
+  topWords: NamedCount[];
+  keyIssues: KeyIssue[];
+  negativeReviews: number;
+  ratingTrend: TrendPoint[];
+  versionIssues: NamedCount[];
+  developerResponse: { responded: number; rate: string } | null;
+  platformComparison: PlatformSummary[];
+}
+
+// Loads public/data/<platform>_analysis.json, regenerated by analytics.py without a rebuild
+export const useDashboardData = (platform: DashboardData['platform']) => {
+  const [data, setData] = useState<DashboardData | null>(null);
+  const [error, setError] = useState<string | null>(null);
+
+  useEffect(() => {
+    let cancelled = false;
+    fetch(`data/${platform}_analysis.json`)
+      .then(response => {
+        if (!response.ok) {
+          throw new Error(`HTTP ${response.status}`);
+        }
+        return response.json();
+      })
+      .then((loaded: DashboardData) => { if (!cancelled) setData(loaded); })
+      .catch((e: Error) => { if (!cancelled) setError(e.message); });
+    return () => { cancelled = true; };
+  }, [platform]);
+
+  return { data, error };
+};
+
+// Share of all topic mentions, as shown next to the most discussed topics
+export const topicShare = (topics: Topic[], index: number) => {
+  const total = topics.reduce((sum, topic) => sum + topic.value, 0);
+  return total ? `${((100 * topics[index].value) / total).toFixed(1)}%` : '0.0%';
+};
+
+export const DashboardStatus: React.FC<{ platform: string; error: string | null }> = ({ platform, error }) => (
+  <div className="container mx-auto p-4 text-center text-gray-600">
+    {error
+      ? `Could not load data/${platform}_analysis.json (${error}). Generate it with: python src/scrapers/analytics.py`
+      : 'Loading review analysis...'}
+  </div>
+);
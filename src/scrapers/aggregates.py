@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+"""
+Incremental dashboard aggregates kept next to the scraped outputs.
+
+Recomputing the dashboard from the whole review history after every sync
+wastes work, so an `AggregateSink` folds each batch of newly written
+reviews into mergeable partials: per-day and per-version rating
+histograms, topic and issue counts, and a count-min sketch with a top-k
+candidate list for words. Every partial merges by addition, so runs,
+sources and storefronts combine freely and the dashboard refreshes in
+O(new reviews).
+
+Aggregates live beside the review files as `<output base>.aggregates.json`
+plus the sketch in `<output base>.aggregates.npy`.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import analytics
+
+CMS_WIDTH = 1 << 16
+CMS_DEPTH = 4
+TOP_K_CANDIDATES = 200  # Words tracked for the top-k list, well above what the dashboard shows
+AGGREGATE_SUFFIX = '.aggregates'
+
+
+def aggregate_paths(file_base):
+    return f"{file_base}{AGGREGATE_SUFFIX}.json", f"{file_base}{AGGREGATE_SUFFIX}.npy"
+
+
+class CountMinSketch:
+    """Count-min sketch over words using double hashing, with vectorized updates"""
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH, table=None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.int64)
+
+    def _positions(self, words):
+        digests = [hashlib.blake2b(word.encode('utf-8'), digest_size=16).digest() for word in words]
+        h1 = np.array([int.from_bytes(digest[:8], 'little') for digest in digests], dtype=np.uint64)
+        h2 = np.array([int.from_bytes(digest[8:], 'little') | 1 for digest in digests], dtype=np.uint64)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1 + rows * h2) % np.uint64(self.width)).astype(np.int64)
+
+    def add(self, words, counts):
+        if not words:
+            return
+        positions = self._positions(words)
+        counts = np.asarray(counts, dtype=np.int64)
+        for row in range(self.depth):
+            np.add.at(self.table[row], positions[row], counts)
+
+    def estimate(self, words):
+        if not words:
+            return np.zeros(0, dtype=np.int64)
+        positions = self._positions(words)
+        return self.table[np.arange(self.depth)[:, None], positions].min(axis=0)
+
+    def merge(self, other):
+        if self.table.shape != other.table.shape:
+            raise ValueError(f"Cannot merge a {other.table.shape} sketch into a {self.table.shape} sketch")
+        self.table += other.table
+
+
+class Aggregates:
+    """Mergeable partial aggregates of one platform's reviews"""
+
+    def __init__(self, platform):
+        if platform not in analytics.PLATFORMS:
+            raise ValueError(f"Unknown platform {platform!r}; expected one of {', '.join(analytics.PLATFORMS)}")
+        self.platform = platform
+        self.topics = list(analytics.TOPICS[platform])
+        self.issues = list(analytics.ISSUES[platform])
+        self.days = {}  # 'YYYY-MM-DD' -> reviews per star rating (index 0 unused)
+        self.undated = [0] * 6
+        self.versions = {}  # version -> reviews per star rating
+        self.topic_counts = np.zeros(len(self.topics), dtype=np.int64)
+        self.topic_rating_sums = np.zeros(len(self.topics), dtype=np.int64)
+        self.issue_counts = np.zeros(len(self.issues), dtype=np.int64)  # Over negative reviews only
+        self.responded = 0
+        self.words = CountMinSketch()
+        self.candidates = {}  # Top-k candidate word -> estimated count
+
+    def fold(self, rows):
+        """Add a batch of scraped reviews (rows in any scraper's shape, or a DataFrame); returns how many were counted"""
+        reviews = analytics.normalize(pd.DataFrame(rows))
+        if reviews.empty:
+            return 0
+
+        ratings = reviews['rating'].to_numpy(dtype=np.int64)
+        negative = ratings <= analytics.NEGATIVE_MAX_RATING
+        words, topic_hits, issue_hits = analytics.analyze_texts(reviews['text'].tolist(), self.platform, workers=1)
+
+        dated = reviews['date'].notna()
+        by_day = reviews[dated].groupby([reviews.loc[dated, 'date'].dt.strftime('%Y-%m-%d'), 'rating']).size()
+        for (day, stars), count in by_day.items():
+            self.days.setdefault(day, [0] * 6)[stars] += int(count)
+        for stars, count in enumerate(np.bincount(ratings[~dated.to_numpy()], minlength=6)):
+            self.undated[stars] += int(count)
+        for (version, stars), count in reviews.dropna(subset=['version']).groupby(['version', 'rating'], observed=True).size().items():
+            self.versions.setdefault(str(version), [0] * 6)[stars] += int(count)
+
+        self.topic_counts += topic_hits.sum(axis=0)
+        self.topic_rating_sums += topic_hits.T.astype(np.int64) @ ratings
+        self.issue_counts += issue_hits[negative].sum(axis=0)
+        self.responded += int(reviews['replied'].sum())
+        self._add_words(words)
+        return len(reviews)
+
+    def _add_words(self, words):
+        self.words.add(list(words), list(words.values()))
+        self._refresh_candidates(set(self.candidates) | set(words))
+
+    def _refresh_candidates(self, words):
+        words = sorted(words)
+        estimates = self.words.estimate(words)
+        top = np.argsort(-estimates, kind='stable')[:TOP_K_CANDIDATES]
+        self.candidates = {words[i]: int(estimates[i]) for i in top}
+
+    def merge(self, other):
+        """Add another platform aggregate's partials into this one"""
+        if (other.platform, other.topics, other.issues) != (self.platform, self.topics, self.issues):
+            raise ValueError("Aggregates were built for a different platform or keyword set")
+        for day, counts in other.days.items():
+            mine = self.days.setdefault(day, [0] * 6)
+            self.days[day] = [a + b for a, b in zip(mine, counts)]
+        self.undated = [a + b for a, b in zip(self.undated, other.undated)]
+        for version, counts in other.versions.items():
+            mine = self.versions.setdefault(version, [0] * 6)
+            self.versions[version] = [a + b for a, b in zip(mine, counts)]
+        self.topic_counts += other.topic_counts
+        self.topic_rating_sums += other.topic_rating_sums
+        self.issue_counts += other.issue_counts
+        self.responded += other.responded
+        self.words.merge(other.words)
+        self._refresh_candidates(set(self.candidates) | set(other.candidates))
+        return self
+
+    def rating_counts(self):
+        counts = np.array(self.undated, dtype=np.int64)
+        for day_counts in self.days.values():
+            counts += day_counts
+        return counts
+
+    def by_month(self):
+        if not self.days:
+            return pd.DataFrame(columns=['mean', 'size'], index=pd.PeriodIndex([], freq='M'))
+        frame = pd.DataFrame.from_dict(self.days, orient='index', columns=range(6))
+        frame.index = pd.PeriodIndex(frame.index, freq='M')
+        monthly = frame.groupby(level=0).sum()
+        size = monthly.sum(axis=1)
+        return pd.DataFrame({'mean': (monthly * np.arange(6)).sum(axis=1) / size, 'size': size})
+
+    def version_counts(self):
+        """Negative reviews per version"""
+        return pd.Series({version: sum(counts[1:analytics.NEGATIVE_MAX_RATING + 1])
+                          for version, counts in self.versions.items()}, dtype=np.int64)
+
+    def top_words(self, k=analytics.TOP_WORDS):
+        return analytics.rank_words(self.candidates, k)
+
+    def dashboard(self):
+        return analytics.assemble_dashboard(
+            self.platform, self.rating_counts(), self.topic_counts, self.topic_rating_sums, self.top_words(),
+            self.issue_counts, self.by_month(), self.version_counts(), self.responded)
+
+    def save(self, file_base):
+        json_path, sketch_path = aggregate_paths(file_base)
+        state = {
+            'platform': self.platform,
+            'topics': self.topics,
+            'issues': self.issues,
+            'days': self.days,
+            'undated': self.undated,
+            'versions': self.versions,
+            'topic_counts': self.topic_counts.tolist(),
+            'topic_rating_sums': self.topic_rating_sums.tolist(),
+            'issue_counts': self.issue_counts.tolist(),
+            'responded': self.responded,
+            'candidates': self.candidates,
+        }
+        with open(f"{sketch_path}.tmp", 'wb') as f:
+            np.save(f, self.words.table)
+        with open(f"{json_path}.tmp", 'w') as f:
+            json.dump(state, f)
+        os.replace(f"{sketch_path}.tmp", sketch_path)
+        os.replace(f"{json_path}.tmp", json_path)
+
+    @classmethod
+    def load(cls, file_base):
+        json_path, sketch_path = aggregate_paths(file_base)
+        with open(json_path) as f:
+            state = json.load(f)
+        aggregates = cls(state['platform'])
+        if (state['topics'], state['issues']) != (aggregates.topics, aggregates.issues):
+            raise ValueError(f"{json_path} was built with other topic or issue keywords; rebuild it with `aggregates.py fold`")
+        aggregates.days = state['days']
+        aggregates.undated = state['undated']
+        aggregates.versions = state['versions']
+        aggregates.topic_counts = np.array(state['topic_counts'], dtype=np.int64)
+        aggregates.topic_rating_sums = np.array(state['topic_rating_sums'], dtype=np.int64)
+        aggregates.issue_counts = np.array(state['issue_counts'], dtype=np.int64)
+        aggregates.responded = state['responded']
+        aggregates.candidates = state['candidates']
+        table = np.load(sketch_path)
+        aggregates.words = CountMinSketch(table.shape[1], table.shape[0], table)
+        return aggregates
+
+
+class AggregateSink:
+    """
+    Sink that folds written batches into the aggregates beside `file_base`.
+
+    The batches are folded in memory and merged into the saved aggregates
+    on close. When not appending (a full re-scrape that rewrites the review
+    files) the saved aggregates are replaced instead. A resumable crawl
+    calls `checkpoint` with each of its checkpoints so the batches folded so
+    far survive a crash; pass the checkpoint's tag as `resume` to start from
+    them again.
+    """
+
+    def __init__(self, file_base, platform, append=False, resume=None):
+        self.file_base = file_base
+        self.append = append
+        self.delta = Aggregates(platform)
+        self.folded = 0
+        self._checkpoints = []
+        if resume is not None and os.path.exists(aggregate_paths(self._checkpoint_base(resume))[0]):
+            self.delta = Aggregates.load(self._checkpoint_base(resume))
+            self._checkpoints.append(resume)
+        self._remove_checkpoints(keep=self._checkpoints)
+
+    def _checkpoint_base(self, tag):
+        return f"{self.file_base}.checkpoint-{tag}"
+
+    def _remove_checkpoints(self, keep=()):
+        kept = {path for tag in keep for path in aggregate_paths(self._checkpoint_base(tag))}
+        for path in glob.glob(f"{glob.escape(self.file_base)}.checkpoint-*{AGGREGATE_SUFFIX}.*"):
+            if path not in kept:
+                os.remove(path)
+
+    def write_batch(self, rows):
+        self.folded += self.delta.fold(rows)
+
+    def checkpoint(self, tag):
+        """
+        Save the batches folded so far under `tag`. The previous checkpoint is
+        kept as well, in case the crawl dies before recording this one.
+        """
+        if tag not in self._checkpoints:
+            self.delta.save(self._checkpoint_base(tag))
+            self._checkpoints = self._checkpoints[-1:] + [tag]
+            self._remove_checkpoints(keep=self._checkpoints)
+
+    def close(self):
+        aggregates = self.delta
+        if self.append and os.path.exists(aggregate_paths(self.file_base)[0]):
+            aggregates = Aggregates.load(self.file_base).merge(self.delta)
+        aggregates.save(self.file_base)
+        self._remove_checkpoints()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self._checkpoints:
+            return  # The crawl resumes from its last checkpoint, which holds everything folded up to it
+        self.close()
+
+
+def merge_files(file_bases):
+    """Merge the aggregates of several outputs, one result per platform"""
+    merged = {}
+    for file_base in file_bases:
+        aggregates = Aggregates.load(file_base)
+        if aggregates.platform in merged:
+            merged[aggregates.platform].merge(aggregates)
+        else:
+            merged[aggregates.platform] = aggregates
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain incremental dashboard aggregates")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fold = subparsers.add_parser('fold', help="Fold existing review files into an output's aggregates (backfill)")
+    fold.add_argument('file_base', help="Output base name the aggregates are kept beside")
+    fold.add_argument('files', nargs='+', help="Review files (.ndjson, .csv, .parquet, .json)")
+    fold.add_argument('--platform', choices=analytics.PLATFORMS, required=True)
+    fold.add_argument('--append', action='store_true', help="Add to the existing aggregates instead of replacing them")
+
+    dashboard = subparsers.add_parser('dashboard', help="Write the dashboard JSON from saved aggregates")
+    dashboard.add_argument('file_bases', nargs='+', help="Output base names whose aggregates to merge")
+    dashboard.add_argument('--output-dir', default=analytics.DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'fold':
+        with AggregateSink(args.file_base, args.platform, append=args.append) as sink:
+            for path in args.files:
+                frame = analytics.read_reviews(path)
+                for start in range(0, len(frame), analytics.CHUNK_SIZE):
+                    sink.write_batch(frame.iloc[start:start + analytics.CHUNK_SIZE])
+        print(f"Folded {sink.folded} reviews into {aggregate_paths(args.file_base)[0]}")
+
+    elif args.command == 'dashboard':
+        dashboards = {platform: aggregates.dashboard() for platform, aggregates in merge_files(args.file_bases).items()}
+        comparison = analytics.platform_comparison(dashboards)
+        for dashboard_data in dashboards.values():
+            dashboard_data['platformComparison'] = comparison
+            print(f"Saved {analytics.write_dashboard(dashboard_data, os.path.abspath(args.output_dir))}")
+
+
+if __name__ == "__main__":
+    main()
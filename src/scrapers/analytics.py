@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+"""
+Compute the review dashboard data from scraped reviews.
+
+Reads the scrapers' outputs (NDJSON, CSV, Parquet, the `.json` summaries or
+the review store) and writes one JSON file per platform in the shape the
+React dashboard loads: rating distribution, topics, top words, key issues,
+monthly rating trend, problem versions and developer response rate.
+
+Ratings, months and versions are aggregated with vectorized pandas/NumPy
+group-bys. Tokenizing and topic tagging are the only per-review Python
+work, so the texts are split into chunks and handed to a process pool.
+"""
+import argparse
+import heapq
+import json
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import review_schema
+
+PLATFORMS = ('appstore', 'googleplay')
+PLATFORM_NAMES = {'appstore': 'App Store (iOS)', 'googleplay': 'Google Play (Android)'}
+PLATFORM_COLORS = {'appstore': '#0071E3', 'googleplay': '#3DDC84'}
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'public', 'data')
+OUTPUT_FILE = '{platform}_analysis.json'
+
+CHUNK_SIZE = 20000  # Reviews per tokenizing task
+MIN_PARALLEL_REVIEWS = 50000  # Below this the pool costs more than it saves
+TOP_WORDS = 10
+TOP_VERSIONS = 5
+TREND_MONTHS = 5
+NEGATIVE_MAX_RATING = 2  # 1-2 star reviews count as negative
+
+RATING_COLORS = {5: '#4CAF50', 4: '#8BC34A', 3: '#FFC107', 2: '#FF9800', 1: '#F44336'}
+SENTIMENT_COLORS = {'positive': '#4CAF50', 'mixed': '#FFC107', 'negative': '#F44336'}
+POSITIVE_MIN_RATING = 3.5  # Average rating of a topic's reviews
+NEGATIVE_MAX_AVERAGE = 2.5
+
+TOKEN_PATTERN = r"[a-z]+"
+STOPWORDS = frozenset("""
+a about after again all also am an and any are as at be because been before being but by can cant could
+did do does doing dont for from get got had has have having he her here him his how i if in into is it
+its ive just me more most my no not now of off on once one only or other our out over really same she
+should so some still such than that the their them then there these they this to too up very was we
+were what when where which while who why will with would you your
+""".split())
+MIN_WORD_LENGTH = 3
+
+# Topic and issue keywords, matched after lowercasing and dropping apostrophes.
+# "word*" matches any word starting with "word"; keywords with a space are
+# phrases. A review can belong to several topics and issues.
+TOPICS = {
+    'appstore': {
+        'Gym Network': ('gym', 'gyms', 'network', 'location*', 'studio*'),
+        'Customer Service': ('customer service', 'support', 'agent*', 'no response', 'contact*'),
+        'Billing Issues': ('bill*', 'charg*', 'refund*', 'cancel*'),
+        'App Functionality': ('works', 'easy', 'simple', 'intuitive', 'check in', 'checkin', 'scan*'),
+        'Workout Content': ('workout*', 'classes', 'video*', 'content'),
+        'Value for Money': ('price*', 'pricing', 'worth', 'value', 'money', 'expensive', 'cheap*'),
+        'Grocery Delivery': ('grocer*', 'delivery', 'food'),
+        'Insurance Integration': ('insurance', 'kaiser', 'medicare', 'humana', 'plan'),
+        'Technical Issues': ('crash*', 'bug*', 'error*', 'glitch*', 'freez*', 'slow'),
+        'Social Features': ('friend', 'friends', 'community', 'social', 'share'),
+    },
+    'googleplay': {
+        'App Crashes': ('crash*', 'keeps closing', 'closes itself'),
+        'Login Problems': ('login', 'log in', 'signin', 'sign in', 'password', 'logged out'),
+        'App Performance': ('slow', 'lag*', 'freez*', 'loading', 'hang*'),
+        'Gym Locator': ('gym', 'gyms', 'locat*', 'map', 'nearby'),
+        'Workout Content': ('workout*', 'classes', 'video*', 'content'),
+        'User Interface': ('interface', 'ui', 'design', 'navigat*', 'confusing'),
+        'Android Issues': ('android', 'samsung', 'pixel', 'phone', 'device'),
+        'Customer Service': ('customer service', 'support', 'no response', 'contact*'),
+        'Billing Issues': ('bill*', 'charg*', 'refund*', 'cancel*'),
+        'Insurance Integration': ('insurance', 'kaiser', 'medicare', 'humana'),
+    },
+}
+ISSUES = {
+    'appstore': {
+        'Gyms being removed from network without notice': ('gym removed', 'gyms removed', 'gym was removed', 'removed from the network',
+                                                           'removed from network', 'dropped my gym', 'no longer in the network'),
+        'Difficulty cancelling subscription': ('cancel*',),
+        'Problems getting refunds': ('refund*',),
+        'Charging after cancellation requests': ('charged after', 'still charg', 'still being charg', 'charging me after'),
+        'Misleading gym availability information': ('mislead*', 'not available', 'not accepted', 'not participating', 'false advertis'),
+        'Poor customer service responsiveness': ('customer service', 'no response', 'never heard', 'never responded', 'never got back'),
+        'Insurance integration confusion': ('insurance', 'kaiser', 'medicare'),
+    },
+    'googleplay': {
+        'App crashes': ('crash*',),
+        'Login problems': ('login', 'log in', 'signin', 'sign in', 'password'),
+        'Bug reported': ('bug*',),
+        'Android compatibility': ('android', 'samsung', 'pixel', 'compatib*'),
+        "App won't open": ('wont open', 'doesnt open', 'does not open', 'cant open', 'will not open', 'wont even open'),
+        'Cache/data issues': ('cache', 'clear data', 'cleared data', 'clearing data', 'clear the data'),
+        'App freezes/hangs': ('freez*', 'hang*', 'stuck'),
+        'Gym locator': ('gym locator', 'find a gym', 'find gym', 'map'),
+        'Billing issues': ('bill*', 'charg*', 'refund*'),
+    },
+}
+
+def read_reviews(path):
+    """Read one scraper output file into a DataFrame"""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    if path.endswith('.csv'):
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+    if path.endswith(('.ndjson', '.jsonl')):
+        import pyarrow as pa
+        import pyarrow.json as pa_json
+        try:
+            return pa_json.read_json(path).to_pandas()
+        except pa.ArrowInvalid:
+            # A column whose type changes from row to row; pandas reads it as objects
+            return pd.read_json(path, lines=True, dtype=False)
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return pd.DataFrame(data.get('reviews', []) if isinstance(data, dict) else data)
+
+
+def read_store(platform, root=None):
+    """Read one platform's reviews from the Parquet review store"""
+    import pyarrow.dataset as ds
+    import review_store
+
+    store = review_store.ReviewStore(root or review_store.REVIEW_STORE_DIR)
+    source = ds.field('source')
+    table = store.read(['title', 'content', 'rating', 'date', 'version'],
+                       source == 'googleplay' if platform == 'googleplay' else source != 'googleplay')
+    return table.to_pandas()
+
+
+def normalize(frame):
+    """
+    Reduce one file's reviews, whatever scraper wrote them, to the
+    rating/text/date/version/replied columns the analysis reads. Rows
+    without a usable 1-5 rating are dropped.
+    """
+    reviews = review_schema.normalize_batch(frame)
+    reviews = reviews[reviews['rating'] != review_schema.MISSING_RATING]
+    text = reviews['title'].fillna('') + ' ' + reviews['content'].fillna('')
+    normalized = pd.DataFrame({
+        'rating': reviews['rating'],
+        'text': text.str.strip(),
+        'date': reviews['date'],
+        'version': reviews['version'],
+        'replied': reviews['replied'],
+    })
+    return normalized.reset_index(drop=True)
+
+
+def load_reviews(paths=(), platform=None, store_root=None, use_store=False):
+    frames = [normalize(read_reviews(path)) for path in paths]
+    if use_store:
+        frames.append(normalize(read_store(platform, store_root)))
+    if not frames:
+        raise ValueError(f"No review files given for {platform}")
+    return pd.concat(frames, ignore_index=True)
+
+
+def _keyword_masks(keywords, vocabulary):
+    """Bitmask per vocabulary word of the keyword groups it belongs to"""
+    masks = np.zeros(len(vocabulary), dtype=np.uint32)
+    for bit, group in enumerate(keywords.values()):
+        words = [keyword for keyword in group if ' ' not in keyword]
+        if words:
+            pattern = '|'.join(re.escape(word[:-1]) + r'\w*' if word.endswith('*') else re.escape(word) for word in words)
+            masks[vocabulary.str.fullmatch(pattern).to_numpy(dtype=bool)] |= np.uint32(1 << bit)
+    return masks
+
+
+def _phrase_rows(phrase, word_codes, codes, rows):
+    """Rows whose token sequence contains `phrase`, found by stepping through the positions of its first word"""
+    try:
+        wanted = [word_codes[word] for word in phrase.split()]
+    except KeyError:
+        return rows[:0]
+    starts = np.flatnonzero(codes[:len(codes) - len(wanted) + 1] == wanted[0])
+    for offset, code in enumerate(wanted[1:], 1):
+        starts = starts[(codes[starts + offset] == code) & (rows[starts + offset] == rows[starts])]
+    return rows[starts]
+
+
+def _review_masks(keywords, vocabulary, word_codes, codes, rows, size):
+    """OR the keyword-group bits of every word in each review, then add the phrase matches"""
+    review_masks = np.zeros(size, dtype=np.uint32)
+    np.bitwise_or.at(review_masks, rows, _keyword_masks(keywords, vocabulary)[codes])
+    for bit, group in enumerate(keywords.values()):
+        for phrase in (keyword for keyword in group if ' ' in keyword):
+            review_masks[_phrase_rows(phrase, word_codes, codes, rows)] |= np.uint32(1 << bit)
+    return review_masks
+
+
+def _analyze_chunk(texts, platform):
+    """
+    Tokenize and tag one chunk of review texts.
+
+    The chunk's words are exploded into one column and factorized, so word
+    counts are a bincount, single-word keywords are matched once per
+    distinct word rather than once per review, and phrases are found by
+    comparing word codes at neighbouring positions. Returns the chunk's word counts and the
+    topic and issue bitmasks of each review.
+    """
+    texts = pd.Series(texts, dtype=object).fillna('').str.lower().str.replace(r"['’]", '', regex=True)
+    tokens = texts.str.findall(TOKEN_PATTERN).explode().dropna()
+    codes, vocabulary = pd.factorize(tokens)
+    vocabulary = pd.Series(vocabulary, dtype=object)
+    rows = tokens.index.to_numpy()
+    word_codes = {word: code for code, word in enumerate(vocabulary)}
+
+    counts = np.bincount(codes, minlength=len(vocabulary))
+    keep = (vocabulary.str.len() >= MIN_WORD_LENGTH) & ~vocabulary.isin(STOPWORDS)
+    words = dict(zip(vocabulary[keep], counts[keep.to_numpy()].tolist()))
+
+    topic_masks = _review_masks(TOPICS[platform], vocabulary, word_codes, codes, rows, len(texts))
+    issue_masks = _review_masks(ISSUES[platform], vocabulary, word_codes, codes, rows, len(texts))
+    return words, topic_masks, issue_masks
+
+
+def _unpack(masks, width):
+    """Bitmasks to a reviews x groups boolean matrix"""
+    return ((masks[:, None] >> np.arange(width, dtype=np.uint32)) & 1).astype(bool)
+
+
+def analyze_texts(texts, platform, workers=None, chunk_size=CHUNK_SIZE):
+    """Word counts and topic/issue matrices for all texts, chunked across a process pool"""
+    if max(len(TOPICS[platform]), len(ISSUES[platform])) > 32:
+        raise ValueError("At most 32 topics and 32 issues per platform fit in the bitmasks")
+    chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)] or [[]]
+    if len(texts) < MIN_PARALLEL_REVIEWS or workers == 1:
+        results = [_analyze_chunk(chunk, platform) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_analyze_chunk, chunks, [platform] * len(chunks)))
+
+    words = Counter()
+    for chunk_words, _, _ in results:
+        words.update(chunk_words)
+    topic_hits = _unpack(np.concatenate([masks for _, masks, _ in results]), len(TOPICS[platform]))
+    issue_hits = _unpack(np.concatenate([masks for _, _, masks in results]), len(ISSUES[platform]))
+    return words, topic_hits, issue_hits
+
+
+def _percentage(part, whole):
+    return f"{100 * part / whole:.1f}%" if whole else '0.0%'
+
+
+def _sentiment(average):
+    if average >= POSITIVE_MIN_RATING:
+        return 'positive'
+    if average <= NEGATIVE_MAX_AVERAGE:
+        return 'negative'
+    return 'mixed'
+
+
+def rating_distribution(counts):
+    """Chart rows for a rating histogram indexed by stars"""
+    total = int(counts[1:6].sum())
+    return [{
+        'name': f"{stars} Star{'s' if stars > 1 else ''}",
+        'value': int(counts[stars]),
+        'percentage': _percentage(counts[stars], total),
+        'color': RATING_COLORS[stars],
+    } for stars in range(5, 0, -1)]
+
+
+def common_topics(names, counts, rating_sums):
+    """Topics by mentions; sentiment follows the average rating of the reviews mentioning them"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = rating_sums / counts
+    topics = []
+    for column in np.argsort(-counts, kind='stable'):
+        if not counts[column]:
+            continue
+        sentiment = _sentiment(averages[column])
+        topics.append({'name': names[column], 'value': int(counts[column]),
+                       'sentiment': sentiment, 'color': SENTIMENT_COLORS[sentiment]})
+    return topics
+
+
+def key_issues(names, counts, negative_total):
+    """Issues counted over negative reviews, most frequent first"""
+    return [{'name': names[column], 'value': int(counts[column]), 'percentage': _percentage(counts[column], negative_total)}
+            for column in np.argsort(-counts, kind='stable') if counts[column]]
+
+
+def monthly_ratings(reviews):
+    """Average rating and review count per calendar month"""
+    dated = reviews.dropna(subset=['date'])
+    return dated.groupby(dated['date'].dt.tz_localize(None).dt.to_period('M'))['rating'].agg(['mean', 'size'])
+
+
+def rating_trend(by_month, months=TREND_MONTHS):
+    """The last `months` rows of a frame indexed by monthly period with 'mean' and 'size' columns"""
+    return [{'month': period.strftime('%b %Y'), 'rating': round(float(row['mean']), 2), 'reviews': int(row['size'])}
+            for period, row in by_month.sort_index().tail(months).iterrows()]
+
+
+def version_issues(counts, top=TOP_VERSIONS):
+    """Versions with the most negative reviews, from a Series of counts indexed by version"""
+    counts = counts[counts > 0].sort_values(ascending=False, kind='stable').head(top)
+    return [{'name': str(version), 'value': int(count)} for version, count in counts.items()]
+
+
+def rank_words(counts, k=TOP_WORDS):
+    """The `k` most frequent words, ties broken alphabetically so every way of counting ranks them alike"""
+    return heapq.nsmallest(k, counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+def assemble_dashboard(platform, rating_counts, topic_counts, topic_rating_sums, top_words, issue_counts,
+                       by_month, version_counts, responded):
+    """The dashboard JSON from already aggregated counts"""
+    rating_counts = np.asarray(rating_counts, dtype=np.int64)
+    total = int(rating_counts[1:6].sum())
+    negative = int(rating_counts[1:NEGATIVE_MAX_RATING + 1].sum())
+    rating_sum = int((rating_counts[1:6] * np.arange(1, 6)).sum())
+    return {
+        'platform': platform,
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'totalReviews': total,
+        'averageRating': round(rating_sum / total, 2) if total else None,
+        'ratingDistribution': rating_distribution(rating_counts),
+        'commonTopics': common_topics(list(TOPICS[platform]), np.asarray(topic_counts), np.asarray(topic_rating_sums, dtype=np.float64)),
+        'topWords': [{'name': word, 'value': int(count)} for word, count in top_words],
+        'keyIssues': key_issues(list(ISSUES[platform]), np.asarray(issue_counts), negative),
+        'negativeReviews': negative,
+        'ratingTrend': rating_trend(by_month),
+        'versionIssues': version_issues(version_counts),
+        'developerResponse': {'responded': responded, 'rate': _percentage(responded, total)} if responded else None,
+    }
+
+
+def build_dashboard(reviews, platform, workers=None):
+    """All dashboard aggregates for one platform's reviews"""
+    ratings = reviews['rating'].to_numpy(dtype=np.int64)
+    negative = ratings <= NEGATIVE_MAX_RATING
+    words, topic_hits, issue_hits = analyze_texts(reviews['text'].tolist(), platform, workers)
+
+    return assemble_dashboard(
+        platform,
+        np.bincount(ratings, minlength=6),
+        topic_hits.sum(axis=0),
+        # Rating sum of each topic's reviews in one matrix product
+        topic_hits.T @ ratings.astype(np.float64),
+        rank_words(words),
+        issue_hits[negative].sum(axis=0),
+        monthly_ratings(reviews),
+        reviews.loc[negative, 'version'].dropna().value_counts(),
+        int(reviews['replied'].sum()),
+    )
+
+
+def platform_comparison(dashboards):
+    return [{'name': PLATFORM_NAMES[platform], 'rating': dashboard['averageRating'],
+             'reviews': dashboard['totalReviews'], 'color': PLATFORM_COLORS[platform]}
+            for platform, dashboard in dashboards.items()]
+
+
+def write_dashboard(dashboard, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, OUTPUT_FILE.format(platform=dashboard['platform']))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dashboard, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the dashboard data from scraped review files")
+    parser.add_argument('--appstore', nargs='+', default=[], help="App Store review files (.ndjson, .csv, .parquet, .json)")
+    parser.add_argument('--googleplay', nargs='+', default=[], help="Google Play review files")
+    parser.add_argument('--store', action='store_true', help="Also read both platforms from the Parquet review store")
+    parser.add_argument('--store-root', help="Review store directory")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help="Where the dashboard JSON files go (default: public/data)")
+    parser.add_argument('--workers', type=int, help="Tokenizing processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    inputs = {'appstore': args.appstore, 'googleplay': args.googleplay}
+    dashboards = {}
+    for platform in PLATFORMS:
+        if not inputs[platform] and not args.store:
+            continue
+        started = time.monotonic()
+        reviews = load_reviews(inputs[platform], platform, args.store_root, args.store)
+        if reviews.empty:
+            print(f"No {platform} reviews found; skipping")
+            continue
+        dashboards[platform] = build_dashboard(reviews, platform, args.workers)
+        print(f"Analyzed {len(reviews)} {platform} reviews in {time.monotonic() - started:.1f}s")
+
+    if not dashboards:
+        parser.error("give review files with --appstore/--googleplay or read the review store with --store")
+
+    comparison = platform_comparison(dashboards)
+    for dashboard in dashboards.values():
+        dashboard['platformComparison'] = comparison
+        print(f"Saved {write_dashboard(dashboard, os.path.abspath(args.output_dir))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,144 +1,133 @@
 #!/usr/bin/env python
-import time
+import argparse
+import threading
 import json
-import pandas as pd
-from bs4 import BeautifulSoup
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
-# First, let's install selenium if not present
-try:
-    from selenium import webdriver
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.chrome.options import Options
-    from selenium.webdriver.chrome.service import Service
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-    from selenium.common.exceptions import TimeoutException
-    selenium_available = True
-except ImportError:
-    print("Selenium not installed. Installing...")
-    import subprocess
-    subprocess.check_call(["pip", "install", "selenium", "webdriver-manager"])
-    from selenium import webdriver
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.chrome.options import Options
-    from selenium.webdriver.chrome.service import Service
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-    from selenium.common.exceptions import TimeoutException
-    from webdriver_manager.chrome import ChromeDriverManager
-    selenium_available = True
+import itunes_lookup
+import metrics
+import rate_limit
+import review_parser
+import sinks
+
+import browser_pool
 
 # App details
 APP_ID = '6499447981'
 APP_NAME = 'one-pass'
 OUTPUT_FILE_BASE = f"{APP_NAME.replace('-', '_')}_appstore_reviews_browser"
 APP_STORE_URL = f"https://apps.apple.com/us/app/{APP_NAME}/id{APP_ID}"
+OUTPUT_FORMATS = ('ndjson', 'csv')
+
+# Scroll loading waits on the DOM instead of fixed sleeps
+REVIEW_SELECTOR = review_parser.REVIEW_SELECTOR
+RATINGS_SELECTOR = ".we-customer-ratings__averages"
+MAX_REVIEWS = 500  # Stop scrolling once this many review cards are loaded
+PAGE_LOAD_TIMEOUT = 20
+GROWTH_TIMEOUT = 3  # Seconds to wait for new cards after a scroll before treating the list as complete
+POLL_INTERVAL = 0.2
 
 def fetch_app_metadata():
     """Fetch basic app metadata from iTunes API"""
-    lookup_url = f"https://itunes.apple.com/lookup?id={APP_ID}&country=us"
-    
-    try:
-        response = requests.get(lookup_url)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get('resultCount', 0) > 0:
-            print("Successfully fetched app metadata")
-            return data['results'][0]
-        else:
-            print("No app metadata found")
-            return {}
-    except Exception as e:
-        print(f"Error fetching app metadata: {e}")
-        return {}
+    return itunes_lookup.fetch_app_metadata(APP_ID)
 
 def setup_browser():
-    """Set up the Chrome browser with appropriate options"""
-    options = Options()
-    options.add_argument("--headless")  # Run in headless mode (no visible browser)
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36")
-    
+    """Set up a headless Chrome browser with images, fonts and CSS blocked"""
+    return browser_pool.create_driver()
+
+def app_store_url(app_id, app_name=None, country='us'):
+    """App Store page URL; the name slug is optional for apps.apple.com"""
+    if app_name:
+        return f"https://apps.apple.com/{country}/app/{app_name}/id{app_id}"
+    return f"https://apps.apple.com/{country}/app/id{app_id}"
+
+def count_reviews(driver):
+    """Number of review cards currently in the DOM"""
+    return driver.execute_script(f"return document.querySelectorAll('{REVIEW_SELECTOR}').length;")
+
+def session_alive(driver):
+    """Whether the driver still answers commands"""
+    from selenium.common.exceptions import WebDriverException
+
     try:
-        # Try to use the webdriver manager to get the driver
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=options)
-    except:
-        # Fallback if webdriver_manager is not available
-        driver = webdriver.Chrome(options=options)
-    
-    return driver
+        driver.execute_script("return 1;")
+        return True
+    except WebDriverException:
+        return False
+
+def wait_for_page(driver, timeout=PAGE_LOAD_TIMEOUT):
+    """Wait until the document has loaded and the ratings block (or a review) is present"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(
+        lambda d: d.execute_script("return document.readyState") == "complete"
+        and d.find_elements(By.CSS_SELECTOR, f"{RATINGS_SELECTOR}, {REVIEW_SELECTOR}")
+    )
+
+def scroll_to_load_reviews(driver, max_reviews=MAX_REVIEWS, growth_timeout=GROWTH_TIMEOUT, on_growth=None):
+    """
+    Scroll the last review card into view until no new cards appear within
+    `growth_timeout` seconds or `max_reviews` are loaded. `on_growth` is
+    called whenever new cards have appeared. Returns the final review count.
+    """
+    from selenium.common.exceptions import (InvalidSessionIdException, NoSuchWindowException, TimeoutException,
+                                            WebDriverException)
+    from selenium.webdriver.support.ui import WebDriverWait
 
-def scroll_to_load_reviews(driver, num_scrolls=5):
-    """Scroll down to load more reviews"""
+    count = 0
     try:
-        # Wait for the reviews section to be visible
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, ".we-customer-ratings__averages"))
-        )
+        wait_for_page(driver)
+        count = count_reviews(driver)
         
-        # Find the reviews section
-        reviews_section = driver.find_element(By.CSS_SELECTOR, ".we-customer-review")
-        
-        # Scroll down to load more reviews
-        for _ in range(num_scrolls):
-            driver.execute_script("arguments[0].scrollIntoView(true);", reviews_section)
-            driver.execute_script("window.scrollBy(0, 500);")
-            time.sleep(2)  # Wait for reviews to load
+        while 0 < count < max_reviews:
+            driver.execute_script(
+                f"var cards = document.querySelectorAll('{REVIEW_SELECTOR}');"
+                "cards[cards.length - 1].scrollIntoView(true); window.scrollBy(0, 500);"
+            )
+            try:
+                previous = count
+                WebDriverWait(driver, growth_timeout, poll_frequency=POLL_INTERVAL).until(
+                    lambda d: count_reviews(d) > previous
+                )
+            except TimeoutException:
+                break  # The count stopped growing: everything the page will load is loaded
+            count = count_reviews(driver)
+            if on_growth:
+                on_growth()
             
     except TimeoutException:
         print("Timed out waiting for reviews section to load")
+    except (InvalidSessionIdException, NoSuchWindowException):
+        raise  # The browser is gone; the pool must see it to discard the driver
+    except WebDriverException as e:
+        if not session_alive(driver):
+            raise  # A crashed or disconnected driver
+        # A script or element error on a healthy page: keep the reviews loaded so far
+        print(f"Error scrolling for reviews: {e}")
     except Exception as e:
         print(f"Error scrolling for reviews: {e}")
+    return count
 
-def extract_reviews(driver):
-    """Extract reviews from the loaded page"""
-    reviews = []
-    soup = BeautifulSoup(driver.page_source, 'html.parser')
-    
-    try:
-        review_elements = soup.select(".we-customer-review")
-        
-        if not review_elements:
-            print("No review elements found. Check if the CSS selector is still valid.")
-            return reviews
-        
-        for idx, review_element in enumerate(review_elements):
-            try:
-                # Extract review data
-                title_element = review_element.select_one(".we-customer-review__title")
-                content_element = review_element.select_one(".we-customer-review__body")
-                rating_element = review_element.select_one(".we-customer-review__rating")
-                author_element = review_element.select_one(".we-customer-review__user")
-                date_element = review_element.select_one(".we-customer-review__date")
-                
-                # Build review object
-                review = {
-                    'id': f"appstore_review_{idx+1}",
-                    'title': title_element.text.strip() if title_element else "No Title",
-                    'content': content_element.text.strip() if content_element else "No Content",
-                    'rating': int(rating_element['aria-label'].split()[0]) if rating_element and 'aria-label' in rating_element.attrs else None,
-                    'author': author_element.text.strip() if author_element else "Anonymous",
-                    'date': date_element.text.strip() if date_element else datetime.now().strftime("%Y-%m-%d"),
-                    'version': "N/A",  # App Store doesn't always show version in reviews
-                    'source': "App Store Browser Automation"
-                }
-                
-                reviews.append(review)
-                
-            except Exception as e:
-                print(f"Error extracting review {idx+1}: {e}")
-                continue
-    
-    except Exception as e:
-        print(f"Error finding review elements: {e}")
+def scrape_app_page(driver, url, app_id):
+    """Load one App Store page in `driver` and return its reviews tagged with the app id"""
+    rate_limit.limiter_for_url(url).acquire()
+    with metrics.stage('page_load', 'browser'):
+        driver.get(url)
+    print(f"Loaded App Store page: {url}")
     
+    # Scroll until the review list stops growing, parsing only the cards each scroll adds
+    extractor = review_parser.IncrementalReviewExtractor(driver)
+    reviews = []
+    with metrics.stage('scroll', 'browser'):
+        scroll_to_load_reviews(driver, on_growth=lambda: reviews.extend(extractor.extract_new()))
+    reviews.extend(extractor.extract_new())
+    if not reviews:
+        print("No review elements found. Check if the CSS selector is still valid.")
+    for review in reviews:
+        review['app_id'] = str(app_id)
+    print(f"Extracted {len(reviews)} reviews from {url}.")
     return reviews
 
 def scrape_app_store_reviews():
@@ -154,21 +143,11 @@ def scrape_app_store_reviews():
     try:
         # Set up and use the browser
         driver = setup_browser()
-        driver.get(APP_STORE_URL)
-        print(f"Loaded App Store page: {APP_STORE_URL}")
-        
-        # Wait for the page to load
-        time.sleep(5)
-        
-        # Scroll to load more reviews
-        scroll_to_load_reviews(driver, num_scrolls=10)
-        
-        # Extract reviews from the page
-        reviews = extract_reviews(driver)
-        print(f"Extracted {len(reviews)} reviews from the App Store page.")
-        
-        # Close the browser
-        driver.quit()
+        try:
+            reviews = scrape_app_page(driver, APP_STORE_URL, APP_ID)
+        finally:
+            # Close the browser
+            driver.quit()
         
     except Exception as e:
         print(f"Error during browser automation: {e}")
@@ -188,17 +167,52 @@ def scrape_app_store_reviews():
             reviews.append(fallback_review)
     
     # Save the results
-    save_data(metadata, reviews)
+    with metrics.stage('serialize', 'save_data', len(reviews)):
+        save_data(metadata, reviews)
     
     return reviews
 
+def scrape_many_apps(app_ids, country='us', workers=browser_pool.POOL_SIZE,
+                     output_file_base='appstore_reviews_browser', formats=OUTPUT_FORMATS):
+    """
+    Scrape several apps' pages with a pool of warm browsers, streaming each
+    app's reviews to the shared output as soon as its page is done.
+    Returns a dict of app id -> number of reviews written.
+    """
+    counts = {}
+    write_lock = threading.Lock()
+    
+    with browser_pool.BrowserPool(size=workers) as pool, \
+            sinks.open_sinks(output_file_base, formats) as sink:
+        
+        def scrape(app_id):
+            with pool.driver() as driver:
+                reviews = scrape_app_page(driver, app_store_url(app_id, country=country), app_id)
+            with write_lock:
+                sink.write_batch(reviews)
+            return len(reviews)
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(scrape, app_id): app_id for app_id in dict.fromkeys(map(str, app_ids))}
+            for future in as_completed(futures):
+                app_id = futures[future]
+                try:
+                    counts[app_id] = future.result()
+                except Exception as e:
+                    print(f"Error scraping app {app_id}: {e}")
+                    counts[app_id] = 0
+    
+    print(f"Saved {sum(counts.values())} reviews for {len(counts)} apps to {output_file_base}.*")
+    return counts
+
 def save_data(metadata, reviews):
-    """Save app metadata and reviews to JSON and CSV files"""
+    """Save app metadata to JSON and stream the reviews to NDJSON and CSV files"""
     output = {
         'app_id': APP_ID,
         'app_name': APP_NAME,
         'metadata': metadata,
-        'reviews': reviews,
+        'review_files': [f"{OUTPUT_FILE_BASE}.{fmt}" for fmt in OUTPUT_FORMATS],
+        'total_reviews': len(reviews),
         'app_store_url': APP_STORE_URL,
         'scrape_date': datetime.now().isoformat()
     }
@@ -207,21 +221,32 @@ def save_data(metadata, reviews):
     json_filename = f"{OUTPUT_FILE_BASE}.json"
     with open(json_filename, 'w') as f:
         json.dump(output, f, indent=2, ensure_ascii=False)
-    print(f"Saved app metadata and reviews to {json_filename}")
+    print(f"Saved app metadata to {json_filename}")
     
-    # Save reviews to CSV
+    # Save reviews
     if reviews:
-        csv_filename = f"{OUTPUT_FILE_BASE}.csv"
-        df = pd.DataFrame(reviews)
-        df.to_csv(csv_filename, index=False)
-        print(f"Saved {len(reviews)} reviews to {csv_filename}")
+        with sinks.open_sinks(OUTPUT_FILE_BASE, OUTPUT_FORMATS) as sink:
+            sink.write_batch(reviews)
+        print(f"Saved {len(reviews)} reviews to {OUTPUT_FILE_BASE}.*")
 
 if __name__ == "__main__":
-    if not selenium_available:
-        print("Error: Selenium could not be installed or imported. Browser automation requires Selenium.")
-        print(f"Please manually install with: pip install selenium webdriver-manager")
+    parser = argparse.ArgumentParser(description="Scrape App Store reviews with a headless browser")
+    parser.add_argument('app_ids', nargs='*', help="App Store ids to scrape with the browser pool (default: the one-pass app)")
+    parser.add_argument('--country', default='us')
+    parser.add_argument('--workers', type=int, default=browser_pool.POOL_SIZE, help="Number of browsers to run in parallel")
+    parser.add_argument('--output', default='appstore_reviews_browser', help="Output file base for multi-app runs")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    
+    if not browser_pool.SELENIUM_AVAILABLE:
+        print("Error: Selenium is not installed. Browser automation requires Selenium.")
+        print("Please install it with: pip install selenium webdriver-manager")
         exit(1)
     
     print("Starting App Store review scraper using browser automation...")
-    scrape_app_store_reviews()
-    print("\nDone! Check output files for results.") 
\ No newline at end of file
+    with metrics.session(args, 'appstore_browser'):
+        if args.app_ids:
+            scrape_many_apps(args.app_ids, country=args.country, workers=args.workers, output_file_base=args.output)
+        else:
+            scrape_app_store_reviews()
+    print("\nDone! Check output files for results.")
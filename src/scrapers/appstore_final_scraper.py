@@ -1,7 +1,13 @@
 #!/usr/bin/env python
-import requests
+import argparse
+import csv
+import dedup
+import http_client
+import itunes_lookup
 import json
-import pandas as pd
+import metrics
+import review_parser
+import sinks
 import time
 from datetime import datetime
 
@@ -9,6 +15,8 @@ from datetime import datetime
 APP_ID = '6499447981'
 APP_NAME = 'one-pass'
 OUTPUT_FILE_BASE = f"{APP_NAME.replace('-', '_')}_appstore_reviews"
+OUTPUT_FORMATS = ('ndjson', 'csv')
+METADATA_CSV = f"{OUTPUT_FILE_BASE}_metadata.csv"
 
 # Standard User-Agent
 USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.5 Safari/605.1.15'
@@ -17,28 +25,14 @@ def fetch_app_metadata():
     """
     Fetch app information using the iTunes Lookup API
     """
-    lookup_url = f"https://itunes.apple.com/lookup?id={APP_ID}&country=us"
-    
-    try:
-        print(f"Fetching app metadata for {APP_NAME} (ID: {APP_ID})...")
-        response = requests.get(lookup_url)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get('resultCount', 0) > 0:
-            print("Successfully fetched app metadata")
-            return data['results'][0]
-        else:
-            print("No app metadata found")
-            return {}
-    except Exception as e:
-        print(f"Error fetching app metadata: {e}")
-        return {}
+    print(f"Fetching app metadata for {APP_NAME} (ID: {APP_ID})...")
+    return itunes_lookup.fetch_app_metadata(APP_ID)
 
-def extract_customer_reviews():
+def extract_customer_reviews(sink):
     """
     Attempt to get reviews directly from the app's web page
-    by parsing it (since the API endpoints are restricted)
+    by parsing it (since the API endpoints are restricted),
+    writing them to the sink; returns the number of reviews found
     """
     url = f"https://apps.apple.com/us/app/{APP_NAME}/id{APP_ID}"
     headers = {
@@ -49,11 +43,14 @@ def extract_customer_reviews():
     
     try:
         print("Fetching App Store page to extract available reviews...")
-        response = requests.get(url)
-        content = response.text
+        response = http_client.get(url, headers=headers)
         
-        # Extract review data manually
-        reviews = []
+        # The page server-renders a handful of recent reviews
+        reviews = review_parser.parse_reviews(response.text)
+        if reviews:
+            print(f"Extracted {len(reviews)} reviews embedded in the App Store page")
+            sink.write_batch(reviews)
+            return len(reviews)
         
         # Since we can't directly access the review API, we'll create a mock review 
         # with basic app info and a note indicating the limitation
@@ -67,23 +64,24 @@ def extract_customer_reviews():
             'version': 'N/A',
             'link': url
         }
-        reviews.append(mock_review)
+        sink.write_batch([mock_review])
         
         print("Created a placeholder review with App Store link")
         
-        return reviews
+        return 1
     
     except Exception as e:
         print(f"Error extracting reviews from App Store page: {e}")
-        return []
+        return 0
 
-def save_data(metadata, reviews):
-    """Save app metadata and any available reviews to JSON and CSV files"""
+def save_data(metadata, total_reviews):
+    """Save app metadata and a summary of the streamed review files to JSON, and the metadata to CSV"""
     output = {
         'app_id': APP_ID,
         'app_name': APP_NAME,
         'metadata': metadata,
-        'reviews': reviews,
+        'review_files': [f"{OUTPUT_FILE_BASE}.{fmt}" for fmt in OUTPUT_FORMATS],
+        'total_reviews': total_reviews,
         'note': 'Direct access to App Store reviews is limited. To view the actual reviews, please visit the App Store page.',
         'app_store_url': f"https://apps.apple.com/us/app/{APP_NAME}/id{APP_ID}"
     }
@@ -94,8 +92,8 @@ def save_data(metadata, reviews):
         json.dump(output, f, indent=2, ensure_ascii=False)
     print(f"Saved app metadata and information to {json_filename}")
     
-    # Save basic info to CSV (just the metadata fields)
-    csv_filename = f"{OUTPUT_FILE_BASE}.csv"
+    # Save basic info to CSV (just the metadata fields); the reviews have their own CSV
+    csv_filename = METADATA_CSV
     
     if metadata:
         # Extract relevant fields from metadata
@@ -115,24 +113,35 @@ def save_data(metadata, reviews):
             'appStoreUrl': f"https://apps.apple.com/us/app/{APP_NAME}/id{APP_ID}"
         }
         
-        # Convert to DataFrame and save
-        df = pd.DataFrame([metadata_df])
-        df.to_csv(csv_filename, index=False)
+        with open(csv_filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(metadata_df))
+            writer.writeheader()
+            writer.writerow(metadata_df)
         print(f"Saved app metadata to {csv_filename}")
     else:
         print("No metadata available to save to CSV")
 
 def main():
-    print(f"Extracting data for {APP_NAME} (ID: {APP_ID})...")
+    parser = argparse.ArgumentParser(description="Fetch App Store metadata and explain the review API restrictions")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
     
-    # Fetch app metadata using iTunes API
-    metadata = fetch_app_metadata()
-    
-    # Try to get any review information we can
-    reviews = extract_customer_reviews()
+    print(f"Extracting data for {APP_NAME} (ID: {APP_ID})...")
     
-    # Save the results
-    save_data(metadata, reviews)
+    with metrics.session(args, 'appstore_final'):
+        # Fetch app metadata using iTunes API
+        metadata = fetch_app_metadata()
+        
+        # Try to get any review information we can, writing it out as it is parsed
+        output_sink = sinks.open_sinks(OUTPUT_FILE_BASE, OUTPUT_FORMATS)
+        with dedup.DedupSink(output_sink, dedup.open_output_index(OUTPUT_FILE_BASE, False)) as sink:
+            extract_customer_reviews(sink)
+            total_reviews = sink.written
+        print(f"Saved {total_reviews} reviews to {OUTPUT_FILE_BASE}.*")
+        
+        # Save the metadata and review summary
+        with metrics.stage('serialize', 'save_data'):
+            save_data(metadata, total_reviews)
     
     print("\nNOTE: Due to Apple's API restrictions, direct programmatic access to App Store reviews is highly limited.")
     print(f"To view the actual reviews, please visit the App Store page: https://apps.apple.com/us/app/{APP_NAME}/id{APP_ID}")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Benchmark review extraction against the saved App Store fixture.
+
+The fixture's review cards are repeated to build a page with --reviews
+cards, which each backend parses in full and incrementally (in batches of
+--batch cards, as the browser scraper does while scrolling). Results are
+reported as milliseconds per 1,000 reviews and can be appended to a JSON
+lines file with --output to track them over time.
+
+Run from src/scrapers: python benchmarks/bench_review_parser.py
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import review_parser
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'appstore_reviews.html')
+START_MARKER = '<!-- reviews -->'
+END_MARKER = '<!-- /reviews -->'
+
+
+def load_fixture(path=FIXTURE):
+    """Split the fixture into (head, card fragments, tail)"""
+    with open(path, encoding='utf-8') as f:
+        html = f.read()
+    start = html.index(START_MARKER) + len(START_MARKER)
+    end = html.index(END_MARKER)
+    body = html[start:end]
+    card_start = '<div class="we-customer-review '
+    cards = [card_start + part for part in body.split(card_start)[1:]]
+    return html[:start], cards, html[end:]
+
+
+def build_cards(cards, count):
+    return [cards[i % len(cards)] for i in range(count)]
+
+
+def best_of(repeats, fn):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def parse_full(head, cards, tail, backend):
+    return review_parser.parse_reviews(head + ''.join(cards) + tail, backend=backend)
+
+
+def parse_incremental(cards, batch, backend):
+    reviews = []
+    for start in range(0, len(cards), batch):
+        fragment = f"<div>{''.join(cards[start:start + batch])}</div>"
+        reviews.extend(review_parser.parse_reviews(fragment, start_index=start, backend=backend))
+    return reviews
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark App Store review HTML extraction")
+    parser.add_argument('--reviews', type=int, default=1000, help="Review cards on the synthetic page")
+    parser.add_argument('--batch', type=int, default=10, help="Cards added per scroll in incremental mode")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--backends', nargs='+', default=list(review_parser.BACKENDS), choices=review_parser.BACKENDS)
+    parser.add_argument('--output', help="Append results as a JSON line to this file")
+    args = parser.parse_args()
+
+    head, fixture_cards, tail = load_fixture()
+    cards = build_cards(fixture_cards, args.reviews)
+    results = {}
+
+    for backend in args.backends:
+        try:
+            full_seconds, full_reviews = best_of(args.repeats, lambda: parse_full(head, cards, tail, backend))
+            incremental_seconds, incremental_reviews = best_of(args.repeats, lambda: parse_incremental(cards, args.batch, backend))
+        except ImportError as e:
+            print(f"Skipping {backend}: {e}")
+            continue
+
+        assert len(full_reviews) == len(incremental_reviews) == args.reviews, "parsed review count mismatch"
+        results[backend] = {
+            'full_ms_per_1000': full_seconds * 1000 * 1000 / args.reviews,
+            'incremental_ms_per_1000': incremental_seconds * 1000 * 1000 / args.reviews,
+        }
+        print(f"{backend:5s} full: {results[backend]['full_ms_per_1000']:8.2f} ms/1000 reviews   "
+              f"incremental (batch {args.batch}): {results[backend]['incremental_ms_per_1000']:8.2f} ms/1000 reviews")
+
+    if args.output:
+        record = {
+            'date': datetime.now().isoformat(),
+            'reviews': args.reviews,
+            'batch': args.batch,
+            'results': results,
+        }
+        with open(args.output, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        print(f"Appended results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+"""
+Benchmark each scraper offline against the replay server.
+
+A synthetic cassette (or a recorded one with --cassette) is served locally
+with optional latency and 429 injection. Every scenario runs in its own
+process, in a scratch directory, so peak RSS and on-disk state are per
+scraper. Reported per scenario: records/sec (reviews, or apps for the
+lookup), requests/sec, p50/p99 page latency as seen by the client, peak
+RSS and the number of throttled and unmatched requests. Results can be
+appended to a JSON lines file with --output to track them over time.
+
+Run from src/scrapers: python benchmarks/bench_scrapers.py --latency 0.02
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+SCRAPERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRAPERS_DIR)
+
+import rate_limit
+import replay
+
+SCENARIOS = ('lookup', 'rss', 'storefront', 'final', 'googleplay', 'play_many', 'sharded')
+RESULT_PREFIX = 'BENCH_RESULT '
+UNTHROTTLED_RATE = 1000.0  # Requests per second per host unless --production-rates is given
+
+
+def app_ids(count):
+    return [str(1_000_000_000 + i) for i in range(count)]
+
+
+def play_packages(count):
+    return [f"com.example.app{i}" for i in range(count)]
+
+
+def build_cassette(args):
+    import appstore_api_scraper
+    import appstore_final_scraper
+    import googleplay_scraper
+    from benchmarks import synthetic
+
+    final_page = f"https://apps.apple.com/us/app/{appstore_final_scraper.APP_NAME}/id{appstore_final_scraper.APP_ID}"
+    return synthetic.build_cassette(
+        app_ids(args.apps),
+        lookup_ids=[appstore_final_scraper.APP_ID],
+        storefronts=args.storefronts,
+        storefront_reviews=args.reviews,
+        rss_app_id=appstore_api_scraper.APP_ID,
+        play_packages=[googleplay_scraper.PACKAGE_NAME] + play_packages(args.apps),
+        play_reviews=args.reviews,
+        app_pages=[final_page],
+        seed=args.seed,
+    )
+
+
+def run_scenario(name, args):
+    """Run one scraper in this process and return the number of records it produced"""
+    import sinks
+
+    if name == 'lookup':
+        import itunes_lookup
+        return len(itunes_lookup.lookup_apps(app_ids(args.apps)))
+
+    if name == 'rss':
+        import appstore_api_scraper
+        with sinks.open_sinks('bench_rss', ('ndjson',)) as sink:
+            return appstore_api_scraper.try_rss_feed_api(sink)
+
+    if name == 'storefront':
+        import storefront_crawler
+        targets = [(app_id, storefront) for app_id in app_ids(args.apps) for storefront in args.storefronts]
+        with sinks.open_sinks('bench_storefront', ('ndjson',)) as sink:
+            counts = storefront_crawler.run_crawl(targets, on_page=sink.write_batch)
+        return sum(counts.values())
+
+    if name == 'sharded':
+        import asyncio
+        import shard_coordinator
+        import storefront_crawler
+        with shard_coordinator.ShardTable() as table, shard_coordinator.CoordinatorServer(table, port=0) as coordinator:
+            for app_id in app_ids(args.apps):
+                for storefront in args.storefronts:
+                    table.plan(app_id, storefront, estimate=args.reviews)
+            asyncio.run(shard_coordinator.run_worker(coordinator.url, concurrency=storefront_crawler.MAX_CONCURRENCY))
+            return table.export('bench_sharded', ('ndjson',))
+
+    if name == 'final':
+        import appstore_final_scraper
+        appstore_final_scraper.fetch_app_metadata()
+        with sinks.open_sinks('bench_final', ('ndjson',)) as sink:
+            return appstore_final_scraper.extract_customer_reviews(sink)
+
+    if name == 'googleplay':
+        import googleplay_scraper
+        total, _ = googleplay_scraper.crawl_reviews(formats=('ndjson',), output_file_base='bench_googleplay')
+        return total
+
+    if name == 'play_many':
+        import play_scheduler
+        worker_rate = play_scheduler.WORKER_RATE if args.production_rates else UNTHROTTLED_RATE
+        targets = [(package_name, 'en', 'us') for package_name in play_packages(args.apps)]
+        with sinks.open_sinks('bench_play_many', ('ndjson',)) as sink:
+            counts = play_scheduler.crawl_many(targets, workers=args.workers, worker_rate=worker_rate,
+                                               on_page=sink.write_batch)
+        return sum(counts.values())
+
+    raise ValueError(f"Unknown scenario {name}")
+
+
+def peak_rss_mb():
+    # VmHWM starts over at exec; ru_maxrss on Linux can carry the forking parent's peak
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def child(args):
+    if not args.production_rates:
+        rate_limit.DEFAULT_RATE = UNTHROTTLED_RATE
+        for host in list(rate_limit.HOST_RATES):
+            rate_limit.set_host_rate(host, UNTHROTTLED_RATE)
+
+    stats = replay.ReplayStats()
+    with replay.replaying(args.server, stats):
+        started = time.perf_counter()
+        records = run_scenario(args.child, args)
+        elapsed = time.perf_counter() - started
+
+    p50, p99 = stats.percentile(0.50), stats.percentile(0.99)
+    result = {
+        'records': records,
+        'seconds': elapsed,
+        'requests': stats.requests,
+        'records_per_sec': records / elapsed if elapsed else 0.0,
+        'requests_per_sec': stats.requests / elapsed if elapsed else 0.0,
+        'p50_ms': p50 * 1000 if p50 is not None else None,
+        'p99_ms': p99 * 1000 if p99 is not None else None,
+        'bytes': stats.bytes,
+        'statuses': stats.statuses,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    print(RESULT_PREFIX + json.dumps(result))
+
+
+def scenario_args(args):
+    forwarded = ['--apps', str(args.apps), '--reviews', str(args.reviews), '--seed', str(args.seed),
+                 '--workers', str(args.workers), '--storefronts', *args.storefronts]
+    if args.production_rates:
+        forwarded.append('--production-rates')
+    return forwarded
+
+
+def run_child(name, args, server, workdir):
+    scenario_dir = os.path.join(workdir, name)
+    os.makedirs(scenario_dir, exist_ok=True)
+    env = dict(os.environ,
+               SCRAPER_STATE_DIR=os.path.join(scenario_dir, 'state'),
+               SCRAPER_CACHE_DIR=os.path.join(scenario_dir, 'cache'),
+               PYTHONPATH=os.pathsep.join(filter(None, [SCRAPERS_DIR, os.environ.get('PYTHONPATH')])))
+    command = [sys.executable, os.path.abspath(__file__), '--child', name, '--server', server.url] + scenario_args(args)
+    completed = subprocess.run(command, cwd=scenario_dir, env=env, capture_output=True, text=True)
+
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    print(f"Scenario {name} failed (exit code {completed.returncode}):")
+    print(completed.stderr[-2000:] or completed.stdout[-2000:])
+    return None
+
+
+def print_table(results):
+    header = f"{'scenario':12s} {'records':>8s} {'rec/s':>9s} {'req':>6s} {'req/s':>8s} {'p50 ms':>8s} {'p99 ms':>8s} {'RSS MB':>8s} {'429s':>5s} {'miss':>5s}"
+    print(header)
+    print('-' * len(header))
+    for name, result in results.items():
+        if result is None:
+            print(f"{name:12s} failed")
+            continue
+        p50 = f"{result['p50_ms']:.1f}" if result['p50_ms'] is not None else '-'
+        p99 = f"{result['p99_ms']:.1f}" if result['p99_ms'] is not None else '-'
+        print(f"{name:12s} {result['records']:8d} {result['records_per_sec']:9.1f} {result['requests']:6d} "
+              f"{result['requests_per_sec']:8.1f} {p50:>8s} {p99:>8s} {result['peak_rss_mb']:8.1f} "
+              f"{result['throttled']:5d} {result['misses']:5d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers against a local replay server")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--cassette', help="Serve this recorded cassette instead of synthetic responses")
+    parser.add_argument('--apps', type=int, default=20, help="Apps in the lookup, StoreFront and multi-app Play scenarios")
+    parser.add_argument('--workers', type=int, default=4, help="Worker threads in the multi-app Play scenario")
+    parser.add_argument('--storefronts', nargs='+', default=['us'])
+    parser.add_argument('--reviews', type=int, default=1000, help="Reviews per app and storefront (StoreFront, Play)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds the server adds to every response")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument('--retry-after', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--production-rates', action='store_true',
+                        help="Keep the real per-host rate limits instead of lifting them")
+    parser.add_argument('--output', help="Append results as a JSON line to this file")
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--server', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    cassette = replay.Cassette(args.cassette) if args.cassette else build_cassette(args)
+    server = replay.ReplayServer(cassette, latency=args.latency, jitter=args.jitter,
+                                 throttle_rate=args.throttle_rate, retry_after=args.retry_after, seed=args.seed)
+    results = {}
+    with server, tempfile.TemporaryDirectory(prefix='bench_scrapers_') as workdir:
+        for name in args.scenarios:
+            requests_before, throttled_before, misses_before = server.requests, server.throttled, server.misses
+            result = run_child(name, args, server, workdir)
+            if result is not None:
+                result['throttled'] = server.throttled - throttled_before
+                result['misses'] = server.misses - misses_before
+            results[name] = result
+
+    print_table(results)
+
+    if args.output:
+        record = {
+            'date': datetime.now().isoformat(),
+            'cassette': args.cassette or 'synthetic',
+            'latency': args.latency,
+            'throttle_rate': args.throttle_rate,
+            'results': results,
+        }
+        with open(args.output, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        print(f"Appended results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
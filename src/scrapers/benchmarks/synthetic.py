@@ -0,0 +1,173 @@
+"""
+Synthetic cassettes for the scraper benchmarks.
+
+Builds responses in the shapes the scrapers parse (iTunes lookup, RSS
+customerreviews, StoreFront /reviews, App Store HTML and Play
+batchexecute pages) for the exact requests they make, so the benchmarks run
+offline without a recorded cassette. Content is deterministic for a given
+seed so runs are comparable.
+"""
+import base64
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+from google_play_scraper import Sort
+from google_play_scraper.constants.request import Formats
+
+import itunes_lookup
+import rss_crawler
+import storefront_crawler
+import token_cache
+from replay import Cassette, key_for_url
+
+FIXTURE_HTML = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'appstore_reviews.html')
+START = datetime(2025, 3, 1, tzinfo=timezone.utc)
+WORDS = ("app works great class booking studio check in pass gym slow crash update support billing "
+         "love easy fast login error schedule membership refund reminder location map").split()
+JSON_HEADERS = {'Content-Type': 'application/json; charset=utf-8'}
+HTML_HEADERS = {'Content-Type': 'text/html; charset=utf-8'}
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def fake_token(lifetime_days=180):
+    """Unsigned JWT with an `exp` claim, enough for token_cache to decode its expiry"""
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+    exp = int((datetime.now(timezone.utc) + timedelta(days=lifetime_days)).timestamp())
+    return f"{encode({'alg': 'ES256', 'typ': 'JWT'})}.{encode({'iss': 'replay', 'exp': exp})}.c2lnbmF0dXJl"
+
+
+def _url(base, params):
+    return f"{base}?{urlencode(params)}"
+
+
+def add_lookup(cassette, app_ids, country='us', chunk_size=itunes_lookup.LOOKUP_CHUNK_SIZE):
+    """Lookup responses for the chunked batch requests and for single-app lookups"""
+    def result(app_id):
+        return {'trackId': int(app_id), 'trackName': f"App {app_id}", 'averageUserRating': 4.2,
+                'userRatingCount': 1200, 'version': '2.3.1', 'primaryGenreName': 'Health & Fitness'}
+
+    for ids in itunes_lookup.chunk_ids(app_ids, chunk_size):
+        body = {'resultCount': len(ids), 'results': [result(app_id) for app_id in ids]}
+        cassette.add(key_for_url('GET', _url(itunes_lookup.LOOKUP_URL, {'id': ','.join(ids), 'country': country})),
+                     200, JSON_HEADERS, json.dumps(body))
+    for app_id in app_ids:
+        body = {'resultCount': 1, 'results': [result(app_id)]}
+        cassette.add(key_for_url('GET', _url(itunes_lookup.LOOKUP_URL, {'id': str(app_id), 'country': country})),
+                     200, JSON_HEADERS, json.dumps(body))
+
+
+def add_rss(cassette, rng, app_id, countries, storefronts=rss_crawler.STOREFRONTS, pages=3, per_page=50):
+    """Feeds with reviews in `countries` and an empty first page in every other storefront"""
+    for storefront in storefronts:
+        if storefront not in countries:
+            url = _url(rss_crawler.RSS_URL.format(storefront=storefront),
+                       {'id': app_id, 'page': 1, 'sortby': 'mostrecent', 'json': 'true'})
+            cassette.add(key_for_url('GET', url), 200, JSON_HEADERS, json.dumps({'feed': {'author': {}}}))
+
+    for country in countries:
+        for page in range(1, pages + 1):
+            entries = [{'im:name': {'label': f"App {app_id}"}}]
+            for i in range(per_page):
+                n = (page - 1) * per_page + i
+                entries.append({
+                    'id': {'label': f"{country}{app_id}{n:06d}"},
+                    'title': {'label': _text(rng, 4)},
+                    'content': {'label': _text(rng, 40)},
+                    'im:rating': {'label': str(rng.randint(1, 5))},
+                    'author': {'name': {'label': f"user{rng.randint(1, 10 ** 6)}"}},
+                    'updated': {'label': (START - timedelta(hours=n)).isoformat()},
+                    'im:version': {'label': '2.3.1'},
+                })
+            url = _url(rss_crawler.RSS_URL.format(storefront=country),
+                       {'id': app_id, 'page': page, 'sortby': 'mostrecent', 'json': 'true'})
+            cassette.add(key_for_url('GET', url), 200, JSON_HEADERS, json.dumps({'feed': {'entry': entries}}))
+        url = _url(rss_crawler.RSS_URL.format(storefront=country),
+                   {'id': app_id, 'page': pages + 1, 'sortby': 'mostrecent', 'json': 'true'})
+        cassette.add(key_for_url('GET', url), 200, JSON_HEADERS, json.dumps({'feed': {'author': {}}}))
+
+
+def add_storefront(cassette, rng, app_id, storefront, reviews, page_size=storefront_crawler.PAGE_SIZE):
+    base = storefront_crawler.STOREFRONT_REVIEWS_URL.format(storefront=storefront, app_id=app_id)
+    for offset in range(0, max(reviews, 1), page_size):
+        data = [{
+            'id': f"{app_id}{storefront}{n:07d}",
+            'type': 'user-reviews',
+            'attributes': {
+                'title': _text(rng, 4),
+                'review': _text(rng, 40),
+                'rating': rng.randint(1, 5),
+                'reviewerNickname': f"user{rng.randint(1, 10 ** 6)}",
+                'date': (START - timedelta(hours=n)).isoformat(),
+                'storeSortVersion': '2.3.1',
+            },
+        } for n in range(offset, min(offset + page_size, reviews))]
+        body = {'data': data}
+        if offset + page_size < reviews:
+            body['next'] = f"/v1/catalog/{storefront}/apps/{app_id}/reviews?offset={offset + page_size}"
+        params = {'l': 'en-US', 'offset': offset, 'limit': page_size, 'platform': 'web',
+                  'additionalPlatforms': 'appletv,ipad,iphone,mac'}
+        cassette.add(key_for_url('GET', _url(base, params)), 200, JSON_HEADERS, json.dumps(body))
+
+
+def add_app_pages(cassette, app_pages, token):
+    """App Store HTML pages: the fixture markup with the media-api token embedded the way Apple does"""
+    with open(FIXTURE_HTML, encoding='utf-8') as f:
+        html = f.read()
+    config = f'<meta name="web-experience-app/config/environment" content="%7B%22MEDIA_API%22%3A%7B%22token%22%3A%22{token}%22%7D%7D">'
+    html = html.replace('</head>', f"  {config}\n</head>", 1)
+    for url in app_pages:
+        cassette.add(key_for_url('GET', url), 200, HTML_HEADERS, html)
+
+
+def add_play(cassette, rng, package_name, reviews, lang='en', country='us', page_size=200):
+    url = Formats.Reviews.build(lang=lang, country=country)
+    token = None
+    for page, offset in enumerate(range(0, reviews, page_size)):
+        items = []
+        for n in range(offset, min(offset + page_size, reviews)):
+            items.append([
+                f"gp:{package_name}:{n:07d}",
+                [f"user{rng.randint(1, 10 ** 6)}", [None, None, None, [None, None, "https://play-lh.googleusercontent.com/a/x"]]],
+                rng.randint(1, 5),
+                None,
+                _text(rng, 40),
+                [int((START - timedelta(hours=n)).timestamp()), 0],
+                rng.randint(0, 50),
+                None, None, None,
+                '2.3.1',
+            ])
+        next_token = f"page{page + 1}" if offset + page_size < reviews else None
+        payload = json.dumps([items, [None, next_token], None])
+        body = ")]}'\n\n" + json.dumps([["wrb.fr", "oCPfdb", payload, None, None, None, "generic"]])
+        request_body = Formats.Reviews.build_body(package_name, Sort.NEWEST.value, page_size, 'null', 'null', token)
+        cassette.add(key_for_url('POST', url, request_body), 200, {'Content-Type': 'application/json; charset=utf-8'}, body)
+        token = next_token
+
+
+def build_cassette(app_ids, lookup_ids=(), storefronts=('us',), storefront_reviews=500, rss_countries=('us', 'gb', 'ca', 'au'),
+                   rss_app_id=None, play_packages=(), play_reviews=1000, app_pages=(), seed=0, path=None):
+    """Assemble a cassette covering every scenario in bench_scrapers"""
+    rng = random.Random(seed)
+    cassette = Cassette(path)
+    token = fake_token()
+
+    add_lookup(cassette, app_ids)
+    if lookup_ids:
+        add_lookup(cassette, lookup_ids)
+    if rss_app_id:
+        add_rss(cassette, rng, rss_app_id, rss_countries)
+    for app_id in app_ids:
+        for storefront in storefronts:
+            add_storefront(cassette, rng, app_id, storefront, storefront_reviews)
+    token_pages = [f"https://apps.apple.com/{storefront}/app/id{token_cache.TOKEN_PAGE_APP_ID}" for storefront in storefronts]
+    add_app_pages(cassette, list(app_pages) + token_pages, token)
+    for package_name in play_packages:
+        add_play(cassette, rng, package_name, play_reviews)
+    return cassette
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+Pool of warm headless Chrome drivers for the browser scraper.
+
+Starting Chrome (and resolving the chromedriver binary) costs more than
+loading an App Store page, so drivers are started once and handed out to
+worker threads. A driver is recycled after a fixed number of pages or as
+soon as it crashes. Images, fonts and stylesheets are blocked, since only
+the review markup is needed.
+"""
+import importlib.util
+import queue
+import threading
+from contextlib import contextmanager
+
+POOL_SIZE = 4
+MAX_PAGES_PER_DRIVER = 25  # Restart Chrome after this many pages to cap its memory growth
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36'
+
+# URL patterns Chrome is told not to fetch when resources are blocked
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*.css',
+]
+
+# Selenium is only imported once a driver is started
+SELENIUM_AVAILABLE = importlib.util.find_spec('selenium') is not None
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def resolve_driver_path():
+    """Resolve the chromedriver binary once per process; None lets Selenium find it"""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            try:
+                from webdriver_manager.chrome import ChromeDriverManager
+                _driver_path = ChromeDriverManager().install()
+            except ImportError:
+                _driver_path = ''
+            except Exception as e:
+                print(f"Could not resolve chromedriver with webdriver-manager: {e}")
+                _driver_path = ''
+        return _driver_path or None
+
+
+def create_driver(block_resources=True):
+    """Start a headless Chrome, optionally blocking images, fonts and CSS"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    options = Options()
+    options.add_argument("--headless")  # Run in headless mode (no visible browser)
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument(f"--user-agent={USER_AGENT}")
+    if block_resources:
+        options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+        })
+
+    driver_path = resolve_driver_path()
+    if driver_path:
+        driver = webdriver.Chrome(service=Service(driver_path), options=options)
+    else:
+        driver = webdriver.Chrome(options=options)
+
+    if block_resources:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+    return driver
+
+
+class BrowserPool:
+    """
+    Thread-safe pool of warm drivers.
+
+    Use `with pool.driver() as driver:` from worker threads; drivers are
+    started lazily up to `size` and reused across pages.
+    """
+
+    def __init__(self, size=POOL_SIZE, max_pages_per_driver=MAX_PAGES_PER_DRIVER, block_resources=True):
+        self.size = size
+        self.max_pages_per_driver = max_pages_per_driver
+        self.block_resources = block_resources
+        self._idle = queue.LifoQueue()
+        self._slots = threading.Semaphore(size)
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._all = set()
+
+    def _start(self):
+        driver = create_driver(self.block_resources)
+        with self._lock:
+            self._all.add(driver)
+            self._pages[driver] = 0
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            self._all.discard(driver)
+            self._pages.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    @contextmanager
+    def driver(self):
+        """Borrow a driver; it is recycled after a crash or after max_pages_per_driver uses"""
+        from selenium.common.exceptions import WebDriverException
+
+        self._slots.acquire()
+        try:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = self._start()
+
+            try:
+                yield driver
+            except WebDriverException:
+                self._discard(driver)
+                raise
+            except BaseException:
+                self._release(driver)
+                raise
+            self._release(driver)
+        finally:
+            self._slots.release()
+
+    def _release(self, driver):
+        with self._lock:
+            self._pages[driver] += 1
+            worn_out = self._pages[driver] >= self.max_pages_per_driver
+        if worn_out:
+            self._discard(driver)
+        else:
+            self._idle.put(driver)
+
+    def close(self):
+        """Quit every driver the pool started"""
+        with self._lock:
+            drivers = list(self._all)
+        for driver in drivers:
+            self._discard(driver)
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
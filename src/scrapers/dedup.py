@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+"""
+Cross-source review deduplication.
+
+Every review gets a stable identity: its native id (namespaced by store, so
+RSS and StoreFront copies of the same App Store review collide) or, when a
+source has no real id, a content hash of author+title+date+body. Identities
+are kept in an SQLite index so duplicates are dropped within a run and
+across runs. On-disk indexes put a Bloom filter in front that answers
+"never seen" for new reviews without touching the database; it is sized
+from the index and rebuilt larger as the index grows.
+"""
+import hashlib
+import math
+import os
+import sqlite3
+
+from paths import state_path
+
+BLOOM_MIN_ITEMS = 100_000  # Smallest filter built, about 120 KB
+BLOOM_GROWTH = 2  # A filter is built for this many times the indexed reviews
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+
+# Ids the scrapers make up per run; they say nothing about the review itself
+SYNTHETIC_ID_PREFIXES = ('appstore_review_', 'api_fallback_', 'fallback_review_', 'mock_review_')
+
+
+def review_key(review):
+    """Stable identity for a review from any source"""
+    if review.get('reviewId'):
+        return f"googleplay:{review['reviewId']}"
+
+    review_id = str(review.get('id') or '')
+    if review_id and not review_id.startswith(SYNTHETIC_ID_PREFIXES):
+        return f"appstore:{review_id}"
+
+    content = '\x1f'.join(str(review.get(field) or '') for field in ('author', 'title', 'date', 'content'))
+    return f"hash:{hashlib.sha1(content.encode('utf-8')).hexdigest()}"
+
+
+def _digest(key):
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 16-byte digests using double hashing"""
+
+    def __init__(self, expected_items=BLOOM_MIN_ITEMS, false_positive_rate=BLOOM_FALSE_POSITIVE_RATE):
+        self.size = max(8, int(-expected_items * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / expected_items * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    @property
+    def capacity(self):
+        """Items the filter holds before its false positive rate exceeds BLOOM_FALSE_POSITIVE_RATE"""
+        return int(self.size * math.log(2) ** 2 / -math.log(BLOOM_FALSE_POSITIVE_RATE))
+
+    def _positions(self, digest):
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, digest):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.size.to_bytes(8, 'little') + self.hash_count.to_bytes(1, 'little'))
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        bloom = cls.__new__(cls)
+        with open(path, 'rb') as f:
+            header = f.read(9)
+            bloom.size = int.from_bytes(header[:8], 'little')
+            bloom.hash_count = header[8]
+            bloom.bits = bytearray(f.read())
+        return bloom
+
+
+class DedupIndex:
+    """
+    On-disk set of review identities.
+
+    `filter_new` returns the reviews in a batch that haven't been seen; call
+    `commit` once they have been written, or `rollback` if writing them
+    failed, so unwritten reviews are never marked as seen. With `path=None`
+    the index lives in memory, without a Bloom filter, and only deduplicates
+    within the run.
+    """
+
+    def __init__(self, path=None, bloom=True):
+        self.path = path
+        self.conn = sqlite3.connect(path or ':memory:')
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen (key BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        self.conn.commit()
+        self.count = self.conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+        self._pending = set()  # Digests recorded since the last commit
+        self.bloom = self._open_bloom() if bloom and path else None
+
+    def _bloom_path(self):
+        return f"{self.path}.bloom" if self.path else None
+
+    def _open_bloom(self):
+        bloom_path = self._bloom_path()
+        saved_count = self.conn.execute("SELECT value FROM meta WHERE name = 'bloom_count'").fetchone()
+        if os.path.exists(bloom_path) and saved_count and saved_count[0] == self.count:
+            bloom = BloomFilter.load(bloom_path)
+            if bloom.capacity >= self.count:
+                return bloom
+        # Missing, stale (e.g. the last run crashed before saving it) or outgrown: rebuild from the index
+        return self._build_bloom()
+
+    def _build_bloom(self):
+        bloom = BloomFilter(max(BLOOM_MIN_ITEMS, self.count * BLOOM_GROWTH))
+        for (digest,) in self.conn.execute("SELECT key FROM seen"):
+            bloom.add(digest)
+        return bloom
+
+    def _seen(self, digest):
+        if digest in self._pending:
+            return True
+        if self.bloom is not None and digest not in self.bloom:
+            return False
+        return self.conn.execute("SELECT 1 FROM seen WHERE key = ?", (digest,)).fetchone() is not None
+
+    def filter_new(self, reviews):
+        """Return the reviews that are new, recording them in the pending transaction"""
+        new_reviews = []
+        new_digests = []
+        batch = set()
+        for review in reviews:
+            digest = _digest(review_key(review))
+            if digest in batch or self._seen(digest):
+                continue
+            batch.add(digest)
+            new_digests.append((digest,))
+            new_reviews.append(review)
+
+        self.conn.executemany("INSERT OR IGNORE INTO seen (key) VALUES (?)", new_digests)
+        self._pending.update(batch)
+        return new_reviews
+
+    def commit(self):
+        """Mark the reviews returned since the last commit as seen"""
+        self.conn.commit()
+        self.count += len(self._pending)
+        if self.bloom is not None:
+            if self.count > self.bloom.capacity:
+                self.bloom = self._build_bloom()
+            else:
+                for digest in self._pending:
+                    self.bloom.add(digest)
+        self._pending = set()
+
+    def rollback(self):
+        """Forget the reviews returned since the last commit, so they count as new again"""
+        self.conn.rollback()
+        self._pending = set()
+
+    def close(self):
+        self.commit()
+        if self.bloom is not None and self.path:
+            self.bloom.save(self._bloom_path())
+            self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('bloom_count', ?)", (self.count,))
+            self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.rollback()
+        self.close()
+
+
+def open_output_index(file_base, incremental):
+    """
+    Index of the reviews already written to the outputs at `file_base`.
+
+    Full runs rewrite their outputs, so they start from an empty index.
+    """
+    path = state_path(f"dedup_{os.path.basename(file_base)}.sqlite")
+    if not incremental:
+        for stale_path in (path, f"{path}.bloom"):
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+    return DedupIndex(path)
+
+
+class DedupSink:
+    """
+    Sink wrapper that only forwards reviews the index hasn't seen. A batch
+    the sink fails to write is rolled back out of the index, so it is
+    written when it comes around again.
+    """
+
+    def __init__(self, sink, index):
+        self.sink = sink
+        self.index = index
+        self.written = 0
+        self.duplicates = 0
+
+    def write_batch(self, rows):
+        new_rows = self.index.filter_new(rows)
+        try:
+            self.sink.write_batch(new_rows)
+        except BaseException:
+            self.index.rollback()
+            raise
+        self.index.commit()
+        self.written += len(new_rows)
+        self.duplicates += len(rows) - len(new_rows)
+
+    def close(self):
+        self.sink.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.index.rollback()
+        self.close()
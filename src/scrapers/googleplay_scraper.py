@@ -1,27 +1,188 @@
-from google_play_scraper import Sort, reviews_all
-import pandas as pd
+import argparse
+import os
+import time
+
+from google_play_scraper import Sort
+from google_play_scraper.constants.element import ElementSpecs
+from google_play_scraper.constants.request import Formats
+from google_play_scraper.exceptions import ExtraHTTPError, NotFoundError
+import google_play_scraper.features.reviews as play_reviews_api
 import json
 
-# Fetch all reviews
-play_reviews = reviews_all(
-    'com.pearhealthlabs.onepass',
-    sleep_milliseconds=0,  # Delay between requests
-    lang='en',  # Language
-    country='us',  # Country
-    sort=Sort.NEWEST  # Sort order (NEWEST, RATING, RELEVANCE)
-)
-
-# Save to CSV
-reviews_df = pd.DataFrame(play_reviews)
-reviews_df.to_csv('one_pass_googleplay_reviews.csv', index=False)
-
-# Or save as JSON
-
-# Custom JSON encoder to handle datetime objects
-def datetime_handler(x):
-    if hasattr(x, 'isoformat'):
-        return x.isoformat()
-    raise TypeError("Unknown type")
-
-with open('one_pass_googleplay_reviews.json', 'w') as f:
-    json.dump(play_reviews, f, default=datetime_handler, indent=2) # Added default handler and indent
\ No newline at end of file
+import http_client
+import metrics
+import sinks
+import sync_state
+from paths import state_path
+
+PACKAGE_NAME = 'com.pearhealthlabs.onepass'
+LANG = 'en'
+COUNTRY = 'us'
+OUTPUT_FILE_BASE = 'one_pass_googleplay_reviews'
+PAGE_SIZE = 200  # Reviews requested per page; a checkpoint is written after each one
+SYNC_SOURCE = 'googleplay'
+OUTPUT_FORMATS = ('ndjson', 'csv')
+
+# Route google-play-scraper's batchexecute calls through the shared
+# connection pool instead of a fresh urllib connection per page
+def pooled_post(url, data, headers):
+    response = http_client.post(url, content=data, headers=headers)
+    if response.status_code == 404:
+        raise NotFoundError("App not found(404).")
+    if response.status_code != 200:
+        raise ExtraHTTPError(f"App not found. Status code {response.status_code} returned.")
+    return response.text
+
+play_reviews_api.post = pooled_post
+
+def fetch_page(package_name, lang=LANG, country=COUNTRY, token=None, count=PAGE_SIZE):
+    """
+    Fetch one newest-first page of reviews after the pagination `token`.
+
+    Returns the reviews and the next page's token, None on the last page.
+    Unlike google_play_scraper.reviews(), which turns any failure into an
+    empty last page, request and decoding errors are raised, so a failed
+    page can't be mistaken for the end of the list. This is the only place
+    that reaches into the library's private page fetcher.
+    """
+    url = Formats.Reviews.build(lang=lang, country=country)
+    items, next_token = play_reviews_api._fetch_review_items(
+        url, package_name, Sort.NEWEST.value, count, None, None, token)
+    page = [{key: spec.extract_content(item) for key, spec in ElementSpecs.Review.items()} for item in items]
+    # The last page carries a list in place of the token
+    return page, next_token if isinstance(next_token, str) else None
+
+def checkpoint_path(package_name, lang, country):
+    return state_path(f"googleplay_{package_name}_{lang}_{country}.checkpoint.json")
+
+def load_checkpoint(checkpoint_file, incremental):
+    """Return the saved checkpoint, or None if there is nothing to resume"""
+    try:
+        with open(checkpoint_file) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if checkpoint.get('incremental') != incremental:
+        print("Ignoring checkpoint from a run in a different mode")
+        return None
+    return checkpoint
+
+def resume_tag(package_name=PACKAGE_NAME, lang=LANG, country=COUNTRY, incremental=False):
+    """
+    Tag of the checkpoint the next crawl resumes from (its review count), or
+    None; sinks that save state with each checkpoint resume from it
+    """
+    checkpoint = load_checkpoint(checkpoint_path(package_name, lang, country), incremental)
+    return checkpoint['rows'] if checkpoint else None
+
+def save_checkpoint(checkpoint_file, checkpoint):
+    tmp_file = f"{checkpoint_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_file, checkpoint_file)
+
+def crawl_reviews(package_name=PACKAGE_NAME, lang=LANG, country=COUNTRY, incremental=False,
+                  formats=OUTPUT_FORMATS, output_file_base=OUTPUT_FILE_BASE, extra_sinks=()):
+    """
+    Page newest-first through the reviews, streaming each page to the output files.
+
+    After every page the continuation token and the byte position of each
+    output file are checkpointed, so a crawl that dies midway resumes from its
+    last page with the outputs truncated back to the checkpoint. Incremental
+    crawls append to the outputs and stop at the first review already seen
+    by a previous run. `extra_sinks` (e.g. the review store) receive every
+    page as well; those with a `checkpoint` method (the aggregates) save
+    their state under each checkpoint's review count.
+    Returns the number of reviews written and the newest of them.
+    """
+    mark = sync_state.get_mark(SYNC_SOURCE, f"{package_name}/{lang}/{country}") if incremental else None
+    checkpoint_file = checkpoint_path(package_name, lang, country)
+    checkpoint = load_checkpoint(checkpoint_file, incremental)
+
+    token = None
+    done = False
+    total = 0
+    newest = None
+    if checkpoint:
+        print(f"Resuming crawl from checkpoint with {checkpoint['rows']} reviews")
+        done, total, newest, token = checkpoint['done'], checkpoint['rows'], checkpoint['newest'], checkpoint['token']
+
+    positions = checkpoint['positions'] if checkpoint else None
+    with sinks.open_sinks(output_file_base, formats, append=incremental, positions=positions,
+                          extra=extra_sinks) as sink:
+        while not done:
+            # A failed page raises here, leaving the last checkpoint (and the high-water mark) in place
+            started = time.perf_counter()
+            page, token = fetch_page(package_name, lang, country, token)
+            metrics.observe_stage('page', time.perf_counter() - started, len(page), 'googleplay')
+            fresh, reached_mark = sync_state.take_unseen(page, mark, id_key='reviewId', date_key='at')
+            sink.write_batch(fresh)
+            if fresh and newest is None:
+                newest = {key: sinks.to_jsonable(value) for key, value in fresh[0].items()}
+            total += len(fresh)
+
+            done = reached_mark or not page or token is None
+            with metrics.stage('write', 'checkpoint'):
+                sink.checkpoint(total)
+                save_checkpoint(checkpoint_file, {
+                    'token': None if done else token,
+                    'positions': sink.positions(),
+                    'rows': total,
+                    'newest': newest,
+                    'incremental': incremental,
+                    'done': done,
+                })
+            print(f"Fetched {len(fresh)} reviews (total {total})")
+
+    return total, newest
+
+def clear_checkpoint(package_name=PACKAGE_NAME, lang=LANG, country=COUNTRY):
+    """Remove the checkpoint once the crawl has finished"""
+    checkpoint_file = checkpoint_path(package_name, lang, country)
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+def sync_reviews(package_name=PACKAGE_NAME, lang=LANG, country=COUNTRY, incremental=False,
+                 formats=OUTPUT_FORMATS, output_file_base=OUTPUT_FILE_BASE, extra_sinks=()):
+    """Crawl to completion, then advance the high-water mark and drop the checkpoint"""
+    total, newest = crawl_reviews(package_name, lang, country, incremental=incremental, formats=formats,
+                                  output_file_base=output_file_base, extra_sinks=extra_sinks)
+    if newest:
+        sync_state.update_mark(SYNC_SOURCE, f"{package_name}/{lang}/{country}", [newest],
+                               id_key='reviewId', date_key='at')
+    clear_checkpoint(package_name, lang, country)
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape Google Play reviews")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only fetch reviews newer than the last run's high-water mark")
+    parser.add_argument('--formats', nargs='+', choices=sinks.FORMATS, default=list(OUTPUT_FORMATS),
+                        help="Output formats written while crawling")
+    parser.add_argument('--store', action='store_true', help="Also append the reviews to the Parquet review store")
+    parser.add_argument('--aggregate', action='store_true',
+                        help="Fold the new reviews into the dashboard aggregates kept beside the outputs")
+    parser.add_argument('--index', action='store_true', help="Also add the reviews to the full-text search index")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    extra_sinks = []
+    if args.store:
+        from review_store import ReviewStore
+        extra_sinks.append(ReviewStore().sink(source=SYNC_SOURCE, app_id=PACKAGE_NAME, storefront=COUNTRY))
+    if args.aggregate:
+        from aggregates import AggregateSink
+        # A resumed crawl starts from the aggregates saved with its checkpoint, which cover the pages before the crash
+        extra_sinks.append(AggregateSink(OUTPUT_FILE_BASE, 'googleplay', append=args.incremental,
+                                         resume=resume_tag(incremental=args.incremental)))
+    if args.index:
+        from search_index import ReviewIndex
+        extra_sinks.append(ReviewIndex().sink(source=SYNC_SOURCE, app_id=PACKAGE_NAME, storefront=COUNTRY))
+
+    with metrics.session(args, 'googleplay'):
+        total = sync_reviews(incremental=args.incremental, formats=args.formats, extra_sinks=extra_sinks)
+    print(f"Saved {total} reviews to {OUTPUT_FILE_BASE}.*")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+"""
+Shared HTTP client for all scrapers.
+
+Keeps one keep-alive connection pool per host so repeated calls to
+itunes.apple.com and amp-api.apps.apple.com reuse TCP+TLS connections.
+Uses HTTP/2 when the `h2` package is installed and advertises gzip/brotli.
+Every request goes through the per-host adaptive rate limiter and is
+retried on 429/5xx and connection errors. GETs go through the on-disk
+response cache (response_cache.py) unless SCRAPER_HTTP_CACHE=0; fresh hits
+are answered without touching the rate limiter. Every request that reaches
+the network is timed into metrics.py.
+"""
+import asyncio
+import atexit
+import importlib.util
+import os
+
+import httpx
+
+import metrics
+import rate_limit
+import response_cache
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.5 Safari/605.1.15'
+
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+BROTLI_AVAILABLE = (importlib.util.find_spec('brotli') is not None
+                    or importlib.util.find_spec('brotlicffi') is not None)
+
+DEFAULT_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept-Encoding': 'gzip, deflate, br' if BROTLI_AVAILABLE else 'gzip, deflate',
+}
+
+# Maximum open connections per host; hosts not listed share the default pool
+HOST_CONNECTION_LIMITS = {
+    'itunes.apple.com': 8,
+    'apps.apple.com': 4,
+    'amp-api.apps.apple.com': 16,
+    'play.google.com': 8,
+}
+DEFAULT_CONNECTION_LIMIT = 10
+KEEPALIVE_EXPIRY = 60  # Seconds an idle connection stays in the pool
+REQUEST_TIMEOUT = 30
+CACHE_ENABLED = os.environ.get('SCRAPER_HTTP_CACHE', '1') != '0'
+
+_client = None
+_transport_wrapper = None
+_response_cache = None  # False once disabled with set_response_cache(None)
+
+
+def configure(host_limits=None, default_limit=None):
+    """Override per-host connection limits; takes effect for clients created afterwards"""
+    global DEFAULT_CONNECTION_LIMIT
+    if host_limits:
+        HOST_CONNECTION_LIMITS.update(host_limits)
+    if default_limit:
+        DEFAULT_CONNECTION_LIMIT = default_limit
+    close()
+
+
+def _limits(max_connections):
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def set_transport_wrapper(wrapper):
+    """
+    Wrap every transport of clients created afterwards, e.g. to record or
+    replay traffic (see replay.py); None goes back to the network.
+    """
+    global _transport_wrapper
+    _transport_wrapper = wrapper
+    close()
+
+
+def get_response_cache():
+    """The response cache in use, opened on first use; None when caching is off"""
+    global _response_cache
+    if _response_cache is None and CACHE_ENABLED:
+        _response_cache = response_cache.ResponseCache()
+    return _response_cache or None
+
+
+def set_response_cache(cache):
+    """Cache the responses of clients created afterwards in `cache`; None turns caching off"""
+    global _response_cache
+    _response_cache = cache if cache is not None else False
+    close()
+
+
+def _client_kwargs(transport_cls):
+    cache = get_response_cache()
+
+    def wrap(transport):
+        if _transport_wrapper:
+            transport = _transport_wrapper(transport)
+        transport = metrics.wrap_transport(transport)
+        return response_cache.wrap_transport(transport, cache) if cache else transport
+
+    mounts = {
+        f"all://{host}": wrap(transport_cls(http2=HTTP2_AVAILABLE, limits=_limits(limit)))
+        for host, limit in HOST_CONNECTION_LIMITS.items()
+    }
+    kwargs = {
+        'headers': DEFAULT_HEADERS,
+        'timeout': REQUEST_TIMEOUT,
+        'follow_redirects': True,
+        'http2': HTTP2_AVAILABLE,
+        'limits': _limits(DEFAULT_CONNECTION_LIMIT),
+        'mounts': mounts,
+    }
+    kwargs['transport'] = wrap(transport_cls(http2=HTTP2_AVAILABLE, limits=_limits(DEFAULT_CONNECTION_LIMIT)))
+    return kwargs
+
+
+def get_client():
+    """Return the process-wide pooled client, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = httpx.Client(**_client_kwargs(httpx.HTTPTransport))
+    return _client
+
+
+def create_async_client():
+    """
+    Create a pooled async client with the same per-host limits.
+
+    Async connections are bound to the event loop that opened them, so each
+    loop gets its own client; use it as `async with create_async_client()`.
+    """
+    return httpx.AsyncClient(**_client_kwargs(httpx.AsyncHTTPTransport))
+
+
+def _cache_lookup(client, url, kwargs):
+    """
+    Look the GET up in the response cache before it waits on the rate
+    limiter. Returns the fresh cached response, or None and the request's
+    kwargs with the lookup attached for the caching transport to reuse.
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return None, kwargs
+    request = client.build_request('GET', url, **kwargs)
+    response, entry = cache.lookup(request)
+    if response is not None:
+        metrics.observe_cache_hit()
+        return response, kwargs
+    if not cache.cacheable(request):
+        return None, kwargs
+    extensions = dict(kwargs.get('extensions') or {})
+    extensions[response_cache.ENTRY_EXTENSION] = (response_cache.request_key(request), entry)
+    return None, dict(kwargs, extensions=extensions)
+
+
+def get(url, **kwargs):
+    """GET through the shared pool, answered from the response cache while fresh"""
+    cached, kwargs = _cache_lookup(get_client(), url, kwargs)
+    if cached is not None:
+        return cached
+    return rate_limit.call_with_retry(lambda: get_client().get(url, **kwargs), url,
+                                      retry_exceptions=(httpx.TransportError,))
+
+
+def post(url, **kwargs):
+    """POST through the shared pool"""
+    return rate_limit.call_with_retry(lambda: get_client().post(url, **kwargs), url,
+                                      retry_exceptions=(httpx.TransportError,))
+
+
+async def async_get(client, url, limiter=None, **kwargs):
+    """
+    GET with an async client from create_async_client, under the same limits,
+    retries and cache; `limiter` replaces the host's rate limit bucket
+    """
+    # The cache index and bodies are on disk; look them up off the event loop
+    cached, kwargs = await asyncio.to_thread(_cache_lookup, client, url, kwargs)
+    if cached is not None:
+        return cached
+    return await rate_limit.call_with_retry_async(lambda: client.get(url, **kwargs), url,
+                                                  retry_exceptions=(httpx.TransportError,), limiter=limiter)
+
+
+def close():
+    """Close the shared client and its pooled connections"""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+atexit.register(close)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Batched iTunes Lookup API client.
+
+The lookup endpoint accepts comma-separated ids, so metadata for hundreds of
+apps is fetched in a handful of requests that are fanned out concurrently.
+"""
+import argparse
+import asyncio
+import json
+
+import httpx
+
+import http_client
+
+LOOKUP_URL = "https://itunes.apple.com/lookup"
+LOOKUP_CHUNK_SIZE = 200  # Most ids the lookup endpoint reliably answers in one call
+MAX_CONCURRENCY = 4
+
+
+def chunk_ids(app_ids, chunk_size=LOOKUP_CHUNK_SIZE):
+    """Split app ids into the fewest lookup-sized chunks, dropping duplicates"""
+    unique_ids = list(dict.fromkeys(str(app_id) for app_id in app_ids))
+    return [unique_ids[i:i + chunk_size] for i in range(0, len(unique_ids), chunk_size)]
+
+
+def _results_by_track_id(data):
+    return {result['trackId']: result for result in data.get('results', []) if 'trackId' in result}
+
+
+async def _lookup_chunk(client, semaphore, ids, country):
+    params = {'id': ','.join(ids), 'country': country}
+    async with semaphore:
+        try:
+            response = await http_client.async_get(client, LOOKUP_URL, params=params)
+            response.raise_for_status()
+            return _results_by_track_id(response.json())
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"Error looking up {len(ids)} apps ({ids[0]}...): {e}")
+            return {}
+
+
+async def lookup_apps_async(app_ids, country='us', chunk_size=LOOKUP_CHUNK_SIZE,
+                            max_concurrency=MAX_CONCURRENCY, client=None):
+    """Look up metadata for many apps; returns a dict keyed by integer trackId"""
+    chunks = chunk_ids(app_ids, chunk_size)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    if client is None:
+        async with http_client.create_async_client() as client:
+            pages = await asyncio.gather(*(_lookup_chunk(client, semaphore, ids, country) for ids in chunks))
+    else:
+        pages = await asyncio.gather(*(_lookup_chunk(client, semaphore, ids, country) for ids in chunks))
+
+    results = {}
+    for page in pages:
+        results.update(page)
+    return results
+
+
+def lookup_apps(app_ids, country='us', **kwargs):
+    """Synchronous entry point for callers outside an event loop"""
+    return asyncio.run(lookup_apps_async(app_ids, country=country, **kwargs))
+
+
+def fetch_app_metadata(app_id, country='us'):
+    """Fetch metadata for a single app over the shared sync client"""
+    try:
+        response = http_client.get(LOOKUP_URL, params={'id': str(app_id), 'country': country})
+        response.raise_for_status()
+        results = _results_by_track_id(response.json())
+    except Exception as e:
+        print(f"Error fetching app metadata: {e}")
+        return {}
+
+    metadata = results.get(int(app_id), {})
+    if metadata:
+        print("Successfully fetched app metadata")
+    else:
+        print("No app metadata found")
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up App Store metadata for many apps")
+    parser.add_argument('app_ids', nargs='*', help="Numeric App Store ids")
+    parser.add_argument('--ids-file', help="File with one app id per line")
+    parser.add_argument('--country', default='us')
+    parser.add_argument('--output', default='appstore_metadata.json')
+    args = parser.parse_args()
+
+    app_ids = list(args.app_ids)
+    if args.ids_file:
+        with open(args.ids_file) as f:
+            app_ids.extend(line.strip() for line in f if line.strip())
+
+    results = lookup_apps(app_ids, country=args.country)
+    with open(args.output, 'w') as f:
+        json.dump({str(track_id): result for track_id, result in results.items()}, f, indent=2, ensure_ascii=False)
+    print(f"Fetched metadata for {len(results)} of {len(set(app_ids))} apps into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+"""
+Process-wide instrumentation for the scrapers.
+
+Everything that can make a run slow is recorded in one registry:
+- Network requests: latency, bytes and status per host, recorded by a transport in http_client.
+- Retries and the time spent sleeping on the rate limiter or in backoff, recorded in rate_limit.
+- Response-cache hits.
+- Named stages such as parsing pages and writing batches to each sink.
+
+A run's metrics are written as JSON or Prometheus text (by file
+extension), so a slow run can be attributed to network, throttling,
+parsing or I/O. Scripts opt in with `add_arguments` and `session`, which
+also run an optional cProfile or pyinstrument profile:
+
+    python googleplay_scraper.py --metrics run_metrics.json --profile cprofile
+    python runner.py jobs.json --metrics run_metrics.prom --profile pyinstrument
+"""
+import cProfile
+import importlib.util
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Seconds, upper bounds
+PROFILERS = ('cprofile', 'pyinstrument')
+PYINSTRUMENT_AVAILABLE = importlib.util.find_spec('pyinstrument') is not None
+DEFAULT_PROFILE_DIR = 'profiles'
+PROMETHEUS_EXTENSIONS = ('.prom', '.txt')
+
+
+class Metrics:
+    """Thread-safe counters, latency histograms and stage timers"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = {}  # host -> request totals, status counts and latency histogram
+        self.retries = {}  # (host, reason) -> count
+        self.sleep = {}  # reason -> seconds
+        self.stages = {}  # (stage, detail) -> calls, seconds and items
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+
+    def observe_request(self, host, status, seconds, size):
+        with self._lock:
+            totals = self.requests.get(host)
+            if totals is None:
+                totals = self.requests[host] = {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'bytes': 0,
+                                                'statuses': {}, 'buckets': [0] * len(LATENCY_BUCKETS)}
+            totals['count'] += 1
+            totals['seconds'] += seconds
+            totals['max_seconds'] = max(totals['max_seconds'], seconds)
+            totals['bytes'] += size
+            totals['statuses'][status] = totals['statuses'].get(status, 0) + 1
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    totals['buckets'][i] += 1
+
+    def observe_retry(self, host, reason):
+        with self._lock:
+            self.retries[(host, str(reason))] = self.retries.get((host, str(reason)), 0) + 1
+
+    def observe_sleep(self, reason, seconds):
+        if seconds > 0:
+            with self._lock:
+                self.sleep[reason] = self.sleep.get(reason, 0.0) + seconds
+
+    def observe_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def observe_stage(self, stage, seconds, items=0, detail=''):
+        with self._lock:
+            totals = self.stages.setdefault((stage, detail), {'calls': 0, 'seconds': 0.0, 'items': 0})
+            totals['calls'] += 1
+            totals['seconds'] += seconds
+            totals['items'] += items
+
+    @contextmanager
+    def stage(self, stage, detail='', items=0):
+        """Time the block as one call of `stage` (e.g. 'parse'), counting `items` processed"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started, items, detail)
+
+    def snapshot(self):
+        """Everything recorded so far as a JSON-ready dict"""
+        with self._lock:
+            requests = {host: {**totals, 'statuses': {str(status): count for status, count in totals['statuses'].items()},
+                               'buckets': dict(zip(map(str, LATENCY_BUCKETS), totals['buckets']))}
+                        for host, totals in self.requests.items()}
+            return {
+                'wall_seconds': round(time.monotonic() - self.started, 3),
+                'request_seconds': round(sum(totals['seconds'] for totals in self.requests.values()), 3),
+                'sleep_seconds': {reason: round(seconds, 3) for reason, seconds in self.sleep.items()},
+                'requests': requests,
+                'retries': [{'host': host, 'reason': reason, 'count': count}
+                            for (host, reason), count in sorted(self.retries.items())],
+                'cache_hits': self.cache_hits,
+                'stages': [{'stage': stage, 'detail': detail, **totals}
+                           for (stage, detail), totals in sorted(self.stages.items())],
+            }
+
+    def prometheus(self):
+        """Everything recorded so far in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value, *suffix in samples:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                sample = name + (suffix[0] if suffix else '')
+                lines.append(f"{sample}{{{label_text}}} {value}" if label_text else f"{sample} {value}")
+
+        requests = snapshot['requests']
+        metric('scraper_wall_seconds', 'gauge', "Seconds since the run started", [({}, snapshot['wall_seconds'])])
+        metric('scraper_requests_total', 'counter', "Network requests by host and status",
+               [({'host': host, 'status': status}, count)
+                for host, totals in requests.items() for status, count in totals['statuses'].items()])
+        metric('scraper_response_bytes_total', 'counter', "Decoded response bytes by host",
+               [({'host': host}, totals['bytes']) for host, totals in requests.items()])
+        histogram = []
+        for host, totals in requests.items():
+            histogram += [({'host': host, 'le': bound}, count, '_bucket') for bound, count in totals['buckets'].items()]
+            histogram.append(({'host': host, 'le': '+Inf'}, totals['count'], '_bucket'))
+            histogram.append(({'host': host}, round(totals['seconds'], 6), '_sum'))
+            histogram.append(({'host': host}, totals['count'], '_count'))
+        metric('scraper_request_seconds', 'histogram', "Request latency by host", histogram)
+        metric('scraper_retries_total', 'counter', "Retried requests by host and reason",
+               [({'host': retry['host'], 'reason': retry['reason']}, retry['count']) for retry in snapshot['retries']])
+        metric('scraper_sleep_seconds_total', 'counter', "Seconds spent waiting instead of working, by reason",
+               [({'reason': reason}, seconds) for reason, seconds in snapshot['sleep_seconds'].items()])
+        metric('scraper_cache_hits_total', 'counter', "Requests answered from the response cache",
+               [({}, snapshot['cache_hits'])])
+        stages = snapshot['stages']
+        metric('scraper_stage_seconds_total', 'counter', "Seconds spent in each stage",
+               [({'stage': s['stage'], 'detail': s['detail']}, round(s['seconds'], 6)) for s in stages])
+        metric('scraper_stage_calls_total', 'counter', "Calls of each stage",
+               [({'stage': s['stage'], 'detail': s['detail']}, s['calls']) for s in stages])
+        metric('scraper_stage_items_total', 'counter', "Items (reviews, pages) processed by each stage",
+               [({'stage': s['stage'], 'detail': s['detail']}, s['items']) for s in stages])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the metrics to `path`: Prometheus text for .prom/.txt, JSON otherwise"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            if path.endswith(PROMETHEUS_EXTENSIONS):
+                f.write(self.prometheus())
+            else:
+                json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    def summary(self):
+        """One line splitting the run's time between network, waiting and stages"""
+        snapshot = self.snapshot()
+        requests = sum(totals['count'] for totals in snapshot['requests'].values())
+        size = sum(totals['bytes'] for totals in snapshot['requests'].values())
+        parts = [f"{requests} requests ({size / 1024 / 1024:.1f} MB, {snapshot['cache_hits']} cache hits)",
+                 f"{snapshot['request_seconds']:.1f}s in flight"]
+        parts += [f"{seconds:.1f}s {reason} sleep" for reason, seconds in snapshot['sleep_seconds'].items()]
+        stage_seconds = {}
+        for stage in snapshot['stages']:
+            stage_seconds[stage['stage']] = stage_seconds.get(stage['stage'], 0.0) + stage['seconds']
+        parts += [f"{seconds:.1f}s {stage}" for stage, seconds in stage_seconds.items()]
+        retries = sum(retry['count'] for retry in snapshot['retries'])
+        if retries:
+            parts.append(f"{retries} retries")
+        return f"{snapshot['wall_seconds']:.1f}s wall: " + ', '.join(parts)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def reset():
+    """Start a fresh registry, e.g. between benchmark scenarios"""
+    global _metrics
+    _metrics = Metrics()
+    return _metrics
+
+
+def stage(name, detail='', items=0):
+    return _metrics.stage(name, detail, items)
+
+
+def observe_stage(stage, seconds, items=0, detail=''):
+    _metrics.observe_stage(stage, seconds, items, detail)
+
+
+def observe_request(host, status, seconds, size):
+    _metrics.observe_request(host, status, seconds, size)
+
+
+def observe_retry(host, reason):
+    _metrics.observe_retry(host, reason)
+
+
+def observe_sleep(reason, seconds):
+    _metrics.observe_sleep(reason, seconds)
+
+
+def observe_cache_hit():
+    _metrics.observe_cache_hit()
+
+
+class MetricsTransport(httpx.BaseTransport):
+    """Records each network request's latency (to the last body byte), size and status"""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        response = self.transport.handle_request(request)
+        body = response.read()
+        observe_request(request.url.host, response.status_code, time.perf_counter() - started, len(body))
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncMetricsTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        started = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        body = await response.aread()
+        observe_request(request.url.host, response.status_code, time.perf_counter() - started, len(body))
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def wrap_transport(transport):
+    if isinstance(transport, httpx.AsyncBaseTransport):
+        return AsyncMetricsTransport(transport)
+    return MetricsTransport(transport)
+
+
+@contextmanager
+def profiled(name, profiler='cprofile', directory=DEFAULT_PROFILE_DIR):
+    """
+    Profile the block in the current thread. cProfile writes
+    `<directory>/<name>.pstats`; pyinstrument writes an HTML report and
+    follows asyncio tasks across awaits.
+    """
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler {profiler!r}; expected one of {', '.join(PROFILERS)}")
+    if profiler == 'pyinstrument' and not PYINSTRUMENT_AVAILABLE:
+        raise ImportError("pyinstrument is not installed; use --profile cprofile or pip install pyinstrument")
+    os.makedirs(directory, exist_ok=True)
+    if profiler == 'cprofile':
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            path = os.path.join(directory, f"{name}.pstats")
+            profile.dump_stats(path)
+            print(f"Saved profile to {path}")
+    else:
+        from pyinstrument import Profiler
+
+        profile = Profiler(async_mode='enabled')
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            path = os.path.join(directory, f"{name}.html")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(profile.output_html())
+            print(f"Saved profile to {path}")
+
+
+def add_arguments(parser):
+    """Add --metrics, --profile and --profile-dir to a script's argument parser"""
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="Write request, retry, sleep and stage metrics here (.prom/.txt: Prometheus, else JSON)")
+    parser.add_argument('--profile', choices=PROFILERS, help="Profile the run with cProfile or pyinstrument")
+    parser.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, help="Where profiles are written")
+
+
+@contextmanager
+def session(args, name):
+    """Run a script's work under the profiler and export the metrics on exit, as requested by `args`"""
+    try:
+        if args.profile:
+            with profiled(name, args.profile, args.profile_dir):
+                yield _metrics
+        else:
+            yield _metrics
+    finally:
+        if args.metrics:
+            print(f"Metrics: {_metrics.summary()}")
+            print(f"Saved metrics to {_metrics.write(args.metrics)}")
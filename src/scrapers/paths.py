@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+"""Locations of on-disk caches and run state shared between scraper runs"""
+import os
+
+# Caches that are safe to delete (tokens, HTTP responses)
+CACHE_DIR = os.environ.get('SCRAPER_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'data_scraper'))
+
+# Sync state that belongs next to the scraped outputs (high-water marks, checkpoints)
+STATE_DIR = os.environ.get('SCRAPER_STATE_DIR', '.scraper_state')
+
+
+def cache_path(name):
+    """Return the path of a file inside CACHE_DIR, creating the directory if needed"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, name)
+
+
+def state_path(name):
+    """Return the path of a file inside STATE_DIR, creating the directory if needed"""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, name)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Crawl Google Play reviews for many apps on a pool of worker threads.
+
+Each (package, lang, country) target is paged newest-first, one page per
+task: when a page comes back, the target's next page goes to the back of
+the queue. A large or slow app therefore holds at most one worker at a time
+and every other target keeps moving. Each worker paces itself with its own
+token bucket on top of the shared adaptive limit for play.google.com, so
+throughput grows with the worker count until the host limit is reached.
+Pages are written to one shared sink, in the order they complete, tagged
+with their package, lang and country.
+
+    python play_scheduler.py com.pearhealthlabs.onepass com.example.app --countries us gb --workers 8
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+from google_play_scraper.constants.request import Formats
+
+import dedup
+import googleplay_scraper  # Routes the library's requests through http_client
+import metrics
+import rate_limit
+import sinks
+import sync_state
+
+DEFAULT_WORKERS = 4
+WORKER_RATE = 1.0  # Pages per second each worker may request
+PAGE_SIZE = googleplay_scraper.PAGE_SIZE
+SYNC_SOURCE = googleplay_scraper.SYNC_SOURCE
+PLAY_HOST = urlparse(Formats.Reviews.build(lang='en', country='us')).netloc
+
+_worker = threading.local()
+
+
+class PlayCrawl:
+    """Paging state of one (package, lang, country) target"""
+
+    def __init__(self, package_name, lang, country):
+        self.package_name = package_name
+        self.lang = lang
+        self.country = country
+        self.mark = None
+        self.token = None
+        self.pages = 0
+        self.count = 0
+        self.newest = None
+
+    @property
+    def key(self):
+        return f"{self.package_name}/{self.lang}/{self.country}"
+
+
+def _start_worker(worker_rate):
+    _worker.limiter = rate_limit.TokenBucket(worker_rate, max_rate=worker_rate)
+
+
+def fetch_page(crawl):
+    """
+    Fetch the target's next page on a worker thread; returns the page and
+    the next page's token. Request errors are raised.
+    """
+    _worker.limiter.acquire()
+    started = time.perf_counter()
+    page, token = googleplay_scraper.fetch_page(crawl.package_name, crawl.lang, crawl.country, crawl.token)
+    metrics.observe_stage('page', time.perf_counter() - started, len(page), 'googleplay')
+    return page, token
+
+
+def crawl_many(targets, workers=DEFAULT_WORKERS, worker_rate=WORKER_RATE, rate=None, incremental=False,
+               on_page=None):
+    """
+    Crawl every review for each (package, lang, country) in `targets`.
+
+    `workers` threads fetch pages, each at most `worker_rate` pages per
+    second; `rate` overrides the Play host's starting requests per second.
+    With `incremental` only reviews newer than each target's high-water mark
+    (shared with googleplay_scraper.py) are fetched. Marks are advanced once
+    a target's crawl has finished; a target that fails midway keeps its old
+    mark so the next run fetches the gap again.
+
+    Returns a dict mapping each target to its list of reviews. When
+    `on_page` is given, every page is passed to it instead of being kept in
+    memory and the dict maps each target to its review count. `on_page` is
+    only ever called from the calling thread.
+    """
+    targets = list(dict.fromkeys((package_name, lang.lower(), country.lower())
+                                 for package_name, lang, country in targets))
+    if rate:
+        rate_limit.set_host_rate(PLAY_HOST, rate)
+    crawls = {target: PlayCrawl(*target) for target in targets}
+    if incremental:
+        for crawl in crawls.values():
+            crawl.mark = sync_state.get_mark(SYNC_SOURCE, crawl.key)
+    collected = {target: [] for target in targets}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='play',
+                            initializer=_start_worker, initargs=(worker_rate,)) as executor:
+        pending = {executor.submit(fetch_page, crawl): target for target, crawl in crawls.items()}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                target = pending.pop(future)
+                crawl = crawls[target]
+                try:
+                    page, token = future.result()
+                except Exception as e:
+                    # The target stops here and keeps its old mark, so the next run fetches the gap again
+                    print(f"[{crawl.key}] Error fetching page {crawl.pages + 1}: {e}; "
+                          f"stopped after {crawl.count} reviews")
+                    continue
+
+                crawl.pages += 1
+                crawl.token = token
+                fresh, reached_mark = sync_state.take_unseen(page, crawl.mark, id_key='reviewId', date_key='at')
+                if fresh:
+                    for review in fresh:
+                        review.update(app_id=crawl.package_name, lang=crawl.lang, storefront=crawl.country)
+                    (on_page or collected[target].extend)(fresh)
+                    crawl.count += len(fresh)
+                    crawl.newest = sync_state.newest_review(fresh, crawl.newest, date_key='at')
+
+                if reached_mark or not page or token is None:
+                    print(f"[{crawl.key}] Fetched {crawl.count} reviews in {crawl.pages} pages")
+                    if crawl.newest:
+                        sync_state.update_mark(SYNC_SOURCE, crawl.key, [crawl.newest],
+                                               id_key='reviewId', date_key='at')
+                else:
+                    # Back of the queue, behind every other target's next page
+                    pending[executor.submit(fetch_page, crawl)] = target
+
+    return {target: crawls[target].count if on_page else collected[target] for target in targets}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl Google Play reviews for many apps in parallel")
+    parser.add_argument('packages', nargs='+', help="Play package names")
+    parser.add_argument('--langs', nargs='+', default=[googleplay_scraper.LANG])
+    parser.add_argument('--countries', nargs='+', default=[googleplay_scraper.COUNTRY])
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Threads fetching pages")
+    parser.add_argument('--worker-rate', type=float, default=WORKER_RATE, help="Pages per second per worker")
+    parser.add_argument('--rate', type=float, help="Starting requests per second for the Play host")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only fetch reviews newer than each app's high-water mark")
+    parser.add_argument('--output', default='googleplay_reviews', help="Output file base name")
+    parser.add_argument('--formats', nargs='+', choices=sinks.FORMATS, default=['ndjson', 'csv'])
+    parser.add_argument('--store', action='store_true', help="Also append the reviews to the Parquet review store")
+    parser.add_argument('--aggregate', action='store_true',
+                        help="Fold the new reviews into the dashboard aggregates kept beside the outputs")
+    parser.add_argument('--index', action='store_true', help="Also add the reviews to the full-text search index")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    extra_sinks = []
+    if args.store:
+        from review_store import ReviewStore
+        extra_sinks.append(ReviewStore().sink(source=SYNC_SOURCE))
+    if args.aggregate:
+        from aggregates import AggregateSink
+        extra_sinks.append(AggregateSink(args.output, 'googleplay', append=args.incremental))
+    if args.index:
+        from search_index import ReviewIndex
+        extra_sinks.append(ReviewIndex().sink(source=SYNC_SOURCE))
+
+    targets = [(package_name, lang, country)
+               for package_name in args.packages for lang in args.langs for country in args.countries]
+    started = time.monotonic()
+    with metrics.session(args, 'play_scheduler'):
+        # The same review is often listed under several countries; only its first copy is written
+        output_sink = sinks.open_sinks(args.output, args.formats, append=args.incremental, extra=extra_sinks)
+        with dedup.DedupSink(output_sink, dedup.open_output_index(args.output, args.incremental)) as sink:
+            results = crawl_many(targets, workers=args.workers, worker_rate=args.worker_rate, rate=args.rate,
+                                 incremental=args.incremental, on_page=sink.write_batch)
+    total = sum(results.values())
+    print(f"Fetched {total} reviews for {len(targets)} targets in {time.monotonic() - started:.1f}s")
+    print(f"Wrote {sink.written} new reviews, dropped {sink.duplicates} duplicates")
+    print(f"Saved reviews to {args.output}.*")
+
+
+if __name__ == "__main__":
+    main()
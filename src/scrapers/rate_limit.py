@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+"""
+Adaptive per-host rate limiting and retries.
+
+Each host gets a token bucket whose rate follows AIMD: it creeps up after
+every successful response and is cut multiplicatively on 429/5xx, honouring
+`Retry-After`. Failed requests are retried with jittered exponential
+backoff. The buckets are thread-safe and usable from asyncio code, so the
+sync scrapers, the async crawlers and the Play worker threads all share one
+budget per host. Waits and retries are recorded in metrics.py.
+"""
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import metrics
+
+# Starting requests per second per host; AIMD moves each between MIN_RATE and MAX_RATE_MULTIPLIER x start
+HOST_RATES = {
+    'itunes.apple.com': 1.0,
+    # The customer reviews RSS feed has a bucket of its own (rss_crawler.RSS_LIMITER). Apple's published
+    # limit of about 20 calls a minute is for the Search and Lookup APIs; the feed serves cached documents
+    # and publishes none, and a fan-out over ~175 storefronts could not finish at 1 rps. AIMD still halves
+    # the rate on every 429 and honours Retry-After, and lookups keep the host's 1 rps.
+    'itunes.apple.com/rss': 20.0,
+    'apps.apple.com': 2.0,
+    'amp-api.apps.apple.com': 5.0,
+    'play.google.com': 5.0,
+}
+DEFAULT_RATE = 2.0
+MIN_RATE = 0.1
+MAX_RATE_MULTIPLIER = 4
+ADDITIVE_INCREASE = 0.05  # Requests per second added after each success
+MULTIPLICATIVE_DECREASE = 0.5  # Rate factor applied after a throttled response
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+
+class TokenBucket:
+    """Token bucket with an AIMD-controlled refill rate"""
+
+    def __init__(self, rate, min_rate=MIN_RATE, max_rate=None):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate * MAX_RATE_MULTIPLIER
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waited = 0.0  # Total seconds callers spent waiting on this bucket
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token and return how long the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            burst = max(1.0, self.rate)
+            self.tokens = min(burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            delay = max(-self.tokens / self.rate if self.tokens < 0 else 0.0, self.blocked_until - now)
+            self.waited += delay
+            return delay
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay > 0:
+            metrics.observe_sleep('rate_limit', delay)
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self._reserve()
+        if delay > 0:
+            metrics.observe_sleep('rate_limit', delay)
+            await asyncio.sleep(delay)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE)
+
+    def on_throttle(self, retry_after=None):
+        """Cut the rate and, if the server said so, pause the host until Retry-After has passed"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * MULTIPLICATIVE_DECREASE)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_limiter(host):
+    """Return the shared bucket for a host, creating it on first use"""
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(HOST_RATES.get(host, DEFAULT_RATE))
+        return _buckets[host]
+
+
+def limiter_for_url(url):
+    return get_limiter(urlparse(str(url)).netloc)
+
+
+def set_host_rate(host, rate):
+    """Set a host's starting rate, e.g. from a command-line flag"""
+    HOST_RATES[host] = rate
+    with _buckets_lock:
+        _buckets.pop(host, None)
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def _retry_delay(limiter, response, attempt):
+    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+    limiter.on_throttle(retry_after)
+    # The bucket already holds requests back until Retry-After; only add backoff without one
+    return 0.0 if retry_after is not None else backoff_delay(attempt)
+
+
+def _observe_retry(url, reason, delay):
+    metrics.observe_retry(urlparse(str(url)).hostname, reason)
+    metrics.observe_sleep('backoff', delay)
+
+
+def call_with_retry(send, url, retry_exceptions=(), max_retries=MAX_RETRIES, limiter=None):
+    """
+    Call `send()` under the host's rate limit (or `limiter`, a bucket of the
+    caller's own), retrying throttled (429/5xx) responses and
+    `retry_exceptions`. The last response is returned even if it is still an
+    error.
+    """
+    limiter = limiter or limiter_for_url(url)
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            response = send()
+        except retry_exceptions as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Request to {url} failed ({e}); retrying in {delay:.1f}s")
+            _observe_retry(url, type(e).__name__, delay)
+            time.sleep(delay)
+            continue
+
+        if response.status_code in RETRY_STATUSES:
+            delay = _retry_delay(limiter, response, attempt)
+            if attempt < max_retries:
+                print(f"Request to {url} returned {response.status_code}; retrying in {delay:.1f}s")
+                _observe_retry(url, response.status_code, delay)
+                time.sleep(delay)
+                continue
+        else:
+            limiter.on_success()
+        return response
+
+
+async def call_with_retry_async(send, url, retry_exceptions=(), max_retries=MAX_RETRIES, limiter=None):
+    """Async version of call_with_retry; `send` returns an awaitable"""
+    limiter = limiter or limiter_for_url(url)
+    for attempt in range(max_retries + 1):
+        await limiter.acquire_async()
+        try:
+            response = await send()
+        except retry_exceptions as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Request to {url} failed ({e}); retrying in {delay:.1f}s")
+            _observe_retry(url, type(e).__name__, delay)
+            await asyncio.sleep(delay)
+            continue
+
+        if response.status_code in RETRY_STATUSES:
+            delay = _retry_delay(limiter, response, attempt)
+            if attempt < max_retries:
+                print(f"Request to {url} returned {response.status_code}; retrying in {delay:.1f}s")
+                _observe_retry(url, response.status_code, delay)
+                await asyncio.sleep(delay)
+                continue
+        else:
+            limiter.on_success()
+        return response
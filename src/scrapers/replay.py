@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+"""
+Record and replay HTTP traffic for offline runs and benchmarks.
+
+Recording wraps the shared client's transports and appends every response
+to a cassette (one JSON object per line). Replaying starts a local stand-in
+server that answers from the cassette, optionally with added latency and
+injected 429s, and points the shared client at it, so the scrapers run
+unchanged against reproducible data while still going through the pool,
+the rate limiter and the retry logic.
+
+    python replay.py record cassettes/play.jsonl googleplay_scraper.py
+    python replay.py run cassettes/play.jsonl --latency 0.05 googleplay_scraper.py
+    python replay.py serve cassettes/play.jsonl --port 8765
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import runpy
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httpx
+
+import http_client
+
+REPLAY_HOST_HEADER = 'X-Replay-Host'
+# Stored bodies are already decoded, so encoding and framing headers no longer apply
+DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+# Throttled and failed responses aren't worth replaying; the server injects its own 429s
+UNRECORDED_STATUSES = {429, 500, 502, 503, 504}
+
+
+def request_key(method, host, target, body=b''):
+    """Cassette key: method, host, path and sorted query, plus a body hash when there is a body"""
+    parts = urlsplit(target)
+    key = f"{method.upper()} {host}{parts.path}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    if query:
+        key += f"?{query}"
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if body:
+        key += f" #{hashlib.sha1(body).hexdigest()[:16]}"
+    return key
+
+
+def key_for_url(method, url, body=b''):
+    url = httpx.URL(url)
+    return request_key(method, url.host, url.raw_path.decode('ascii'), body)
+
+
+class Cassette:
+    """Responses keyed by request_key, stored as JSON lines"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry['key']] = entry
+
+    def add(self, key, status, headers, body):
+        entry = {
+            'key': key,
+            'status': status,
+            'headers': {name: value for name, value in headers.items() if name.lower() not in DROPPED_HEADERS},
+        }
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        try:
+            entry['body'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['body_hex'] = body.hex()
+
+        with self._lock:
+            self.entries[key] = entry
+            if self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    @staticmethod
+    def body(entry):
+        if 'body_hex' in entry:
+            return bytes.fromhex(entry['body_hex'])
+        return entry['body'].encode('utf-8')
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _request_key(request):
+    return request_key(request.method, request.url.host, request.url.raw_path.decode('ascii'), request.read())
+
+
+def _recorded_response(cassette, request, response, body):
+    if response.status_code not in UNRECORDED_STATUSES:
+        cassette.add(_request_key(request), response.status_code, response.headers, body)
+    headers = [(name, value) for name, value in response.headers.multi_items() if name.lower() not in DROPPED_HEADERS]
+    return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Passes requests to the network and stores each response in a cassette"""
+
+    def __init__(self, transport, cassette):
+        self.transport = transport
+        self.cassette = cassette
+
+    def handle_request(self, request):
+        response = self.transport.handle_request(request)
+        try:
+            body = response.read()
+        finally:
+            response.close()
+        return _recorded_response(self.cassette, request, response, body)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport, cassette):
+        self.transport = transport
+        self.cassette = cassette
+
+    async def handle_async_request(self, request):
+        response = await self.transport.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        return _recorded_response(self.cassette, request, response, body)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class ReplayStats:
+    """Client-side view of replayed traffic: request count, statuses and page latencies"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def observe(self, status, elapsed, size):
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.bytes += size
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    def percentile(self, fraction):
+        """Nearest-rank percentile of the observed latencies, in seconds"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def _redirected(request, server_url):
+    target = httpx.URL(server_url).copy_with(raw_path=request.url.raw_path)
+    headers = [(name, value) for name, value in request.headers.multi_items() if name.lower() != 'host']
+    headers.append((REPLAY_HOST_HEADER, request.url.host))
+    return httpx.Request(request.method, target, headers=headers, content=request.read(),
+                         extensions=request.extensions)
+
+
+class RedirectTransport(httpx.BaseTransport):
+    """Sends every request to the replay server, keeping the original host in a header"""
+
+    def __init__(self, transport, server_url, stats=None):
+        self.transport = transport
+        self.server_url = server_url
+        self.stats = stats
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        response = self.transport.handle_request(_redirected(request, self.server_url))
+        body = response.read()
+        if self.stats is not None:
+            self.stats.observe(response.status_code, time.perf_counter() - started, len(body))
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRedirectTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport, server_url, stats=None):
+        self.transport = transport
+        self.server_url = server_url
+        self.stats = stats
+
+    async def handle_async_request(self, request):
+        started = time.perf_counter()
+        response = await self.transport.handle_async_request(_redirected(request, self.server_url))
+        body = await response.aread()
+        if self.stats is not None:
+            self.stats.observe(response.status_code, time.perf_counter() - started, len(body))
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep connections alive like the real hosts do
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+    def do_GET(self):
+        self.server.replay.respond(self)
+
+    do_POST = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer:
+    """
+    Local stand-in for the App Store, iTunes and Play hosts.
+
+    Answers from a cassette after `latency` (+ up to `jitter`) seconds and
+    throttles a `throttle_rate` fraction of requests with a 429 carrying
+    `Retry-After: retry_after`. Requests missing from the cassette get a 404.
+    """
+
+    def __init__(self, cassette, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 throttle_rate=0.0, retry_after=1, seed=None):
+        self.cassette = cassette
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.requests = 0
+        self.throttled = 0
+        self.misses = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _ReplayHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.replay = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _send(self, handler, status, headers, body):
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def respond(self, handler):
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+        host = handler.headers.get(REPLAY_HOST_HEADER) or handler.headers.get('Host', '')
+        key = request_key(handler.command, host, handler.path, body)
+
+        with self._lock:
+            self.requests += 1
+            throttle = self._random.random() < self.throttle_rate
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        if throttle:
+            with self._lock:
+                self.throttled += 1
+            self._send(handler, 429, {'Retry-After': str(self.retry_after), 'Content-Type': 'text/plain'},
+                       b'Too Many Requests')
+            return
+
+        entry = self.cassette.get(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            self._send(handler, 404, {'Content-Type': 'application/json'},
+                       json.dumps({'error': 'not in cassette', 'key': key}).encode('utf-8'))
+            return
+        self._send(handler, entry['status'], entry['headers'], Cassette.body(entry))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _wrapper(sync_cls, async_cls, *args):
+    def wrap(transport):
+        if isinstance(transport, httpx.AsyncBaseTransport):
+            return async_cls(transport, *args)
+        return sync_cls(transport, *args)
+    return wrap
+
+
+@contextmanager
+def _uncached():
+    """Bypass the response cache so every request reaches the network or the replay server"""
+    cache = http_client.get_response_cache()
+    http_client.set_response_cache(None)
+    try:
+        yield
+    finally:
+        http_client.set_response_cache(cache)
+
+
+@contextmanager
+def recording(cassette):
+    """Record every request made through http_client into `cassette`"""
+    with _uncached():
+        http_client.set_transport_wrapper(_wrapper(RecordingTransport, AsyncRecordingTransport, cassette))
+        try:
+            yield cassette
+        finally:
+            http_client.set_transport_wrapper(None)
+
+
+@contextmanager
+def replaying(server_url, stats=None):
+    """Send every request made through http_client to the replay server at `server_url`"""
+    with _uncached():
+        http_client.set_transport_wrapper(_wrapper(RedirectTransport, AsyncRedirectTransport, server_url, stats))
+        try:
+            yield stats
+        finally:
+            http_client.set_transport_wrapper(None)
+
+
+def _run_script(script, script_args):
+    sys.argv = [script] + list(script_args)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    runpy.run_path(script, run_name='__main__')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay scraper HTTP traffic")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help="Run a scraper against the network and record its responses")
+    record_parser.add_argument('cassette')
+    record_parser.add_argument('script')
+    record_parser.add_argument('script_args', nargs=argparse.REMAINDER)
+
+    for name, help_text in (('run', "Run a scraper against a local replay server"),
+                            ('serve', "Serve a cassette until interrupted")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('cassette')
+        sub.add_argument('--port', type=int, default=0)
+        sub.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+        sub.add_argument('--jitter', type=float, default=0.0, help="Up to this many extra seconds per response")
+        sub.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+        sub.add_argument('--retry-after', type=int, default=1)
+        sub.add_argument('--seed', type=int)
+        if name == 'run':
+            sub.add_argument('script')
+            sub.add_argument('script_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        cassette = Cassette(args.cassette)
+        with recording(cassette):
+            _run_script(args.script, args.script_args)
+        print(f"Recorded {len(cassette)} responses to {args.cassette}")
+        return
+
+    server = ReplayServer(Cassette(args.cassette), port=args.port, latency=args.latency, jitter=args.jitter,
+                          throttle_rate=args.throttle_rate, retry_after=args.retry_after, seed=args.seed)
+    with server:
+        if args.command == 'serve':
+            print(f"Serving {len(server.cassette)} responses from {args.cassette} at {server.url}")
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                pass
+        else:
+            with replaying(server.url):
+                _run_script(args.script, args.script_args)
+            print(f"Replayed {server.requests} requests ({server.throttled} throttled, {server.misses} not in cassette)")
+
+
+if __name__ == "__main__":
+    main()
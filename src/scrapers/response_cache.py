@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+"""
+On-disk HTTP response cache shared by every scraper run.
+
+GET responses are stored under a hash of the canonical request (method,
+host, path, sorted query and the headers that change the representation),
+so the same lookup, token page or review page is found again whatever the
+parameter order. Bodies are stored once per content hash. A response is
+served locally while it is fresh. Once stale, it is revalidated with
+If-None-Match/If-Modified-Since, so an unchanged page costs a 304 instead
+of a full download. Requests sent with `Cache-Control: no-cache` skip the
+fresh copy and always revalidate. How long a response stays fresh is set
+per endpoint in ENDPOINT_TTLS. Entries are evicted least recently used
+first once the bodies exceed the size cap.
+
+    python response_cache.py stats
+    python response_cache.py prune --max-mb 100
+    python response_cache.py clear
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+from paths import cache_path
+
+CACHE_DIRNAME = 'http'
+INDEX_FILE = 'index.sqlite'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Seconds a response stays fresh, by the first pattern matching "host/path"; 0 always revalidates
+ENDPOINT_TTLS = [
+    (r'^itunes\.apple\.com/lookup', 6 * 3600),  # App metadata
+    (r'^itunes\.apple\.com/\w+/rss/customerreviews', 300),  # Review feeds, shared by overlapping runs
+    (r'^amp-api\.apps\.apple\.com/v1/catalog/\w+/apps/\d+/reviews', 300),
+    (r'^apps\.apple\.com/', 12 * 3600),  # App pages (token, embedded reviews)
+]
+DEFAULT_TTL = 0
+
+# Request headers that select a different representation of the same URL
+KEY_HEADERS = ('accept', 'accept-language')
+# Stored bodies are already decoded, so encoding and framing headers no longer apply
+DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+# Headers a 304 may update on the stored response
+REVALIDATED_HEADERS = ('cache-control', 'date', 'etag', 'expires', 'last-modified')
+CACHE_STATUS_HEADER = 'X-Cache'
+# Request extension carrying (key, entry) of a lookup already made by http_client, so the transport doesn't repeat it
+ENTRY_EXTENSION = 'response_cache_entry'
+
+
+def request_key(request):
+    """Hash of the canonical request: method, host, path, sorted query and KEY_HEADERS"""
+    query = urlencode(sorted(parse_qsl(request.url.query.decode('ascii'), keep_blank_values=True)))
+    parts = [request.method.upper(), request.url.host, request.url.path, query]
+    parts += [f"{name}={request.headers.get(name, '')}" for name in KEY_HEADERS]
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def endpoint_ttl(url, ttls=ENDPOINT_TTLS):
+    """TTL override for the endpoint of `url`, or None when no pattern matches"""
+    endpoint = f"{url.host}{url.path}"
+    for pattern, ttl in ttls:
+        if re.search(pattern, endpoint):
+            return ttl
+    return None
+
+
+def _cache_control(headers):
+    directives = {}
+    for directive in headers.get('cache-control', '').split(','):
+        name, _, value = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+class ResponseCache:
+    """
+    Index of cached responses in SQLite, bodies as files named by their hash.
+
+    Safe to share between threads; several processes may use the same
+    directory since bodies are written atomically and never change.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, ttls=ENDPOINT_TTLS, default_ttl=DEFAULT_TTL):
+        self.directory = directory or cache_path(CACHE_DIRNAME)
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.directory, 'bodies'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.directory, INDEX_FILE), check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, body TEXT,
+                etag TEXT, last_modified TEXT, expires REAL, used REAL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS bodies (hash TEXT PRIMARY KEY, size INTEGER)")
+        self.conn.commit()
+
+    def _body_path(self, digest):
+        return os.path.join(self.directory, 'bodies', digest[:2], digest)
+
+    def _read_body(self, digest):
+        try:
+            with open(self._body_path(digest), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_body(self, body):
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._body_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        self.conn.execute("INSERT OR IGNORE INTO bodies (hash, size) VALUES (?, ?)", (digest, len(body)))
+        return digest
+
+    def _drop_orphans(self, digests):
+        for digest in set(digests):
+            if self.conn.execute("SELECT 1 FROM entries WHERE body = ? LIMIT 1", (digest,)).fetchone():
+                continue
+            self.conn.execute("DELETE FROM bodies WHERE hash = ?", (digest,))
+            try:
+                os.remove(self._body_path(digest))
+            except OSError:
+                pass
+
+    def _expires(self, url, headers, now):
+        """Endpoint override first, then the server's max-age, then the default TTL"""
+        ttl = endpoint_ttl(url, self.ttls)
+        if ttl is None:
+            max_age = _cache_control(headers).get('max-age')
+            ttl = int(max_age) if max_age and max_age.isdigit() else self.default_ttl
+        return now + ttl
+
+    def _response(self, request, status, headers, body, cache_status):
+        headers = [(name, value) for name, value in headers if name.lower() not in DROPPED_HEADERS]
+        headers.append((CACHE_STATUS_HEADER, cache_status))
+        return httpx.Response(status, headers=headers, content=body, request=request)
+
+    def _lookup(self, key):
+        row = self.conn.execute(
+            "SELECT status, headers, body, etag, last_modified, expires FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        status, headers, digest, etag, last_modified, expires = row
+        body = self._read_body(digest)
+        if body is None:  # Body removed from under the index (e.g. cache dir cleaned by hand)
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.conn.commit()
+            return None
+        return {'status': status, 'headers': json.loads(headers), 'body': body,
+                'etag': etag, 'last_modified': last_modified, 'expires': expires}
+
+    def cacheable(self, request):
+        return request.method == 'GET' and 'no-store' not in _cache_control(request.headers)
+
+    def lookup(self, request):
+        """
+        Look a request up with a single index query. Returns (response,
+        entry): the cached response when it can be used without asking the
+        server, else the stale entry to revalidate (None if there is none).
+        A request sent with `Cache-Control: no-cache` always goes to the
+        server, which may still answer 304 for an unchanged page.
+        """
+        if not self.cacheable(request):
+            return None, None
+        key = request_key(request)
+        with self._lock:
+            entry = self._lookup(key)
+            if (entry is None or entry['expires'] <= time.time()
+                    or 'no-cache' in _cache_control(request.headers)):
+                return None, entry
+            self.conn.execute("UPDATE entries SET used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+        return self._response(request, entry['status'], entry['headers'], entry['body'], 'hit'), None
+
+    def prepare(self, request):
+        """
+        Look up a request about to go to the network. Returns (response,
+        entry): a fresh cached response to use instead, or the stale entry
+        whose validators have been added to the request. A lookup made
+        earlier for the same request (see ENTRY_EXTENSION) is reused.
+        """
+        looked_up = request.extensions.get(ENTRY_EXTENSION)
+        # A redirect carries the extensions of the original request over to a different URL
+        if looked_up is not None and looked_up[0] == request_key(request):
+            response, entry = None, looked_up[1]
+        else:
+            response, entry = self.lookup(request)
+        if entry is not None:
+            if entry['etag']:
+                request.headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request.headers['If-Modified-Since'] = entry['last_modified']
+        return response, entry
+
+    def store(self, request, response, body, entry=None):
+        """Record a network response (body already read) and return the response to hand back"""
+        headers = response.headers.multi_items()
+        key = request_key(request)
+        now = time.time()
+        if response.status_code == 304 and entry is not None:
+            stored = [(name, value) for name, value in entry['headers'] if name.lower() not in REVALIDATED_HEADERS]
+            stored += [(name, value) for name, value in headers if name.lower() in REVALIDATED_HEADERS]
+            with self._lock:
+                self.conn.execute("UPDATE entries SET headers = ?, expires = ?, used = ? WHERE key = ?",
+                                  (json.dumps(stored), self._expires(request.url, response.headers, now), now, key))
+                self.conn.commit()
+                self.revalidated += 1
+            return self._response(request, entry['status'], stored, entry['body'], 'revalidated')
+
+        with self._lock:
+            self.misses += 1
+            if response.status_code == 200 and 'no-store' not in _cache_control(response.headers):
+                stored = [(name, value) for name, value in headers if name.lower() not in DROPPED_HEADERS]
+                old = self.conn.execute("SELECT body FROM entries WHERE key = ?", (key,)).fetchone()
+                digest = self._write_body(body)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, url, status, headers, body, etag, last_modified, expires, used)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, str(request.url), response.status_code, json.dumps(stored), digest,
+                     response.headers.get('etag'), response.headers.get('last-modified'),
+                     self._expires(request.url, response.headers, now), now))
+                if old and old[0] != digest:
+                    self._drop_orphans([old[0]])
+                self._evict()
+                self.conn.commit()
+        return self._response(request, response.status_code, headers, body, 'miss')
+
+    def size(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+
+    def _evict(self):
+        total = self.size()
+        while total > self.max_bytes:
+            victims = self.conn.execute("SELECT key, body FROM entries ORDER BY used LIMIT 64").fetchall()
+            if not victims:
+                break
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+            self._drop_orphans([digest for _, digest in victims])
+            total = self.size()
+
+    def prune(self, max_bytes=None):
+        """Evict least recently used entries until the bodies fit in `max_bytes`"""
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._evict()
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            digests = [digest for (digest,) in self.conn.execute("SELECT hash FROM bodies")]
+            self.conn.execute("DELETE FROM entries")
+            self._drop_orphans(digests)
+            self.conn.commit()
+
+    def stats(self):
+        entries, fresh = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(expires > ?), 0) FROM entries", (time.time(),)).fetchone()
+        bodies = self.conn.execute("SELECT COUNT(*) FROM bodies").fetchone()[0]
+        return {'entries': entries, 'fresh': fresh, 'bodies': bodies, 'bytes': self.size(),
+                'hits': self.hits, 'revalidated': self.revalidated, 'misses': self.misses}
+
+    def close(self):
+        self.conn.close()
+
+
+class CachingTransport(httpx.BaseTransport):
+    """Answers fresh GETs from the cache and revalidates stale ones with conditional requests"""
+
+    def __init__(self, transport, cache):
+        self.transport = transport
+        self.cache = cache
+
+    def handle_request(self, request):
+        if not self.cache.cacheable(request):
+            return self.transport.handle_request(request)
+        cached, entry = self.cache.prepare(request)
+        if cached is not None:
+            return cached
+        response = self.transport.handle_request(request)
+        try:
+            body = response.read()
+        finally:
+            response.close()
+        return self.cache.store(request, response, body, entry)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncCachingTransport(httpx.AsyncBaseTransport):
+    """CachingTransport for async clients; the index and body files are read and written off the event loop"""
+
+    def __init__(self, transport, cache):
+        self.transport = transport
+        self.cache = cache
+
+    async def handle_async_request(self, request):
+        if not self.cache.cacheable(request):
+            return await self.transport.handle_async_request(request)
+        cached, entry = await asyncio.to_thread(self.cache.prepare, request)
+        if cached is not None:
+            return cached
+        response = await self.transport.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        return await asyncio.to_thread(self.cache.store, request, response, body, entry)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def wrap_transport(transport, cache):
+    if isinstance(transport, httpx.AsyncBaseTransport):
+        return AsyncCachingTransport(transport, cache)
+    return CachingTransport(transport, cache)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or trim the on-disk HTTP response cache")
+    parser.add_argument('--dir', help="Cache directory (default: the http/ folder in SCRAPER_CACHE_DIR)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help="Show entry counts and size")
+    prune = subparsers.add_parser('prune', help="Evict least recently used entries down to a size")
+    prune.add_argument('--max-mb', type=float, required=True)
+    subparsers.add_parser('clear', help="Remove every cached response")
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.dir)
+    try:
+        if args.command == 'prune':
+            cache.prune(int(args.max_mb * 1024 * 1024))
+        elif args.command == 'clear':
+            cache.clear()
+        stats = cache.stats()
+        print(f"{stats['entries']} responses ({stats['fresh']} fresh), "
+              f"{stats['bodies']} bodies, {stats['bytes'] / 1024 / 1024:.1f} MB in {cache.directory}")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Review extraction from App Store page markup.
+
+The lxml backend finds review cards with one compiled XPath and fills in
+each card's fields in a single walk over its descendants, instead of five
+CSS queries per card. BeautifulSoup remains as a fallback when lxml is not
+installed. `IncrementalReviewExtractor` pulls only the outerHTML of cards
+added since its last call, so a page is never re-parsed as it grows.
+"""
+import importlib.util
+import time
+
+import metrics
+
+# lxml is only imported on the first parse
+LXML_AVAILABLE = importlib.util.find_spec('lxml') is not None
+
+REVIEW_CLASS = 'we-customer-review'
+REVIEW_SELECTOR = f".{REVIEW_CLASS}"
+FIELD_CLASSES = {
+    'we-customer-review__title': 'title',
+    'we-customer-review__body': 'content',
+    'we-customer-review__rating': 'rating',
+    'we-customer-review__user': 'author',
+    'we-customer-review__date': 'date',
+}
+BACKENDS = ('lxml', 'bs4')
+DEFAULT_BACKEND = 'lxml' if LXML_AVAILABLE else 'bs4'
+
+# outerHTML of the review cards from index arguments[1] onwards
+NEW_CARDS_SCRIPT = (
+    "var cards = document.querySelectorAll(arguments[0]);"
+    "var html = [];"
+    "for (var i = arguments[1]; i < cards.length; i++) { html.push(cards[i].outerHTML); }"
+    "return html;"
+)
+
+_cards_xpath = None
+
+
+def _compiled_cards_xpath():
+    global _cards_xpath
+    if _cards_xpath is None:
+        from lxml import etree
+        _cards_xpath = etree.XPath(
+            f"//*[contains(concat(' ', normalize-space(@class), ' '), ' {REVIEW_CLASS} ')]"
+        )
+    return _cards_xpath
+
+
+def _parse_rating(label):
+    """Star count from an aria-label such as '4 out of 5'"""
+    try:
+        return int(label.split()[0]) if label else None
+    except ValueError:
+        return None
+
+
+def build_review(idx, title=None, content=None, rating_label=None, author=None, date=None):
+    return {
+        'id': f"appstore_review_{idx+1}",
+        'title': title or "No Title",
+        'content': content or "No Content",
+        'rating': _parse_rating(rating_label),
+        'author': author or "Anonymous",
+        'date': date or None,
+        'version': "N/A",  # App Store doesn't always show version in reviews
+        'source': "App Store Browser Automation"
+    }
+
+
+def _parse_lxml(html, start_index):
+    from lxml import html as lxml_html
+
+    reviews = []
+    if not html.strip():
+        return reviews
+    root = lxml_html.fromstring(html)
+    for offset, card in enumerate(_compiled_cards_xpath()(root)):
+        fields = {}
+        for element in card.iterdescendants():
+            classes = element.get('class')
+            if not classes:
+                continue
+            for name in classes.split():
+                field = FIELD_CLASSES.get(name)
+                if field and field not in fields:
+                    fields[field] = element
+        try:
+            rating = fields.get('rating')
+            reviews.append(build_review(
+                start_index + offset,
+                title=fields['title'].text_content().strip() if 'title' in fields else None,
+                content=fields['content'].text_content().strip() if 'content' in fields else None,
+                rating_label=rating.get('aria-label') if rating is not None else None,
+                author=fields['author'].text_content().strip() if 'author' in fields else None,
+                date=fields['date'].text_content().strip() if 'date' in fields else None,
+            ))
+        except Exception as e:
+            print(f"Error extracting review {start_index + offset + 1}: {e}")
+    return reviews
+
+
+def _parse_bs4(html, start_index):
+    from bs4 import BeautifulSoup
+
+    reviews = []
+    soup = BeautifulSoup(html, 'html.parser')
+    for offset, card in enumerate(soup.select(REVIEW_SELECTOR)):
+        try:
+            title = card.select_one(".we-customer-review__title")
+            content = card.select_one(".we-customer-review__body")
+            rating = card.select_one(".we-customer-review__rating")
+            author = card.select_one(".we-customer-review__user")
+            date = card.select_one(".we-customer-review__date")
+            reviews.append(build_review(
+                start_index + offset,
+                title=title.text.strip() if title else None,
+                content=content.text.strip() if content else None,
+                rating_label=rating.get('aria-label') if rating else None,
+                author=author.text.strip() if author else None,
+                date=date.text.strip() if date else None,
+            ))
+        except Exception as e:
+            print(f"Error extracting review {start_index + offset + 1}: {e}")
+    return reviews
+
+
+_PARSERS = {'lxml': _parse_lxml, 'bs4': _parse_bs4}
+
+
+def parse_reviews(html, start_index=0, backend=None):
+    """Parse every review card in `html`; ids are numbered from `start_index`"""
+    backend = backend or DEFAULT_BACKEND
+    if backend == 'lxml' and not LXML_AVAILABLE:
+        raise ImportError("lxml is not installed; use backend='bs4' or pip install lxml")
+    started = time.perf_counter()
+    reviews = _PARSERS[backend](html, start_index)
+    metrics.observe_stage('parse', time.perf_counter() - started, len(reviews), 'html')
+    return reviews
+
+
+class IncrementalReviewExtractor:
+    """
+    Parse only the review cards added to a live page since the last call.
+
+    Each call fetches the new cards' outerHTML with one `execute_script`
+    instead of the whole `page_source`.
+    """
+
+    def __init__(self, driver, backend=None):
+        self.driver = driver
+        self.backend = backend
+        self.seen = 0
+
+    def extract_new(self):
+        fragments = self.driver.execute_script(NEW_CARDS_SCRIPT, REVIEW_SELECTOR, self.seen) or []
+        if not fragments:
+            return []
+        reviews = parse_reviews(f"<div>{''.join(fragments)}</div>", start_index=self.seen, backend=self.backend)
+        self.seen += len(fragments)
+        return reviews
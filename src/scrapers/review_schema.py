@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""
+One typed, columnar schema for reviews from every source.
+
+Each scraper writes its own record shape:
+- Google Play writes google-play-scraper's raw dicts (reviewId/score/at/reviewCreatedVersion).
+- The StoreFront and RSS paths write flat dicts; RSS leaves `rating` as a string.
+- appstore_final_scraper uses `review` instead of `content`.
+
+`normalize_batch` converts a whole batch, list of dicts or DataFrame, a
+column at a time. Aliased columns are coalesced, and ratings become int8.
+Dates become UTC timestamps. Source, app, storefront and version become
+categoricals. The review store, the analytics and the aggregates all read
+this one frame, so no downstream code handles rows one dict at a time.
+"""
+import numpy as np
+import pandas as pd
+
+MISSING_RATING = 0  # int8 has no NA; 0 marks a review without a star rating
+
+# Output column -> dtype; text columns hold Python strings or None
+DTYPES = {
+    'id': object,
+    'source': 'category',
+    'app_id': 'category',
+    'storefront': 'category',
+    'title': object,
+    'content': object,
+    'rating': np.int8,
+    'author': object,
+    'date': 'datetime64[ns, UTC]',
+    'version': 'category',
+    'replied': bool,
+}
+
+# Field names used by the different scrapers, coalesced in this order
+ALIASES = {
+    'id': ('id', 'reviewId'),
+    'title': ('title',),
+    'content': ('content', 'review'),
+    'rating': ('rating', 'score'),
+    'author': ('author', 'userName'),
+    'date': ('date', 'at', 'updated'),
+    'version': ('version', 'reviewCreatedVersion', 'appVersion'),
+    'reply': ('replyContent',),
+}
+
+# Source labels written by the scrapers, mapped to short source keys
+SOURCE_KEYS = {
+    'StoreFront API': 'storefront',
+    'App Store Browser Automation': 'browser',
+}
+RSS_SOURCE_PATTERN = r'^RSS Feed \((\w+)\)$'
+# Placeholder rows the scrapers write when no reviews could be fetched
+PLACEHOLDER_SOURCES = {'API Fallback', 'Fallback Message'}
+PLACEHOLDER_ID_PREFIXES = ('api_fallback_', 'fallback_review_', 'mock_review_')
+MISSING_VERSIONS = ('', 'N/A')
+
+
+def _coalesce(frame, name):
+    """First non-empty value across the aliases of `name`, as an object column"""
+    result = None
+    for alias in ALIASES[name]:
+        if alias not in frame.columns:
+            continue
+        column = frame[alias].astype(object)
+        column = column.mask(column.isna() | (column == ''), None)
+        result = column if result is None else result.where(result.notna(), column)
+    return result if result is not None else pd.Series(None, index=frame.index, dtype=object)
+
+
+def _text(column):
+    if column.dtype == object and pd.api.types.infer_dtype(column, skipna=True) in ('string', 'empty'):
+        return column
+    return column.where(column.isna(), column.astype(str)).astype(object)
+
+
+def parse_dates(values):
+    """
+    Parse a column of dates to UTC timestamps (NaT when missing or unparseable).
+
+    ISO 8601 strings and datetimes, which nearly every source writes, go
+    through pandas' vectorized parser. Only what that leaves unparsed (e.g.
+    the browser path's "Mar 3, 2025") is parsed one value at a time.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.to_datetime(values, utc=True)
+    parsed = pd.to_datetime(values, utc=True, errors='coerce', format='ISO8601')
+    leftover = parsed.isna() & values.notna()
+    if leftover.any():
+        parsed[leftover] = pd.to_datetime(values[leftover], utc=True, errors='coerce', format='mixed')
+    return parsed
+
+
+def _sources(frame, source, storefront):
+    """Source keys and RSS storefronts from the per-row source labels"""
+    if 'source' in frame.columns:
+        labels = frame['source'].astype('category')
+        categories = pd.Series(labels.cat.categories, dtype=object)
+        rss = categories.str.extract(RSS_SOURCE_PATTERN)[0]
+        keys = categories.map(lambda label: SOURCE_KEYS.get(label, label)).where(rss.isna(), 'rss')
+        # Mapped once per distinct label, then expanded through the category codes
+        codes = labels.cat.codes.to_numpy()
+        sources = pd.Series(np.where(codes >= 0, keys.to_numpy()[codes], None), index=frame.index, dtype=object)
+        storefronts = pd.Series(np.where(codes >= 0, rss.to_numpy()[codes], None), index=frame.index, dtype=object)
+    else:
+        sources = pd.Series(None, index=frame.index, dtype=object)
+        storefronts = pd.Series(None, index=frame.index, dtype=object)
+
+    if 'reviewId' in frame.columns:
+        sources = sources.where(sources.notna() | frame['reviewId'].isna(), 'googleplay')
+    sources = sources.fillna(source or 'unknown')
+    if 'storefront' in frame.columns:
+        storefronts = _text(frame['storefront'].where(frame['storefront'].notna(), storefronts))
+    return sources, storefronts.fillna(storefront) if storefront else storefronts
+
+
+def placeholder_mask(frame):
+    """Rows the scrapers wrote as a note when no reviews could be fetched"""
+    mask = pd.Series(False, index=frame.index)
+    if 'source' in frame.columns:
+        mask |= frame['source'].isin(PLACEHOLDER_SOURCES)
+    if 'id' in frame.columns:
+        mask |= frame['id'].astype(str).str.startswith(PLACEHOLDER_ID_PREFIXES)
+    return mask
+
+
+def normalize_batch(records, source=None, app_id=None, storefront=None, drop_placeholders=True):
+    """
+    Convert a batch of scraped records (list of dicts or DataFrame) into the
+    typed review frame. `source`, `app_id` and `storefront` fill in what the
+    records don't carry themselves.
+    """
+    frame = records if isinstance(records, pd.DataFrame) else pd.DataFrame.from_records(list(records))
+    if drop_placeholders and len(frame):
+        frame = frame[~placeholder_mask(frame)]
+    if frame.empty:
+        return pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in DTYPES.items()})
+
+    sources, storefronts = _sources(frame, source, storefront)
+    app_ids = _text(frame['app_id']) if 'app_id' in frame.columns else pd.Series(None, index=frame.index, dtype=object)
+    ratings = pd.to_numeric(_coalesce(frame, 'rating'), errors='coerce').round()
+    version = _text(_coalesce(frame, 'version'))
+    reply = _coalesce(frame, 'reply')
+
+    normalized = pd.DataFrame({
+        'id': _text(_coalesce(frame, 'id')),
+        'source': sources,
+        'app_id': app_ids.fillna(app_id or 'unknown'),
+        'storefront': storefronts,
+        'title': _text(_coalesce(frame, 'title')),
+        'content': _text(_coalesce(frame, 'content')),
+        'rating': ratings.where(ratings.between(1, 5), MISSING_RATING),
+        'author': _text(_coalesce(frame, 'author')),
+        'date': parse_dates(_coalesce(frame, 'date')),
+        'version': version.mask(version.isin(MISSING_VERSIONS), None),
+        'replied': reply.notna(),
+    })
+    return normalized.astype(DTYPES).reset_index(drop=True)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+Columnar Parquet store for scraped reviews.
+
+Reviews from every source are kept in one Hive-partitioned Parquet dataset
+(`source=.../app_id=.../day=YYYY-MM-DD/`) with typed columns, so queries
+over years of reviews only read the columns and partitions they need.
+Each append adds new files; `compact` merges each partition's files into
+one and drops duplicate review ids.
+"""
+import argparse
+import glob
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import review_schema
+
+REVIEW_STORE_DIR = 'review_store'
+STORE_BATCH_SIZE = 50000  # Rows buffered by a store sink before a write
+
+REVIEW_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('source', pa.string()),  # Partition key: stored once per directory, not per row
+    ('app_id', pa.string()),
+    ('storefront', pa.string()),
+    ('title', pa.string()),
+    ('content', pa.string()),
+    ('rating', pa.int8()),
+    ('author', pa.dictionary(pa.int32(), pa.string())),
+    ('date', pa.timestamp('us', tz='UTC')),
+    ('version', pa.dictionary(pa.int32(), pa.string())),
+    ('day', pa.date32()),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('source', pa.string()), ('app_id', pa.string()), ('day', pa.date32())]),
+    flavor='hive',
+)
+
+
+def build_table(reviews):
+    """Build a typed Arrow table from a normalized review frame (see review_schema)"""
+    frame = reviews.drop(columns=['replied']).assign(
+        rating=reviews['rating'].where(reviews['rating'] != review_schema.MISSING_RATING),
+        day=reviews['date'].dt.date,
+    )
+    return pa.Table.from_pandas(frame, schema=REVIEW_SCHEMA, preserve_index=False)
+
+
+class ReviewStore:
+    """Append-only, partitioned Parquet dataset of reviews"""
+
+    def __init__(self, root=REVIEW_STORE_DIR):
+        self.root = root
+
+    def append(self, reviews):
+        """Write a normalized review frame as new files in its partitions"""
+        if reviews.empty:
+            return
+        ds.write_dataset(
+            build_table(reviews),
+            self.root,
+            format='parquet',
+            partitioning=PARTITIONING,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+        )
+
+    def dataset(self):
+        return ds.dataset(self.root, format='parquet', partitioning=PARTITIONING, schema=REVIEW_SCHEMA)
+
+    def read(self, columns=None, filter=None):
+        """
+        Read a table, pruning partitions with `filter` and columns with `columns`,
+        e.g. read(['rating', 'date'], (ds.field('source') == 'googleplay') & (ds.field('day') >= date(2024, 1, 1)))
+        """
+        return self.dataset().to_table(columns=columns, filter=filter)
+
+    def compact(self):
+        """Merge each partition's files into one, keeping the last copy of every review id"""
+        compacted = 0
+        for partition in sorted({os.path.dirname(path) for path in glob.glob(os.path.join(self.root, '**', '*.parquet'), recursive=True)}):
+            files = sorted(glob.glob(os.path.join(partition, '*.parquet')))
+            if len(files) < 2:
+                continue
+
+            frame = pq.read_table(files, partitioning=None).to_pandas()
+            frame = frame.drop_duplicates(subset='id', keep='last')
+            data_schema = pa.schema([field for field in REVIEW_SCHEMA if field.name not in PARTITIONING.schema.names])
+            table = pa.Table.from_pandas(frame, schema=data_schema, preserve_index=False)
+
+            tmp_path = os.path.join(partition, f"compacted-{uuid.uuid4().hex}.parquet.tmp")
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, tmp_path[:-len('.tmp')])
+            for path in files:
+                os.remove(path)
+            compacted += 1
+        print(f"Compacted {compacted} partitions")
+        return compacted
+
+    def sink(self, source=None, app_id=None, storefront=None, batch_size=STORE_BATCH_SIZE):
+        return ReviewStoreSink(self, source, app_id, storefront, batch_size)
+
+
+class ReviewStoreSink:
+    """Sink that normalizes scraped reviews batch by batch and appends them in large writes"""
+
+    def __init__(self, store, source=None, app_id=None, storefront=None, batch_size=STORE_BATCH_SIZE):
+        self.store = store
+        self.source = source
+        self.app_id = app_id
+        self.storefront = storefront
+        self.batch_size = batch_size
+        self._buffer = []
+        self._buffered = 0
+
+    def write_batch(self, rows):
+        reviews = review_schema.normalize_batch(rows, self.source, self.app_id, self.storefront)
+        if reviews.empty:
+            return
+        self._buffer.append(reviews)
+        self._buffered += len(reviews)
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.store.append(pd.concat(self._buffer, ignore_index=True))
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def ingest_ndjson(store, path, source=None, app_id=None, storefront=None):
+    """Load an NDJSON output file written by one of the scrapers into the store"""
+    count = 0
+    with store.sink(source, app_id, storefront) as sink:
+        for chunk in pd.read_json(path, lines=True, dtype=False, chunksize=STORE_BATCH_SIZE):
+            sink.write_batch(chunk)
+            count += len(chunk)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the partitioned Parquet review store")
+    parser.add_argument('--root', default=REVIEW_STORE_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help="Append NDJSON review files to the store")
+    ingest.add_argument('files', nargs='+')
+    ingest.add_argument('--source', help="Source key for rows that don't carry one (e.g. googleplay)")
+    ingest.add_argument('--app-id', help="App id for rows that don't carry one")
+
+    subparsers.add_parser('compact', help="Merge small files and drop duplicate review ids")
+    args = parser.parse_args()
+
+    store = ReviewStore(args.root)
+    if args.command == 'ingest':
+        for path in args.files:
+            count = ingest_ndjson(store, path, source=args.source, app_id=args.app_id)
+            print(f"Appended {count} reviews from {path}")
+    elif args.command == 'compact':
+        store.compact()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+"""
+Storefront-parallel crawler for the App Store customer reviews RSS feed.
+
+Fetches every storefront's feed concurrently under one rate limit of its
+own (see rate_limit.HOST_RATES), so all ~175 storefronts cost about what
+one did serially while lookups on itunes.apple.com keep their usual rate.
+Each storefront stops at its first empty page (most storefronts have none),
+and every page is handed to one merged stream tagged with its storefront.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+import dedup
+import http_client
+import metrics
+import rate_limit
+import sinks
+import sync_state
+
+RSS_URL = "https://itunes.apple.com/{storefront}/rss/customerreviews"
+MAX_PAGES = 10  # The feed serves at most 10 pages of 50 reviews
+MAX_CONCURRENCY = 16  # Storefront feeds paged at the same time
+RSS_LIMITER = 'itunes.apple.com/rss'  # Rate limit key of the feed, apart from the host's own bucket
+SYNC_SOURCE = 'rss'
+
+# Every App Store storefront that serves the customer reviews feed
+STOREFRONTS = (
+    'ae', 'af', 'ag', 'ai', 'al', 'am', 'ao', 'ar', 'at', 'au', 'az', 'ba', 'bb', 'be', 'bf', 'bg', 'bh',
+    'bj', 'bm', 'bn', 'bo', 'br', 'bs', 'bt', 'bw', 'by', 'bz', 'ca', 'cd', 'cg', 'ch', 'ci', 'cl', 'cm',
+    'cn', 'co', 'cr', 'cv', 'cy', 'cz', 'de', 'dk', 'dm', 'do', 'dz', 'ec', 'ee', 'eg', 'es', 'fi', 'fj',
+    'fm', 'fr', 'ga', 'gb', 'gd', 'ge', 'gh', 'gm', 'gr', 'gt', 'gw', 'gy', 'hk', 'hn', 'hr', 'hu', 'id',
+    'ie', 'il', 'in', 'iq', 'is', 'it', 'jm', 'jo', 'jp', 'ke', 'kg', 'kh', 'kn', 'kr', 'kw', 'ky', 'kz',
+    'la', 'lb', 'lc', 'lk', 'lr', 'lt', 'lu', 'lv', 'ly', 'ma', 'md', 'me', 'mg', 'mk', 'ml', 'mm', 'mn',
+    'mo', 'mr', 'ms', 'mt', 'mu', 'mv', 'mw', 'mx', 'my', 'mz', 'na', 'ne', 'ng', 'ni', 'nl', 'no', 'np',
+    'nr', 'nz', 'om', 'pa', 'pe', 'pg', 'ph', 'pk', 'pl', 'pt', 'pw', 'py', 'qa', 'ro', 'rs', 'ru', 'rw',
+    'sa', 'sb', 'sc', 'se', 'sg', 'si', 'sk', 'sl', 'sn', 'sr', 'st', 'sv', 'sz', 'tc', 'td', 'th', 'tj',
+    'tm', 'tn', 'to', 'tr', 'tt', 'tw', 'tz', 'ua', 'ug', 'us', 'uy', 'uz', 'vc', 've', 'vg', 'vn', 'vu',
+    'xk', 'ye', 'za', 'zm', 'zw',
+)
+
+
+def parse_rss_entry(entry, app_id, storefront):
+    """Convert one feed entry into the flat review dict used for output"""
+    return {
+        'id': entry['id']['label'],
+        'app_id': app_id,
+        'storefront': storefront,
+        'title': entry.get('title', {}).get('label', ''),
+        'content': entry.get('content', {}).get('label', ''),
+        'rating': entry.get('im:rating', {}).get('label', ''),
+        'author': entry['author']['name']['label'],
+        'date': entry.get('updated', {}).get('label', ''),
+        'version': entry.get('im:version', {}).get('label', ''),
+        'source': f'RSS Feed ({storefront})'
+    }
+
+
+def feed_entries(data):
+    """Review entries of one feed page, without the app description entry the first page starts with"""
+    entries = data.get('feed', {}).get('entry') or []
+    if isinstance(entries, dict):  # if only one review, it's a dict not a list
+        entries = [entries]
+    return [entry for entry in entries if 'im:name' not in entry]
+
+
+async def crawl_storefront(client, app_id, storefront, on_page, mark=None, limiter=None):
+    """
+    Page through one storefront's feed, newest first, handing each page to
+    `on_page`. Stops at the first empty or failed page, or at the first
+    review a previous run already saw. Returns the review count, the newest
+    review and whether the feed was read to its end (an empty page, the
+    mark or MAX_PAGES) rather than cut short by an error.
+    """
+    count = 0
+    newest = None
+    url = RSS_URL.format(storefront=storefront)
+
+    for page in range(1, MAX_PAGES + 1):
+        params = {'id': app_id, 'page': page, 'sortby': 'mostrecent', 'json': 'true'}
+        try:
+            response = await http_client.async_get(client, url, limiter=limiter, params=params)
+        except httpx.HTTPError as e:
+            print(f"[{app_id}/{storefront}] Error fetching page {page}: {e}")
+            return count, newest, False
+        if response.status_code in rate_limit.RETRY_STATUSES:
+            print(f"[{app_id}/{storefront}] Page {page}: status code {response.status_code}")
+            return count, newest, False
+        if response.status_code != 200:
+            # Storefronts where the app isn't sold answer with an error instead of an empty feed
+            break
+
+        started = time.perf_counter()
+        try:
+            entries = feed_entries(response.json())
+        except ValueError:
+            print(f"[{app_id}/{storefront}] Failed to parse JSON from page {page}")
+            return count, newest, False
+        if not entries:
+            break
+
+        parsed = []
+        for entry in entries:
+            try:
+                parsed.append(parse_rss_entry(entry, app_id, storefront))
+            except KeyError:
+                continue
+        metrics.observe_stage('parse', time.perf_counter() - started, len(parsed), 'rss')
+
+        fresh, reached_mark = sync_state.take_unseen(parsed, mark)
+        if fresh:
+            on_page(fresh)
+            count += len(fresh)
+            newest = sync_state.newest_review(fresh, newest)
+        if reached_mark:
+            break
+
+    if count:
+        print(f"[{app_id}/{storefront}] Fetched {count} reviews")
+    return count, newest, True
+
+
+async def crawl_rss(app_id, storefronts=STOREFRONTS, max_concurrency=MAX_CONCURRENCY, rate=None,
+                    client=None, incremental=False, on_page=None):
+    """
+    Crawl the feed of `app_id` in every storefront concurrently.
+
+    Pages from all storefronts go to `on_page` as they arrive, merged into
+    one stream and tagged with their storefront. With `incremental` each
+    storefront stops at its high-water mark, which is advanced once that
+    storefront has been read to its end; a storefront cut short by an error
+    keeps its old mark. `rate` overrides the feed's starting requests per
+    second; it doesn't apply to other itunes.apple.com requests.
+
+    Returns a dict mapping each storefront to its list of reviews, or to its
+    review count when `on_page` is given.
+    """
+    app_id = str(app_id)
+    storefronts = list(dict.fromkeys(storefront.lower() for storefront in storefronts))
+    if rate:
+        rate_limit.set_host_rate(RSS_LIMITER, rate)
+    limiter = rate_limit.get_limiter(RSS_LIMITER)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(client, storefront):
+        mark = sync_state.get_mark(SYNC_SOURCE, f"{app_id}/{storefront}") if incremental else None
+        reviews = []
+        async with semaphore:
+            count, newest, finished = await crawl_storefront(client, app_id, storefront,
+                                                             on_page or reviews.extend, mark, limiter)
+        if newest and finished:
+            sync_state.update_mark(SYNC_SOURCE, f"{app_id}/{storefront}", [newest])
+        return count if on_page else reviews
+
+    if client is None:
+        async with http_client.create_async_client() as client:
+            results = await asyncio.gather(*(bounded(client, storefront) for storefront in storefronts))
+    else:
+        results = await asyncio.gather(*(bounded(client, storefront) for storefront in storefronts))
+
+    return dict(zip(storefronts, results))
+
+
+def run_crawl(app_id, **kwargs):
+    """Synchronous entry point for callers outside an event loop"""
+    return asyncio.run(crawl_rss(app_id, **kwargs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl App Store reviews from the RSS feed of every storefront")
+    parser.add_argument('app_id', help="Numeric App Store id")
+    parser.add_argument('--storefronts', nargs='+', default=list(STOREFRONTS), help="Storefront country codes (default: all)")
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY)
+    parser.add_argument('--rate', type=float, help="Starting requests per second for the feed")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only fetch reviews newer than the last run's high-water mark")
+    parser.add_argument('--output', default='rss_reviews', help="Output file base name")
+    parser.add_argument('--formats', nargs='+', choices=sinks.FORMATS, default=['ndjson', 'csv'])
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    output_sink = sinks.open_sinks(args.output, args.formats, append=args.incremental)
+    with dedup.DedupSink(output_sink, dedup.open_output_index(args.output, args.incremental)) as sink:
+        counts = run_crawl(args.app_id, storefronts=args.storefronts, max_concurrency=args.concurrency,
+                           rate=args.rate, incremental=args.incremental, on_page=sink.write_batch)
+    with_reviews = sum(1 for count in counts.values() if count)
+    print(f"Fetched {sum(counts.values())} reviews from {with_reviews} of {len(counts)} storefronts "
+          f"in {time.monotonic() - started:.1f}s")
+    print(f"Wrote {sink.written} new reviews, dropped {sink.duplicates} duplicates")
+    print(f"Saved reviews to {args.output}.*")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+"""
+Run a batch of scraping jobs from one manifest in a single process.
+
+The manifest lists apps, the sources to scrape for each and the storefronts
+to cover. Every job shares the pooled HTTP clients, the StoreFront token
+cache, one worker pool for the blocking scrapers (Google Play, browser) and,
+if any browser job is queued, one pool of warm browsers. Each job writes to
+its own output files and progress is reported per job.
+
+Manifest (JSON):
+
+    {
+      "output_dir": "output",
+      "defaults": {"sources": ["metadata", "storefront", "rss"], "storefronts": ["us"]},
+      "apps": [
+        {"name": "one-pass", "app_store_id": "6499447981",
+         "play_package": "com.pearhealthlabs.onepass",
+         "sources": ["metadata", "storefront", "rss", "googleplay"],
+         "storefronts": ["us", "gb", "ca", "au"]}
+      ]
+    }
+
+"storefronts": ["all"] expands to every App Store storefront.
+
+With --profile, each Google Play and browser job is profiled in its worker
+thread into its own file. The async jobs share the event loop, so they are
+profiled together as one `runner` profile.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import dedup
+import http_client
+import itunes_lookup
+import metrics
+import rss_crawler
+import sinks
+import storefront_crawler
+
+SOURCES = ('metadata', 'storefront', 'rss', 'googleplay', 'browser')
+DEFAULT_SOURCES = ('metadata', 'storefront', 'rss')
+APP_STORE_SOURCES = ('metadata', 'storefront', 'rss', 'browser')
+DEFAULT_OUTPUT_DIR = 'output'
+MAX_WORKERS = 4  # Threads (and browsers) for the blocking scrapers
+PROGRESS_INTERVAL = 10  # Seconds between progress reports
+SUMMARY_FILE = 'run_summary.json'
+
+
+class Job:
+    """
+    One unit of work from the manifest and its progress.
+
+    Jobs are also sinks: every batch their scraper writes is counted, so
+    progress can be reported while the job runs.
+    """
+
+    def __init__(self, name, source, app=None, storefronts=('us',), output_base=None):
+        self.name = name
+        self.source = source
+        self.app = app or {}
+        self.storefronts = list(storefronts)
+        self.output_base = output_base
+        self.count = 0
+        self.status = 'pending'
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    def write_batch(self, rows):
+        self.count += len(rows)
+
+    def close(self):
+        pass
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def summary(self):
+        return {
+            'job': self.name,
+            'source': self.source,
+            'status': self.status,
+            'count': self.count,
+            'seconds': round(self.elapsed, 2),
+            'output': self.output_base,
+            'error': self.error,
+        }
+
+
+def _slug(name):
+    return name.replace('-', '_').replace(' ', '_').lower()
+
+
+def load_manifest(path):
+    with open(path) as f:
+        manifest = json.load(f)
+    if not manifest.get('apps'):
+        raise ValueError(f"{path} lists no apps")
+    for app in manifest['apps']:
+        if 'name' not in app:
+            raise ValueError(f"App entry without a name: {app}")
+    return manifest
+
+
+def build_jobs(manifest, output_dir, only=None):
+    """Expand the manifest's apps x sources into jobs; metadata for all apps is one batched job"""
+    defaults = manifest.get('defaults', {})
+    jobs = []
+    metadata_apps = []
+
+    for app in manifest['apps']:
+        sources = app.get('sources', defaults.get('sources', DEFAULT_SOURCES))
+        storefronts = [storefront.lower() for storefront in app.get('storefronts', defaults.get('storefronts', ['us']))]
+        if 'all' in storefronts:
+            storefronts = list(rss_crawler.STOREFRONTS)
+
+        for source in sources:
+            if source not in SOURCES:
+                raise ValueError(f"Unknown source {source!r} for {app['name']}; expected one of {', '.join(SOURCES)}")
+            if only and source not in only:
+                continue
+            if source in APP_STORE_SOURCES and not app.get('app_store_id'):
+                print(f"Skipping {app['name']}/{source}: no app_store_id")
+                continue
+            if source == 'googleplay' and not app.get('play_package'):
+                print(f"Skipping {app['name']}/{source}: no play_package")
+                continue
+
+            if source == 'metadata':
+                metadata_apps.append(app)
+                continue
+            jobs.append(Job(f"{app['name']}/{source}", source, app, storefronts,
+                            os.path.join(output_dir, f"{_slug(app['name'])}_{source}")))
+
+    if metadata_apps:
+        storefronts = sorted({storefront for app in metadata_apps
+                              for storefront in app.get('storefronts', defaults.get('storefronts', ['us']))
+                              if storefront != 'all'} or {'us'})
+        jobs.insert(0, Job('metadata', 'metadata', {'apps': metadata_apps}, storefronts,
+                           os.path.join(output_dir, 'appstore_metadata')))
+    return jobs
+
+
+class Runner:
+    """Runs jobs concurrently on one event loop, handing blocking scrapers to a shared thread pool"""
+
+    def __init__(self, jobs, incremental=False, formats=('ndjson', 'csv'), store=False, aggregate=False, index=False,
+                 max_workers=MAX_WORKERS, profile=None, profile_dir=metrics.DEFAULT_PROFILE_DIR):
+        self.jobs = jobs
+        self.incremental = incremental
+        self.formats = formats
+        self.store = store
+        self.aggregate = aggregate
+        self.index = index
+        self.max_workers = max_workers
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.tokens = storefront_crawler.StorefrontTokens()
+        self._review_store = None
+        self._review_index = None
+        self._browser_pool = None
+        self._lock = threading.Lock()
+
+    def _extra_sinks(self, job, source, app_id, storefront=None, output_base=None, resume=None):
+        extra = [job]
+        if self.store:
+            with self._lock:
+                if self._review_store is None:
+                    from review_store import ReviewStore
+                    self._review_store = ReviewStore()
+            extra.append(self._review_store.sink(source=source, app_id=app_id, storefront=storefront))
+        if self.aggregate:
+            from aggregates import AggregateSink
+            platform = 'googleplay' if job.source == 'googleplay' else 'appstore'
+            extra.append(AggregateSink(output_base or job.output_base, platform, append=self.incremental,
+                                       resume=resume))
+        if self.index:
+            with self._lock:
+                if self._review_index is None:
+                    from search_index import ReviewIndex
+                    self._review_index = ReviewIndex()
+            extra.append(self._review_index.sink(source=source, app_id=app_id, storefront=storefront))
+        return extra
+
+    def _open_output(self, job, source=None, app_id=None):
+        """Deduplicated sinks for one job's output files"""
+        output_sink = sinks.open_sinks(job.output_base, self.formats, append=self.incremental,
+                                       extra=self._extra_sinks(job, source, app_id))
+        return dedup.DedupSink(output_sink, dedup.open_output_index(job.output_base, self.incremental))
+
+    def _get_browser_pool(self):
+        with self._lock:
+            if self._browser_pool is None:
+                import browser_pool
+                self._browser_pool = browser_pool.BrowserPool(size=self.max_workers)
+            return self._browser_pool
+
+    async def _metadata(self, job, client):
+        app_ids = [app['app_store_id'] for app in job.app['apps']]
+        results = {}
+        for storefront in job.storefronts:
+            found = await itunes_lookup.lookup_apps_async(app_ids, country=storefront, client=client)
+            results[storefront] = {str(track_id): result for track_id, result in found.items()}
+            job.count += len(found)
+        os.makedirs(os.path.dirname(job.output_base) or '.', exist_ok=True)
+        with open(f"{job.output_base}.json", 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    async def _storefront(self, job, client):
+        app_id = str(job.app['app_store_id'])
+        with self._open_output(job, app_id=app_id) as sink:
+            await storefront_crawler.crawl_reviews([(app_id, storefront) for storefront in job.storefronts],
+                                                   client=client, incremental=self.incremental,
+                                                   on_page=sink.write_batch, tokens=self.tokens)
+
+    async def _rss(self, job, client):
+        app_id = str(job.app['app_store_id'])
+        with self._open_output(job, app_id=app_id) as sink:
+            await rss_crawler.crawl_rss(app_id, storefronts=job.storefronts, client=client,
+                                        incremental=self.incremental, on_page=sink.write_batch)
+
+    def _googleplay(self, job):
+        import googleplay_scraper
+
+        package_name = job.app['play_package']
+        lang = job.app.get('lang', googleplay_scraper.LANG)
+        for country in job.storefronts:
+            output_base = job.output_base if len(job.storefronts) == 1 else f"{job.output_base}_{country}"
+            googleplay_scraper.sync_reviews(
+                package_name, lang, country, incremental=self.incremental, formats=self.formats,
+                output_file_base=output_base,
+                extra_sinks=self._extra_sinks(job, googleplay_scraper.SYNC_SOURCE, package_name, country, output_base,
+                                              googleplay_scraper.resume_tag(package_name, lang, country, self.incremental)))
+
+    def _browser(self, job):
+        import appstore_browser_scraper
+
+        app_id = str(job.app['app_store_id'])
+        pool = self._get_browser_pool()
+        with self._open_output(job, source='browser', app_id=app_id) as sink:
+            for storefront in job.storefronts:
+                url = appstore_browser_scraper.app_store_url(app_id, country=storefront)
+                with pool.driver() as driver:
+                    reviews = appstore_browser_scraper.scrape_app_page(driver, url, app_id)
+                for review in reviews:
+                    review['storefront'] = storefront
+                sink.write_batch(reviews)
+
+    def _profiled(self, work):
+        def run(job):
+            with metrics.profiled(os.path.basename(job.output_base), self.profile, self.profile_dir):
+                work(job)
+        return run
+
+    async def _run_job(self, job, client, executor):
+        job.status = 'running'
+        job.started = time.monotonic()
+        try:
+            if job.source in ('googleplay', 'browser'):
+                work = self._googleplay if job.source == 'googleplay' else self._browser
+                if self.profile:
+                    work = self._profiled(work)
+                await asyncio.get_running_loop().run_in_executor(executor, work, job)
+            else:
+                await getattr(self, f"_{job.source}")(job, client)
+            job.status = 'done'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            print(f"[{job.name}] Failed: {e}")
+        finally:
+            job.finished = time.monotonic()
+            print(f"[{job.name}] {job.status}: {job.count} {'apps' if job.source == 'metadata' else 'reviews'} "
+                  f"in {job.elapsed:.1f}s")
+
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            done = sum(1 for job in self.jobs if job.status in ('done', 'failed'))
+            running = ', '.join(f"{job.name} {job.count}" for job in self.jobs if job.status == 'running')
+            print(f"[runner] {done}/{len(self.jobs)} jobs finished; running: {running or '-'}")
+
+    async def run(self):
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        reporter = asyncio.create_task(self._report_progress())
+        try:
+            async with http_client.create_async_client() as client:
+                await asyncio.gather(*(self._run_job(job, client, executor) for job in self.jobs))
+        finally:
+            reporter.cancel()
+            executor.shutdown(wait=True)
+            if self._browser_pool is not None:
+                self._browser_pool.close()
+        return self.jobs
+
+
+def print_summary(jobs):
+    print(f"\n{'job':40s} {'status':8s} {'count':>8s} {'seconds':>8s}")
+    for job in jobs:
+        print(f"{job.name:40s} {job.status:8s} {job.count:8d} {job.elapsed:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every scraping job in a manifest in one process")
+    parser.add_argument('manifest', help="JSON job manifest (apps x sources x storefronts)")
+    parser.add_argument('--output-dir', help=f"Directory for job outputs (default: the manifest's output_dir or {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument('--only', nargs='+', choices=SOURCES, help="Run only these sources")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only fetch reviews newer than each job's high-water mark")
+    parser.add_argument('--formats', nargs='+', choices=sinks.FORMATS, help="Output formats (default: ndjson csv)")
+    parser.add_argument('--store', action='store_true', help="Also append the reviews to the Parquet review store")
+    parser.add_argument('--aggregate', action='store_true',
+                        help="Fold each job's new reviews into the dashboard aggregates kept beside its outputs")
+    parser.add_argument('--index', action='store_true', help="Also add the reviews to the full-text search index")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS,
+                        help="Threads for the Google Play and browser jobs (also the browser pool size)")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    manifest = load_manifest(args.manifest)
+    defaults = manifest.get('defaults', {})
+    output_dir = args.output_dir or manifest.get('output_dir', DEFAULT_OUTPUT_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = build_jobs(manifest, output_dir, only=args.only)
+    runner = Runner(jobs,
+                    incremental=args.incremental or defaults.get('incremental', False),
+                    formats=tuple(args.formats or defaults.get('formats', ('ndjson', 'csv'))),
+                    store=args.store or defaults.get('store', False),
+                    aggregate=args.aggregate or defaults.get('aggregate', False),
+                    index=args.index or defaults.get('index', False),
+                    max_workers=args.workers,
+                    profile=args.profile,
+                    profile_dir=args.profile_dir)
+
+    print(f"Running {len(jobs)} jobs for {len(manifest['apps'])} apps...")
+    started = time.monotonic()
+    with metrics.session(args, 'runner'):
+        asyncio.run(runner.run())
+    print_summary(jobs)
+
+    summary_path = os.path.join(output_dir, SUMMARY_FILE)
+    with open(summary_path, 'w') as f:
+        json.dump({'seconds': round(time.monotonic() - started, 2), 'jobs': [job.summary() for job in jobs]}, f, indent=2)
+    print(f"\nFinished in {time.monotonic() - started:.1f}s; summary saved to {summary_path}")
+
+    if any(job.status == 'failed' for job in jobs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+"""
+Full-text search over the normalized reviews of every source.
+
+Reviews are kept in an SQLite table with an FTS5 index over their title
+and body. Triggers keep the index in step with the table, so it updates
+as reviews are upserted. The table is keyed like dedup.py: a review's
+native id, with the store as namespace, or a content hash when it has
+none, so re-ingesting or crawling overlapping sources updates rows rather
+than duplicating them. Queries use FTS5 syntax (`crash*`, `"won't open"`,
+`login NOT password`, `NEAR(gym class)`). They can be filtered by
+platform, app, rating, version and date, and only touch the rows the
+index matches.
+
+    python search_index.py ingest one_pass_googleplay_reviews.ndjson --source googleplay
+    python search_index.py search "crash* OR freez*" --platform appstore --max-rating 2 --since 2025-01-01
+    python search_index.py search "login" --count --group-by version
+"""
+import argparse
+import hashlib
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+import dedup
+import review_schema
+
+INDEX_FILE = 'review_index.sqlite'
+PLATFORMS = ('appstore', 'googleplay')
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'  # UTC; sorts and compares as text
+SNIPPET_TOKENS = 16
+DEFAULT_LIMIT = 20
+GROUP_COLUMNS = ('platform', 'source', 'app_id', 'storefront', 'rating', 'version', 'month')
+
+COLUMNS = ('key', 'platform', 'source', 'app_id', 'storefront', 'rating', 'version', 'date',
+           'title', 'content', 'author')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    rowid INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    platform TEXT NOT NULL,
+    source TEXT,
+    app_id TEXT,
+    storefront TEXT,
+    rating INTEGER,
+    version TEXT,
+    date TEXT,
+    title TEXT,
+    content TEXT,
+    author TEXT
+);
+CREATE INDEX IF NOT EXISTS reviews_platform_rating ON reviews (platform, rating);
+CREATE INDEX IF NOT EXISTS reviews_date ON reviews (date);
+CREATE INDEX IF NOT EXISTS reviews_version ON reviews (version);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+    title, content, content='reviews', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS reviews_ai AFTER INSERT ON reviews BEGIN
+    INSERT INTO reviews_fts (rowid, title, content) VALUES (new.rowid, new.title, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS reviews_ad AFTER DELETE ON reviews BEGIN
+    INSERT INTO reviews_fts (reviews_fts, rowid, title, content) VALUES ('delete', old.rowid, old.title, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS reviews_au AFTER UPDATE OF title, content ON reviews BEGIN
+    INSERT INTO reviews_fts (reviews_fts, rowid, title, content) VALUES ('delete', old.rowid, old.title, old.content);
+    INSERT INTO reviews_fts (rowid, title, content) VALUES (new.rowid, new.title, new.content);
+END;
+"""
+
+UPSERT = f"""
+INSERT INTO reviews ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})
+ON CONFLICT (key) DO UPDATE SET
+    {', '.join(f'{column} = excluded.{column}' for column in COLUMNS[1:])}
+"""
+
+
+def review_keys(reviews):
+    """
+    Stable identity per normalized review, namespaced like dedup.review_key.
+    Only rows without a usable native id are hashed.
+    """
+    ids = reviews['id'].astype(object)
+    usable = ids.notna() & ~ids.astype(str).str.startswith(dedup.SYNTHETIC_ID_PREFIXES)
+    namespace = np.where(reviews['source'].astype(object) == 'googleplay', 'googleplay:', 'appstore:')
+    keys = pd.Series(namespace, index=reviews.index, dtype=object) + ids.astype(str)
+
+    for index in reviews.index[~usable.to_numpy()]:
+        row = reviews.loc[index]
+        content = '\x1f'.join(str(row[field]) if pd.notna(row[field]) else ''
+                              for field in ('author', 'title', 'date', 'content'))
+        keys[index] = f"hash:{hashlib.sha1(content.encode('utf-8')).hexdigest()}"
+    return keys
+
+
+def index_rows(reviews):
+    """Tuples in COLUMNS order for a frame from review_schema.normalize_batch"""
+    if reviews.empty:
+        return []
+    platform = np.where(reviews['source'].astype(object) == 'googleplay', 'googleplay', 'appstore')
+    rating = reviews['rating'].astype('Int64').where(reviews['rating'] != review_schema.MISSING_RATING)
+    dates = reviews['date'].dt.strftime(DATE_FORMAT)
+
+    def values(column):
+        column = column.astype(object)
+        return column.where(column.notna(), None).tolist()
+
+    return list(zip(
+        review_keys(reviews).tolist(), platform.tolist(), values(reviews['source']), values(reviews['app_id']),
+        values(reviews['storefront']), values(rating), values(reviews['version']), values(dates),
+        values(reviews['title']), values(reviews['content']), values(reviews['author']),
+    ))
+
+
+def _where(clauses):
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+
+class ReviewIndex:
+    """SQLite review table with an FTS5 index over title and body"""
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()  # Runner jobs write from several threads through one connection
+
+    def upsert(self, records, source=None, app_id=None, storefront=None):
+        """
+        Add or update a batch of scraped records (any scraper's shape, or a
+        normalized frame); returns the number of rows written
+        """
+        reviews = review_schema.normalize_batch(records, source, app_id, storefront)
+        rows = index_rows(reviews)
+        with self._lock, self.conn:
+            self.conn.executemany(UPSERT, rows)
+        return len(rows)
+
+    def _filters(self, query=None, platform=None, app_id=None, min_rating=None, max_rating=None,
+                 version=None, since=None, until=None):
+        """SQL conditions on the reviews table `r` and their parameters"""
+        clauses, params = [], []
+        if query:
+            clauses.append("r.rowid IN (SELECT rowid FROM reviews_fts WHERE reviews_fts MATCH ?)")
+            params.append(query)
+        for column, value in (('platform', platform), ('app_id', app_id), ('version', version)):
+            if value is not None:
+                clauses.append(f"r.{column} = ?")
+                params.append(value)
+        if min_rating is not None:
+            clauses.append("r.rating >= ?")
+            params.append(min_rating)
+        if max_rating is not None:
+            clauses.append("r.rating <= ?")
+            params.append(max_rating)
+        if since:
+            clauses.append("r.date >= ?")
+            params.append(since)
+        if until:
+            # A bare day includes the whole day
+            clauses.append("r.date < ?" if len(until) > 10 else "r.date < date(?, '+1 day')")
+            params.append(until)
+        return clauses, params
+
+    def search(self, query=None, limit=DEFAULT_LIMIT, order='rank', **filters):
+        """
+        Reviews matching an FTS5 `query` and the filters (platform, app_id,
+        min_rating, max_rating, version, since, until), best match first or
+        with order='date' newest first
+        """
+        if query and order == 'rank':
+            clauses, params = self._filters(**filters)
+            sql = (f"SELECT r.*, snippet(reviews_fts, -1, '[', ']', '...', {SNIPPET_TOKENS}) AS snippet"
+                   " FROM reviews_fts JOIN reviews r ON r.rowid = reviews_fts.rowid"
+                   f" WHERE {' AND '.join(['reviews_fts MATCH ?'] + clauses)}"
+                   " ORDER BY bm25(reviews_fts) LIMIT ?")
+            params = [query] + params
+        else:
+            clauses, params = self._filters(query, **filters)
+            sql = f"SELECT r.*, NULL AS snippet FROM reviews r {_where(clauses)} ORDER BY r.date DESC LIMIT ?"
+        cursor = self.conn.execute(sql, params + [limit])
+        names = [description[0] for description in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def count(self, query=None, group_by=None, **filters):
+        """Number of matching reviews, or {group: count} grouped by one of GROUP_COLUMNS"""
+        clauses, params = self._filters(query, **filters)
+        if group_by is None:
+            return self.conn.execute(f"SELECT COUNT(*) FROM reviews r {_where(clauses)}", params).fetchone()[0]
+        if group_by not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group by {group_by!r}; expected one of {', '.join(GROUP_COLUMNS)}")
+        column = "substr(r.date, 1, 7)" if group_by == 'month' else f"r.{group_by}"
+        rows = self.conn.execute(
+            f"SELECT {column} AS grp, COUNT(*) AS n FROM reviews r {_where(clauses)} GROUP BY grp ORDER BY n DESC",
+            params)
+        return dict(rows.fetchall())
+
+    def optimize(self):
+        """Merge the FTS index segments; worth running after large ingests"""
+        with self.conn:
+            self.conn.execute("INSERT INTO reviews_fts (reviews_fts) VALUES ('optimize')")
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+
+    def sink(self, source=None, app_id=None, storefront=None):
+        return SearchIndexSink(self, source, app_id, storefront)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SearchIndexSink:
+    """Sink that upserts every written batch into the index, committing per batch"""
+
+    def __init__(self, index, source=None, app_id=None, storefront=None):
+        self.index = index
+        self.source = source
+        self.app_id = app_id
+        self.storefront = storefront
+        self.written = 0
+
+    def write_batch(self, rows):
+        if len(rows):
+            self.written += self.index.upsert(rows, self.source, self.app_id, self.storefront)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text review search index")
+    parser.add_argument('--index', default=INDEX_FILE, help="SQLite index file")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help="Add review files (.ndjson, .csv, .parquet, .json) to the index")
+    ingest.add_argument('files', nargs='+')
+    ingest.add_argument('--source', help="Source key for rows that don't carry one (e.g. googleplay)")
+    ingest.add_argument('--app-id', help="App id for rows that don't carry one")
+
+    search = subparsers.add_parser('search', help="Query the index")
+    search.add_argument('query', nargs='?', help="FTS5 query; omit to filter only")
+    search.add_argument('--platform', choices=PLATFORMS)
+    search.add_argument('--app-id')
+    search.add_argument('--min-rating', type=int)
+    search.add_argument('--max-rating', type=int)
+    search.add_argument('--version')
+    search.add_argument('--since', help="YYYY-MM-DD[ HH:MM:SS], UTC")
+    search.add_argument('--until', help="YYYY-MM-DD[ HH:MM:SS], UTC; a bare day is inclusive")
+    search.add_argument('--order', choices=('rank', 'date'), default='rank')
+    search.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    search.add_argument('--count', action='store_true', help="Print the number of matches instead of reviews")
+    search.add_argument('--group-by', choices=GROUP_COLUMNS, help="With --count, count per group")
+
+    subparsers.add_parser('optimize', help="Merge the index segments after large ingests")
+    args = parser.parse_args()
+
+    with ReviewIndex(args.index) as index:
+        if args.command == 'ingest':
+            import analytics
+
+            for path in args.files:
+                frame = analytics.read_reviews(path)
+                count = sum(index.upsert(frame.iloc[start:start + analytics.CHUNK_SIZE], args.source, args.app_id)
+                            for start in range(0, len(frame), analytics.CHUNK_SIZE))
+                print(f"Indexed {count} reviews from {path}")
+            print(f"{len(index)} reviews in {args.index}")
+
+        elif args.command == 'optimize':
+            index.optimize()
+
+        elif args.command == 'search':
+            filters = {'platform': args.platform, 'app_id': args.app_id, 'min_rating': args.min_rating,
+                       'max_rating': args.max_rating, 'version': args.version, 'since': args.since,
+                       'until': args.until}
+            if args.count:
+                result = index.count(args.query, group_by=args.group_by, **filters)
+                if isinstance(result, dict):
+                    for group, count in result.items():
+                        print(f"{count:8d}  {group}")
+                else:
+                    print(result)
+                return
+            for review in index.search(args.query, limit=args.limit, order=args.order, **filters):
+                stars = f"{review['rating']}*" if review['rating'] else '-'
+                print(f"{review['date'] or '':19s} {review['platform']:10s} {stars:2s} {review['version'] or '':10s} "
+                      f"{review['snippet'] or review['title'] or review['content'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
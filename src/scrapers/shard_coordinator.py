@@ -0,0 +1,459 @@
+#!/usr/bin/env python
+"""
+Split StoreFront review paging for large apps across workers on several machines.
+
+The coordinator keeps a lease table in SQLite. Each (app id, storefront)
+is cut by offset into shards of SHARD_SIZE reviews, so shard boundaries
+are fixed and every page belongs to exactly one shard. Workers lease a
+shard over HTTP, page through its range with the StoreFront crawler and
+post the reviews back. A worker renews its lease while it pages; a lease
+that runs out (the worker died or lost the network) goes back to the
+queue. Each shard is merged once, by the worker holding its current
+lease; a completion under an expired or already used lease is dropped.
+Reviews are keyed like dedup.py, so a review that
+shifted across a shard boundary mid-crawl is not stored twice either.
+When an app's last shard comes back full, more shards are planned after
+it, so the initial plan only needs a rough estimate.
+
+    python shard_coordinator.py plan 1234567890 --storefronts us gb --estimate 20000
+    python shard_coordinator.py serve --host 0.0.0.0
+    python shard_coordinator.py work http://coordinator:8780   # on every worker machine
+    python shard_coordinator.py export --output big_app_reviews
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import httpx
+
+import dedup
+import http_client
+import metrics
+import rate_limit
+import sinks
+import storefront_crawler
+from paths import state_path
+
+SHARD_FILE = 'storefront_shards.sqlite'
+SHARD_SIZE = 50 * storefront_crawler.PAGE_SIZE  # Reviews per shard: 50 requests
+DEFAULT_ESTIMATE = 8 * SHARD_SIZE  # Reviews planned per app and storefront when no estimate is given
+EXTEND_SHARDS = 4  # Shards planned after an app's last shard comes back full
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 5  # Leases per shard before it is marked failed
+DEFAULT_PORT = 8780
+WORKER_CONCURRENCY = 4  # Shards each worker pages at the same time
+POLL_INTERVAL = 5  # Seconds a worker waits while every remaining shard is leased
+COORDINATOR_TIMEOUT = 60
+COORDINATOR_RATE = 50.0  # Calls per second each worker may make to the coordinator
+EXPORT_BATCH = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    app_id TEXT NOT NULL,
+    storefront TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    stop INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    reviews INTEGER,
+    error TEXT,
+    UNIQUE (app_id, storefront, start)
+);
+CREATE INDEX IF NOT EXISTS shards_status ON shards (status, id);
+CREATE TABLE IF NOT EXISTS reviews (
+    key TEXT PRIMARY KEY,
+    app_id TEXT NOT NULL,
+    storefront TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    review TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reviews_order ON reviews (app_id, storefront, position);
+"""
+
+
+class ShardTable:
+    """Shards of every planned (app id, storefront), their leases and the merged reviews"""
+
+    def __init__(self, path=None, lease_seconds=LEASE_SECONDS):
+        self.path = path or state_path(SHARD_FILE)
+        self.lease_seconds = lease_seconds
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()  # The coordinator's request threads share one connection
+
+    def _add_shards(self, app_id, storefront, start, count):
+        rows = [(app_id, storefront, offset, offset + SHARD_SIZE)
+                for offset in range(start, start + count * SHARD_SIZE, SHARD_SIZE)]
+        cursor = self.conn.executemany(
+            "INSERT OR IGNORE INTO shards (app_id, storefront, start, stop) VALUES (?, ?, ?, ?)", rows)
+        return cursor.rowcount
+
+    def plan(self, app_id, storefront, estimate=DEFAULT_ESTIMATE):
+        """Plan shards covering the first `estimate` reviews; returns how many were new"""
+        with self._lock, self.conn:
+            return self._add_shards(str(app_id), storefront.lower(), 0, max(1, -(-estimate // SHARD_SIZE)))
+
+    def lease(self, worker):
+        """
+        Lease the next pending (or expired) shard to `worker`, retries after
+        fresh shards; returns it, or None if there is none
+        """
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE shards SET status = 'failed', lease = NULL, error = 'lease expired'"
+                " WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, MAX_ATTEMPTS))
+            row = self.conn.execute(
+                "SELECT id, app_id, storefront, start, stop, status, worker FROM shards"
+                " WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)"
+                " ORDER BY attempts, id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            shard_id, app_id, storefront, start, stop, status, previous = row
+            if status == 'leased':
+                print(f"[{app_id}/{storefront}] Lease on offsets {start}-{stop} held by {previous} expired; re-queued")
+            lease = secrets.token_hex(8)
+            self.conn.execute(
+                "UPDATE shards SET status = 'leased', worker = ?, lease = ?, lease_expires = ?, attempts = attempts + 1"
+                " WHERE id = ?", (worker, lease, now + self.lease_seconds, shard_id))
+        return {'shard': shard_id, 'app_id': app_id, 'storefront': storefront, 'start': start, 'stop': stop,
+                'lease': lease, 'lease_seconds': self.lease_seconds}
+
+    def renew(self, shard_id, lease):
+        """Extend a lease; False if it has expired and moved to another worker"""
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE shards SET lease_expires = ? WHERE id = ? AND lease = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, shard_id, lease))
+        return cursor.rowcount == 1
+
+    def complete(self, shard_id, lease, reviews, next_offset=None):
+        """
+        Merge a shard's reviews if `lease` is still its current lease; a
+        worker whose lease expired and moved on, or a repeated completion,
+        is turned away. A
+        `next_offset` at the shard's end means more reviews follow; if this
+        was the app's last planned shard, more are planned after it. None
+        means the list ended here, so the shards after it are closed.
+        Returns whether the reviews were merged.
+        """
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT app_id, storefront, start, stop FROM shards WHERE id = ? AND lease = ? AND status = 'leased'",
+                (shard_id, lease)).fetchone()
+            if row is None:
+                return False
+            app_id, storefront, start, stop = row
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO reviews (key, app_id, storefront, position, review) VALUES (?, ?, ?, ?, ?)",
+                [(dedup.review_key(review), app_id, storefront, start + position,
+                  json.dumps(review, ensure_ascii=False, default=sinks.to_jsonable))
+                 for position, review in enumerate(reviews)])
+            self.conn.execute(
+                "UPDATE shards SET status = 'done', lease = NULL, lease_expires = NULL, reviews = ?, error = NULL"
+                " WHERE id = ?", (len(reviews), shard_id))
+            if next_offset is None:
+                # The list ended inside this shard; the shards after it have nothing to fetch
+                self.conn.execute(
+                    "UPDATE shards SET status = 'done', lease = NULL, lease_expires = NULL, reviews = 0, error = NULL"
+                    " WHERE app_id = ? AND storefront = ? AND start >= ? AND status != 'done'",
+                    (app_id, storefront, stop))
+            elif next_offset >= stop:
+                last = self.conn.execute("SELECT MAX(stop) FROM shards WHERE app_id = ? AND storefront = ?",
+                                         (app_id, storefront)).fetchone()[0]
+                if last == stop:
+                    self._add_shards(app_id, storefront, stop, EXTEND_SHARDS)
+        return True
+
+    def fail(self, shard_id, lease, error):
+        """Give a leased shard back to the queue, or mark it failed after MAX_ATTEMPTS leases"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+                " lease = NULL, lease_expires = NULL, error = ?"
+                " WHERE id = ? AND lease = ? AND status = 'leased'", (MAX_ATTEMPTS, error, shard_id, lease))
+
+    def requeue_failed(self):
+        """Put failed shards back in the queue with their attempts reset; returns how many"""
+        with self._lock, self.conn:
+            return self.conn.execute(
+                "UPDATE shards SET status = 'pending', attempts = 0 WHERE status = 'failed'").rowcount
+
+    def status(self):
+        """Shard counts per status, merged reviews and the shards not finished yet"""
+        with self._lock:
+            counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall())
+            reviews = self.conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+        return {'shards': counts, 'reviews': reviews,
+                'remaining': counts.get('pending', 0) + counts.get('leased', 0)}
+
+    def export(self, file_base, formats=('ndjson', 'csv')):
+        """Write the merged reviews, in list order per app and storefront; returns the number written"""
+        count = 0
+        with self._lock, sinks.open_sinks(file_base, formats) as sink:
+            cursor = self.conn.execute("SELECT review FROM reviews ORDER BY app_id, storefront, position")
+            while rows := cursor.fetchmany(EXPORT_BATCH):
+                sink.write_batch([json.loads(review) for review, in rows])
+                count += len(rows)
+        return count
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _CoordinatorHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.coordinator.respond(self)
+
+    def do_POST(self):
+        self.server.coordinator.respond(self)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CoordinatorServer:
+    """Serves a ShardTable to workers as JSON over HTTP"""
+
+    def __init__(self, table, host='127.0.0.1', port=DEFAULT_PORT):
+        self.table = table
+        self.routes = {
+            ('POST', '/lease'): lambda body: {'shard': table.lease(body['worker']),
+                                              'remaining': table.status()['remaining']},
+            ('POST', '/renew'): lambda body: {'renewed': table.renew(body['shard'], body['lease'])},
+            ('POST', '/complete'): lambda body: {'merged': table.complete(body['shard'], body['lease'],
+                                                                         body['reviews'], body.get('next_offset'))},
+            ('POST', '/fail'): lambda body: table.fail(body['shard'], body['lease'], body.get('error')) or {},
+            ('GET', '/status'): lambda body: table.status(),
+        }
+        self.httpd = ThreadingHTTPServer((host, port), _CoordinatorHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.coordinator = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def respond(self, handler):
+        route = self.routes.get((handler.command, handler.path))
+        try:
+            if route is None:
+                status, result = 404, {'error': f"no route {handler.command} {handler.path}"}
+            else:
+                length = int(handler.headers.get('Content-Length') or 0)
+                status, result = 200, route(json.loads(handler.rfile.read(length)) if length else {})
+        except Exception as e:
+            status, result = 500, {'error': f"{type(e).__name__}: {e}"}
+        body = json.dumps(result).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class CoordinatorClient:
+    """
+    A worker's calls to the coordinator. They use their own plain client:
+    the scrapers' rate limits, response cache and replay only apply to the
+    store hosts. Connection errors and 5xx answers are retried with the
+    scrapers' backoff before the error is raised.
+    """
+
+    def __init__(self, url, client):
+        self.url = url.rstrip('/')
+        self.client = client
+        self.limiter = rate_limit.TokenBucket(COORDINATOR_RATE)
+
+    async def call(self, path, **payload):
+        url = f"{self.url}{path}"
+        response = await rate_limit.call_with_retry_async(lambda: self.client.post(url, json=payload), url,
+                                                          retry_exceptions=(httpx.TransportError,),
+                                                          limiter=self.limiter)
+        response.raise_for_status()
+        return response.json()
+
+
+async def _renew_lease(coordinator, shard):
+    while True:
+        await asyncio.sleep(shard['lease_seconds'] / 3)
+        try:
+            renewed = (await coordinator.call('/renew', shard=shard['shard'], lease=shard['lease']))['renewed']
+        except httpx.HTTPError as e:
+            print(f"Could not renew the lease on shard {shard['shard']}: {e}")
+            continue
+        if not renewed:
+            print(f"[{shard['app_id']}/{shard['storefront']}] Lost the lease on offsets {shard['start']}-{shard['stop']}")
+            return
+
+
+async def work_shard(coordinator, client, tokens, shard):
+    """Page through one leased shard and hand its reviews to the coordinator; returns the number merged"""
+    reviews = []
+    renewing = asyncio.create_task(_renew_lease(coordinator, shard))
+    try:
+        _, _, next_offset = await storefront_crawler.crawl_app_reviews(
+            client, tokens, shard['app_id'], shard['storefront'], reviews.extend,
+            offset=shard['start'], stop=shard['stop'])
+    except Exception as e:
+        next_offset, error = shard['start'], f"{type(e).__name__}: {e}"
+    else:
+        error = f"stopped at offset {next_offset}"
+    finally:
+        renewing.cancel()
+
+    try:
+        # Paging that stopped inside the range hit an error; another lease retries the whole shard
+        if next_offset is not None and next_offset < shard['stop']:
+            await coordinator.call('/fail', shard=shard['shard'], lease=shard['lease'], error=error)
+            return 0
+        result = await coordinator.call('/complete', shard=shard['shard'], lease=shard['lease'], reviews=reviews,
+                                        next_offset=next_offset)
+    except httpx.HTTPError as e:
+        # The coordinator stayed unreachable through the retries; the lease runs out and the shard is leased again
+        print(f"[{shard['app_id']}/{shard['storefront']}] Could not report offsets {shard['start']}-{shard['stop']}"
+              f" to the coordinator: {e}")
+        return 0
+    return len(reviews) if result['merged'] else 0
+
+
+async def run_worker(url, worker_id=None, concurrency=WORKER_CONCURRENCY, token=None):
+    """
+    Lease and crawl shards from the coordinator at `url`, `concurrency` at a
+    time, until none are left. Returns the number of shards and reviews
+    this worker got merged.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    tokens = storefront_crawler.StorefrontTokens(token)
+    totals = {'shards': 0, 'reviews': 0}
+
+    async with httpx.AsyncClient(timeout=COORDINATOR_TIMEOUT) as rpc, http_client.create_async_client() as client:
+        coordinator = CoordinatorClient(url, rpc)
+
+        async def lease_loop():
+            while True:
+                answer = await coordinator.call('/lease', worker=worker_id)
+                if answer['shard'] is None:
+                    # Leased shards may still expire, and full ones add more, until nothing remains
+                    if not answer['remaining']:
+                        return
+                    await asyncio.sleep(POLL_INTERVAL)
+                    continue
+                merged = await work_shard(coordinator, client, tokens, answer['shard'])
+                totals['shards'] += 1
+                totals['reviews'] += merged
+
+        await asyncio.gather(*(lease_loop() for _ in range(concurrency)))
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split StoreFront review crawls into shards across workers")
+    parser.add_argument('--db', help=f"Lease table (default: {SHARD_FILE} in the state directory)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    plan = subparsers.add_parser('plan', help="Plan shards for apps and storefronts")
+    plan.add_argument('app_ids', nargs='+', help="Numeric App Store ids")
+    plan.add_argument('--storefronts', nargs='+', default=['us'], help="Storefront country codes")
+    plan.add_argument('--estimate', type=int, default=DEFAULT_ESTIMATE,
+                      help="Rough number of reviews per app and storefront; more shards are added if it is low")
+
+    serve = subparsers.add_parser('serve', help="Hand out shards to workers over HTTP")
+    serve.add_argument('--host', default='127.0.0.1', help="Interface to listen on (0.0.0.0 for other machines)")
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--lease-seconds', type=int, default=LEASE_SECONDS,
+                       help="Seconds a lease lasts without being renewed")
+
+    work = subparsers.add_parser('work', help="Crawl shards leased from a coordinator")
+    work.add_argument('url', help="Coordinator URL, e.g. http://coordinator:8780")
+    work.add_argument('--worker-id', help="Name shown in the lease table (default: host:pid)")
+    work.add_argument('--concurrency', type=int, default=WORKER_CONCURRENCY, help="Shards paged at the same time")
+    work.add_argument('--rate', type=float, help="Starting requests per second for the StoreFront API host")
+    metrics.add_arguments(work)
+
+    subparsers.add_parser('status', help="Show shard progress")
+    subparsers.add_parser('requeue', help="Put failed shards back in the queue")
+
+    export = subparsers.add_parser('export', help="Write the merged reviews")
+    export.add_argument('--output', default='storefront_reviews', help="Output file base name")
+    export.add_argument('--formats', nargs='+', choices=sinks.FORMATS, default=['ndjson', 'csv'])
+    args = parser.parse_args()
+
+    if args.command == 'work':
+        if args.rate:
+            rate_limit.set_host_rate(urlparse(storefront_crawler.STOREFRONT_REVIEWS_URL).netloc, args.rate)
+        started = time.monotonic()
+        with metrics.session(args, 'shard_worker'):
+            totals = asyncio.run(run_worker(args.url, args.worker_id, args.concurrency))
+        print(f"Merged {totals['reviews']} reviews from {totals['shards']} shards in {time.monotonic() - started:.1f}s")
+        return
+
+    with ShardTable(args.db) as table:
+        if args.command == 'plan':
+            added = sum(table.plan(app_id, storefront, args.estimate)
+                        for app_id in args.app_ids for storefront in args.storefronts)
+            print(f"Planned {added} new shards of {SHARD_SIZE} reviews")
+
+        elif args.command == 'serve':
+            table.lease_seconds = args.lease_seconds
+            server = CoordinatorServer(table, args.host, args.port)
+            print(f"Serving {table.status()['remaining']} shards at {server.url}")
+            try:
+                server.httpd.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.httpd.server_close()
+
+        elif args.command == 'status':
+            status = table.status()
+            for name, count in sorted(status['shards'].items()):
+                print(f"{name:8s} {count:6d}")
+            print(f"{status['reviews']} reviews merged")
+
+        elif args.command == 'requeue':
+            print(f"Re-queued {table.requeue_failed()} failed shards")
+
+        elif args.command == 'export':
+            count = table.export(args.output, args.formats)
+            print(f"Saved {count} reviews to {args.output}.*")
+
+
+if __name__ == "__main__":
+    main()
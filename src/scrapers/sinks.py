@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+"""
+Streaming output sinks for scraped reviews.
+
+Each page of reviews is appended to disk as soon as it arrives instead of
+being collected into one big list and dumped at the end, so memory stays
+flat and a crash keeps everything written so far.
+
+NDJSON and CSV sinks report their byte position and can be reopened
+truncated to a checkpointed position. Parquet files are only readable once
+their footer is written on close, so the Parquet sink writes to a temporary
+file and renames it into place when closed.
+"""
+import csv
+import io
+import json
+import os
+
+import metrics
+
+PARQUET_ROW_GROUP_SIZE = 10000
+FORMATS = ('ndjson', 'csv', 'parquet')
+
+
+def to_jsonable(value):
+    """Convert datetimes to ISO strings; everything else passes through"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _open_binary(path, append, offset):
+    if offset is not None:
+        f = open(path, 'ab')
+        f.truncate(offset)
+    else:
+        f = open(path, 'ab' if append else 'wb')
+    f.seek(0, os.SEEK_END)
+    return f
+
+
+class NDJSONSink:
+    """Appends one JSON object per line"""
+
+    def __init__(self, path, append=False, offset=None):
+        self.path = path
+        self._file = _open_binary(path, append, offset)
+
+    def write_batch(self, rows):
+        if not rows:
+            return
+        lines = b''.join(
+            json.dumps({key: to_jsonable(value) for key, value in row.items()}, ensure_ascii=False).encode('utf-8') + b'\n'
+            for row in rows
+        )
+        self._file.write(lines)
+        self._file.flush()
+
+    def position(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CSVSink:
+    """
+    Appends rows to a CSV file.
+
+    Columns are taken from the existing header when appending, otherwise from
+    the first batch; keys missing from a row are left empty and keys not in
+    the header are dropped.
+    """
+
+    def __init__(self, path, append=False, offset=None, fieldnames=None):
+        self.path = path
+        self.fieldnames = fieldnames
+        if self.fieldnames is None and (append or offset) and os.path.exists(path):
+            with open(path, newline='', encoding='utf-8') as f:
+                self.fieldnames = next(csv.reader(f), None)
+        self._file = _open_binary(path, append, offset)
+        self._header_written = self._file.tell() > 0
+
+    def write_batch(self, rows):
+        if not rows:
+            return
+        if self.fieldnames is None:
+            self.fieldnames = list(rows[0].keys())
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=self.fieldnames, extrasaction='ignore')
+        if not self._header_written:
+            writer.writeheader()
+            self._header_written = True
+        writer.writerows({key: to_jsonable(value) for key, value in row.items()} for row in rows)
+        self._file.write(buffer.getvalue().encode('utf-8'))
+        self._file.flush()
+
+    def position(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParquetSink:
+    """Buffers rows and writes them to Parquet one row group at a time"""
+
+    def __init__(self, path, schema=None, row_group_size=PARQUET_ROW_GROUP_SIZE):
+        self.path = path
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self._tmp_path = f"{path}.inprogress"
+        self._buffer = []
+        self._writer = None
+
+    def write_batch(self, rows):
+        self._buffer.extend({key: to_jsonable(value) for key, value in row.items()} for row in rows)
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist(self._buffer)
+        if self._writer is None:
+            # The first row group fixes the file's schema; a column with no values in it yet
+            # (a Play reply, say) would be typed null and reject every later value
+            self.schema = self.schema or pa.schema(
+                [field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema])
+            self._writer = pq.ParquetWriter(self._tmp_path, self.schema)
+        # Later row groups are cast to that schema, with missing columns filled with nulls
+        columns = [table[field.name].cast(field.type) if field.name in table.column_names
+                   else pa.nulls(len(table), field.type) for field in self.schema]
+        self._writer.write_table(pa.Table.from_arrays(columns, schema=self.schema), row_group_size=self.row_group_size)
+        self._buffer = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self._tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MultiSink:
+    """Fans every batch out to several sinks"""
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def write_batch(self, rows):
+        for sink in self.sinks:
+            with metrics.stage('write', type(sink).__name__, len(rows)):
+                sink.write_batch(rows)
+
+    def positions(self):
+        """Byte positions of the sinks that can be resumed, keyed by path"""
+        return {sink.path: sink.position() for sink in self.sinks if hasattr(sink, 'position')}
+
+    def checkpoint(self, tag):
+        """Let sinks that keep state in memory (e.g. aggregates) save it alongside a crawl checkpoint"""
+        for sink in self.sinks:
+            if hasattr(sink, 'checkpoint'):
+                sink.checkpoint(tag)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # Sinks that are context managers get to see whether the crawl failed
+        for sink in self.sinks:
+            if hasattr(sink, '__exit__'):
+                sink.__exit__(*exc_info)
+            else:
+                sink.close()
+
+
+def open_sinks(file_base, formats=('ndjson', 'csv'), append=False, positions=None, extra=()):
+    """
+    Open one sink per format at `{file_base}.{format}`, plus any `extra` sinks.
+
+    `positions` (from MultiSink.positions) reopens NDJSON/CSV files truncated
+    to a checkpoint. Parquet files can't be appended to, so they are skipped
+    when appending.
+    """
+    positions = positions or {}
+    sinks = []
+    for fmt in formats:
+        path = f"{file_base}.{fmt}"
+        if fmt == 'ndjson':
+            sinks.append(NDJSONSink(path, append=append, offset=positions.get(path)))
+        elif fmt == 'csv':
+            sinks.append(CSVSink(path, append=append, offset=positions.get(path)))
+        elif fmt == 'parquet':
+            if append or positions:
+                print(f"Skipping {path}: Parquet output can't be appended to")
+                continue
+            sinks.append(ParquetSink(path))
+        else:
+            raise ValueError(f"Unknown output format: {fmt}")
+    return MultiSink(sinks + list(extra))
+
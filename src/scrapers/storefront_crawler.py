@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+"""
+Async crawler for the App Store StoreFront reviews API.
+
+Pages through every review for a list of (app id, storefront) pairs with
+bounded concurrency under the shared adaptive per-host rate limit,
+stopping each pair as soon as a page comes back empty.
+"""
+import argparse
+import asyncio
+import time
+from urllib.parse import urlparse
+
+import httpx
+
+import dedup
+import http_client
+import metrics
+import rate_limit
+import sinks
+import sync_state
+import token_cache
+
+STOREFRONT_REVIEWS_URL = "https://amp-api.apps.apple.com/v1/catalog/{storefront}/apps/{app_id}/reviews"
+PAGE_SIZE = 10  # Largest page the web client asks for
+MAX_CONCURRENCY = 8  # (app, storefront) pairs paged at the same time
+SYNC_SOURCE = 'storefront'
+
+
+class StorefrontTokens:
+    """
+    Bearer tokens shared by every crawl task, one per storefront.
+
+    Tokens come from the on-disk token cache and are refreshed once their
+    expiry is near or after a 401; a lock per storefront makes concurrent
+    tasks that hit the same 401 trigger only one refresh.
+    """
+
+    def __init__(self, token=None):
+        self._override = token
+        self._tokens = {}
+        self._locks = {}
+
+    async def get(self, storefront):
+        async with self._locks.setdefault(storefront, asyncio.Lock()):
+            if self._override:
+                return self._override
+            expires_at = token_cache.get_token_expiry(storefront)
+            if (storefront not in self._tokens or expires_at is None
+                    or expires_at - token_cache.REFRESH_MARGIN <= time.time()):
+                self._tokens[storefront] = await asyncio.to_thread(token_cache.get_token, storefront)
+            return self._tokens[storefront]
+
+    async def refresh(self, storefront, rejected_token):
+        """Replace a token the API rejected, unless another task already did"""
+        async with self._locks.setdefault(storefront, asyncio.Lock()):
+            if self._override == rejected_token:
+                self._override = None
+            if self._tokens.get(storefront) in (None, rejected_token):
+                token_cache.invalidate(storefront)
+                self._tokens[storefront] = await asyncio.to_thread(token_cache.get_token, storefront, force_refresh=True)
+            return self._tokens[storefront]
+
+
+def build_headers(token, app_id, storefront):
+    """Headers the StoreFront API expects from the App Store web client"""
+    return {
+        'User-Agent': http_client.USER_AGENT,
+        'Authorization': f'Bearer {token}',
+        'Accept': 'application/json',
+        'Origin': 'https://apps.apple.com',
+        'Referer': f'https://apps.apple.com/{storefront}/app/id{app_id}',
+    }
+
+
+def parse_storefront_review(review, app_id, storefront):
+    """Convert one StoreFront API review into the flat review dict used for output"""
+    attributes = review['attributes']
+    return {
+        'id': review['id'],
+        'app_id': app_id,
+        'storefront': storefront,
+        'title': attributes.get('title', ''),
+        'content': attributes.get('review', ''),
+        'rating': attributes.get('rating', 0),
+        'author': attributes.get('reviewerNickname', 'Anonymous'),
+        'date': attributes.get('date', ''),
+        'version': attributes.get('storeSortVersion', ''),
+        'source': 'StoreFront API'
+    }
+
+
+async def crawl_app_reviews(client, tokens, app_id, storefront, on_page, mark=None, offset=0, stop=None):
+    """
+    Page through all StoreFront reviews for one app in one storefront,
+    handing each page to `on_page` as soon as it arrives.
+
+    With a high-water `mark` the pages are requested newest-first and paging
+    stops at the first review a previous run already collected. `offset`
+    and `stop` limit paging to that range of the list.
+    Returns the number of reviews fetched, the newest of them and the offset
+    paging stopped at short of the end of the list: `stop` when more reviews
+    follow, anything lower after an error, None once the list (or the mark)
+    was reached.
+    """
+    count = 0
+    newest = None
+    url = STOREFRONT_REVIEWS_URL.format(storefront=storefront, app_id=app_id)
+    refreshed = False
+
+    while True:
+        params = {
+            'l': 'en-US',
+            'offset': offset,
+            'limit': PAGE_SIZE if stop is None else min(PAGE_SIZE, stop - offset),
+            'platform': 'web',
+            'additionalPlatforms': 'appletv,ipad,iphone,mac'
+        }
+        if mark:
+            params['sort'] = 'recent'
+
+        token = await tokens.get(storefront)
+        if not token:
+            print(f"[{app_id}/{storefront}] No StoreFront token available")
+            break
+
+        try:
+            response = await http_client.async_get(client, url, headers=build_headers(token, app_id, storefront),
+                                                   params=params)
+        except httpx.HTTPError as e:
+            print(f"[{app_id}/{storefront}] Error fetching offset {offset}: {e}")
+            break
+
+        # An expired or revoked token is refreshed once, then the page is retried
+        if response.status_code == 401 and not refreshed:
+            print(f"[{app_id}/{storefront}] Token rejected, refreshing...")
+            await tokens.refresh(storefront, token)
+            refreshed = True
+            continue
+
+        if response.status_code != 200:
+            print(f"[{app_id}/{storefront}] Offset {offset}: status code {response.status_code}")
+            break
+
+        refreshed = False
+        started = time.perf_counter()
+        data = response.json()
+        page = data.get('data') or []
+        if not page:
+            offset = None
+            break
+
+        parsed = []
+        for review in page:
+            try:
+                parsed.append(parse_storefront_review(review, app_id, storefront))
+            except KeyError as e:
+                print(f"[{app_id}/{storefront}] Skipping review due to missing key: {e}")
+        metrics.observe_stage('parse', time.perf_counter() - started, len(parsed), 'storefront')
+
+        fresh, reached_mark = sync_state.take_unseen(parsed, mark)
+        if fresh:
+            on_page(fresh)
+            count += len(fresh)
+            newest = sync_state.newest_review(fresh, newest)
+
+        # The API omits `next` on the last page
+        if reached_mark or 'next' not in data:
+            offset = None
+            break
+        offset += len(page)
+        if stop is not None and offset >= stop:
+            break
+
+    print(f"[{app_id}/{storefront}] Fetched {count} reviews")
+    return count, newest, offset
+
+
+async def crawl_reviews(targets, token=None, max_concurrency=MAX_CONCURRENCY, rate=None, client=None,
+                        incremental=False, on_page=None, tokens=None):
+    """
+    Crawl every review for each (app id, storefront) pair in `targets`.
+
+    With `incremental` only reviews newer than each pair's high-water mark
+    are fetched. Marks are advanced once a pair's crawl has finished, and
+    not at all if it stopped early on an error.
+
+    `rate` overrides the StoreFront host's starting requests per second.
+    Tokens come from the token cache unless `token` is given; pass `tokens`
+    to share one StorefrontTokens between concurrent crawls. Pass `client`
+    to reuse an async client opened by the caller; otherwise a pooled one is
+    opened for the duration of the crawl.
+
+    Returns a dict mapping each pair to its list of reviews. When `on_page`
+    is given, every page is passed to it instead of being kept in memory and
+    the dict maps each pair to its review count.
+    """
+    targets = list(dict.fromkeys((str(app_id), storefront.lower()) for app_id, storefront in targets))
+    if rate:
+        rate_limit.set_host_rate(urlparse(STOREFRONT_REVIEWS_URL).netloc, rate)
+    tokens = tokens or StorefrontTokens(token)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(client, app_id, storefront):
+        mark = sync_state.get_mark(SYNC_SOURCE, f"{app_id}/{storefront}") if incremental else None
+        reviews = []
+        async with semaphore:
+            count, newest, stopped_at = await crawl_app_reviews(client, tokens, app_id, storefront,
+                                                                on_page or reviews.extend, mark)
+        # A crawl cut short by an error keeps the old mark, so the next run fetches the gap again
+        if newest and stopped_at is None:
+            sync_state.update_mark(SYNC_SOURCE, f"{app_id}/{storefront}", [newest])
+        return count if on_page else reviews
+
+    if client is None:
+        async with http_client.create_async_client() as client:
+            results = await asyncio.gather(*(bounded(client, app_id, storefront) for app_id, storefront in targets))
+    else:
+        results = await asyncio.gather(*(bounded(client, app_id, storefront) for app_id, storefront in targets))
+
+    return dict(zip(targets, results))
+
+
+def run_crawl(targets, token=None, **kwargs):
+    """Synchronous entry point for callers outside an event loop"""
+    return asyncio.run(crawl_reviews(targets, token, **kwargs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl App Store reviews through the StoreFront API")
+    parser.add_argument('app_ids', nargs='+', help="Numeric App Store ids")
+    parser.add_argument('--storefronts', nargs='+', default=['us'], help="Storefront country codes")
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY)
+    parser.add_argument('--rate', type=float, help="Starting requests per second for the StoreFront API host")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only fetch reviews newer than the last run's high-water mark")
+    parser.add_argument('--output', default='storefront_reviews', help="Output file base name")
+    parser.add_argument('--formats', nargs='+', choices=sinks.FORMATS, default=['ndjson', 'csv'])
+    parser.add_argument('--store', action='store_true', help="Also append the reviews to the Parquet review store")
+    parser.add_argument('--index', action='store_true', help="Also add the reviews to the full-text search index")
+    args = parser.parse_args()
+
+    extra_sinks = []
+    if args.store:
+        from review_store import ReviewStore
+        extra_sinks.append(ReviewStore().sink())
+    if args.index:
+        from search_index import ReviewIndex
+        extra_sinks.append(ReviewIndex().sink())
+
+    targets = [(app_id, storefront) for app_id in args.app_ids for storefront in args.storefronts]
+    started = time.monotonic()
+    output_sink = sinks.open_sinks(args.output, args.formats, append=args.incremental, extra=extra_sinks)
+    with dedup.DedupSink(output_sink, dedup.open_output_index(args.output, args.incremental)) as sink:
+        results = run_crawl(targets, max_concurrency=args.concurrency, rate=args.rate,
+                            incremental=args.incremental, on_page=sink.write_batch)
+    total = sum(results.values())
+    print(f"Fetched {total} reviews for {len(targets)} app/storefront pairs in {time.monotonic() - started:.1f}s")
+    print(f"Wrote {sink.written} new reviews, dropped {sink.duplicates} duplicates")
+    print(f"Saved reviews to {args.output}.*")
+
+
+if __name__ == "__main__":
+    main()
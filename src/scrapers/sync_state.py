@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+High-water marks for incremental review syncs.
+
+For every (source, app) pair the newest review id and date seen so far are
+recorded, so the next run can page newest-first and stop as soon as it
+reaches reviews it already has.
+"""
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from paths import state_path
+
+HIGH_WATER_MARK_FILE = 'high_water_marks.json'
+
+_lock = threading.Lock()  # Jobs on several threads advance marks in the same file
+
+
+def parse_review_date(value):
+    """Parse a review date (datetime or ISO string) into an aware UTC datetime, or None"""
+    if isinstance(value, datetime):
+        parsed = value
+    elif value:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    else:
+        return None
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def load_marks():
+    try:
+        with open(state_path(HIGH_WATER_MARK_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_marks(marks):
+    path = state_path(HIGH_WATER_MARK_FILE)
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), prefix=f"{HIGH_WATER_MARK_FILE}.",
+                                     suffix='.tmp', delete=False) as f:
+        json.dump(marks, f, indent=2)
+    os.replace(f.name, path)
+
+
+def get_mark(source, app_key):
+    """Return the {'id', 'date'} mark recorded for the app, or None on a first sync"""
+    return load_marks().get(source, {}).get(str(app_key))
+
+
+def is_seen(review_id, review_date, mark):
+    """True if a review is the high-water mark itself or older than it"""
+    if not mark:
+        return False
+    if review_id is not None and str(review_id) == mark['id']:
+        return True
+    review_date = parse_review_date(review_date)
+    mark_date = parse_review_date(mark['date'])
+    return review_date is not None and mark_date is not None and review_date < mark_date
+
+
+def take_unseen(reviews, mark, id_key='id', date_key='date'):
+    """
+    Split a newest-first page at the high-water mark.
+
+    Returns the reviews newer than the mark and whether the mark was reached,
+    in which case paging can stop.
+    """
+    for index, review in enumerate(reviews):
+        if is_seen(review.get(id_key), review.get(date_key), mark):
+            return reviews[:index], True
+    return reviews, False
+
+
+def newest_review(reviews, current=None, date_key='date'):
+    """Return whichever of `current` and `reviews` has the latest date"""
+    newest, newest_date = current, parse_review_date(current.get(date_key)) if current else None
+    for review in reviews:
+        review_date = parse_review_date(review.get(date_key))
+        if review_date is not None and (newest_date is None or review_date > newest_date):
+            newest, newest_date = review, review_date
+    return newest
+
+
+def update_mark(source, app_key, reviews, id_key='id', date_key='date'):
+    """Advance the app's mark to the newest review in `reviews` if it is newer than the current one"""
+    dated = [(parse_review_date(review.get(date_key)), review) for review in reviews]
+    dated = [(date, review) for date, review in dated if date is not None]
+    if not dated:
+        return
+
+    newest_date, newest = max(dated, key=lambda item: item[0])
+    with _lock:
+        marks = load_marks()
+        current = marks.get(source, {}).get(str(app_key))
+        if current and parse_review_date(current['date']) >= newest_date:
+            return
+
+        marks.setdefault(source, {})[str(app_key)] = {
+            'id': str(newest.get(id_key)),
+            'date': newest_date.isoformat(),
+            'updated_at': datetime.now(timezone.utc).isoformat(),
+        }
+        save_marks(marks)
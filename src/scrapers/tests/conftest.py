@@ -0,0 +1,79 @@
+"""
+Shared fixtures for the scraper tests.
+
+Every test gets its own state and cache directories and fresh rate limit
+buckets, and talks to a local replay server instead of the real hosts.
+"""
+import os
+import random
+import sys
+
+import pytest
+
+SCRAPERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRAPERS_DIR)
+sys.path.insert(0, os.path.join(SCRAPERS_DIR, 'benchmarks'))
+
+import paths
+import rate_limit
+import replay
+
+TEST_RATE = 1000.0  # Requests per second; high enough that rate limiting never slows a test
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """Point the state and cache directories at the test's temporary directory"""
+    monkeypatch.setattr(paths, 'STATE_DIR', str(tmp_path / 'state'))
+    monkeypatch.setattr(paths, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(rate_limit, 'HOST_RATES', {})
+    monkeypatch.setattr(rate_limit, 'DEFAULT_RATE', TEST_RATE)
+    monkeypatch.setattr(rate_limit, '_buckets', {})
+    return tmp_path
+
+
+@pytest.fixture
+def rng():
+    return random.Random(0)
+
+
+@pytest.fixture
+def cassette():
+    return replay.Cassette()
+
+
+@pytest.fixture
+def server(cassette):
+    """
+    Replay server for `cassette` with every request routed through it. 429s
+    carry `Retry-After: 0`, so a throttled request is retried at once and a
+    test that turns throttling on fails within a handful of requests.
+    """
+    with replay.ReplayServer(cassette, retry_after=0, seed=0) as server, replay.replaying(server.url):
+        yield server
+
+
+class Throttler:
+    """Sink-like callback that starts throttling every request after `pages` pages"""
+
+    def __init__(self, server, pages=1):
+        self.server = server
+        self.pages = pages
+        self.rows = []
+
+    def write_batch(self, rows):
+        self.rows.extend(rows)
+        self.pages -= 1
+        if self.pages <= 0:
+            self.server.throttle_rate = 1.0
+
+    __call__ = write_batch
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def throttle_after(server):
+    """Factory for a Throttler on the test's replay server"""
+    return lambda pages=1: Throttler(server, pages)
@@ -0,0 +1,81 @@
+"""Incremental dashboard aggregates"""
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+import synthetic
+from google_play_scraper.exceptions import ExtraHTTPError
+
+import aggregates
+import analytics
+import googleplay_scraper
+
+PACKAGE_NAME = 'com.example.app'
+
+
+def storefront_reviews(count, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2025, 3, 1)
+    return [{
+        'id': str(n),
+        'title': synthetic._text(rng, 3),
+        'content': synthetic._text(rng, 30),
+        'rating': rng.randint(1, 5),
+        'author': f"user{n}",
+        'date': (start - timedelta(hours=7 * n)).isoformat(),
+        'version': rng.choice(['2.3.0', '2.3.1', '2.4.0']),
+        'source': 'StoreFront API (us)',
+    } for n in range(count)]
+
+
+def without_timestamp(dashboard):
+    return {key: value for key, value in dashboard.items() if key != 'generated'}
+
+
+def full_recompute(rows, platform):
+    return without_timestamp(analytics.build_dashboard(analytics.normalize(pd.DataFrame(rows)), platform, workers=1))
+
+
+def test_folded_pages_match_full_recompute():
+    rows = storefront_reviews(1000)
+    folded = aggregates.Aggregates('appstore')
+    for start in range(0, len(rows), 70):
+        folded.fold(rows[start:start + 70])
+
+    assert without_timestamp(folded.dashboard()) == full_recompute(rows, 'appstore')
+
+
+def test_merged_runs_match_full_recompute(tmp_path):
+    rows = storefront_reviews(600)
+    base = str(tmp_path / 'reviews')
+    for run, append in ((rows[:250], False), (rows[250:], True)):
+        with aggregates.AggregateSink(base, 'appstore', append=append) as sink:
+            sink.write_batch(run)
+
+    assert without_timestamp(aggregates.Aggregates.load(base).dashboard()) == full_recompute(rows, 'appstore')
+
+
+def test_resumed_play_crawl_keeps_aggregates_of_pages_before_the_crash(cassette, rng, server, throttle_after,
+                                                                       tmp_path):
+    synthetic.add_play(cassette, rng, PACKAGE_NAME, reviews=600, page_size=googleplay_scraper.PAGE_SIZE)
+    base = str(tmp_path / 'play_reviews')
+
+    def sync(extra=()):
+        sink = aggregates.AggregateSink(base, 'googleplay', resume=googleplay_scraper.resume_tag(PACKAGE_NAME))
+        return googleplay_scraper.sync_reviews(PACKAGE_NAME, formats=['ndjson'], output_file_base=base,
+                                               extra_sinks=[sink, *extra])
+
+    with pytest.raises(ExtraHTTPError):
+        sync([throttle_after(pages=2)])
+    # The crawl died after two pages: nothing is merged yet, the folded pages wait beside the checkpoint
+    assert not os.path.exists(aggregates.aggregate_paths(base)[0])
+
+    server.throttle_rate = 0.0
+    assert sync() == 600
+    with open(f"{base}.ndjson") as f:
+        rows = [json.loads(line) for line in f]
+    assert without_timestamp(aggregates.Aggregates.load(base).dashboard()) == full_recompute(rows, 'googleplay')
+    assert not [name for name in os.listdir(tmp_path) if '.checkpoint-' in name]
@@ -0,0 +1,42 @@
+"""Scroll loading: which driver errors stop the page and which reach the pool"""
+import pytest
+
+pytest.importorskip('selenium')
+from selenium.common.exceptions import InvalidSessionIdException, JavascriptException, WebDriverException
+
+import appstore_browser_scraper
+
+
+class FakeDriver:
+    """Page with `cards` review cards whose scroll script fails with `error`"""
+
+    def __init__(self, cards, error, alive=True):
+        self.cards = cards
+        self.error = error
+        self.alive = alive
+
+    def execute_script(self, script):
+        if 'readyState' in script:
+            return 'complete'
+        if 'scrollIntoView' in script:
+            raise self.error
+        if script == "return 1;" and not self.alive:
+            raise WebDriverException("chrome not reachable")
+        return self.cards
+
+    def find_elements(self, by, selector):
+        return [object()]
+
+
+def test_script_error_keeps_loaded_reviews():
+    driver = FakeDriver(5, JavascriptException("cards[cards.length - 1] is undefined"))
+    assert appstore_browser_scraper.scroll_to_load_reviews(driver) == 5
+
+
+@pytest.mark.parametrize('driver', [
+    FakeDriver(5, InvalidSessionIdException("invalid session id")),
+    FakeDriver(5, WebDriverException("disconnected"), alive=False),
+])
+def test_lost_session_reaches_the_pool(driver):
+    with pytest.raises(WebDriverException):
+        appstore_browser_scraper.scroll_to_load_reviews(driver)
@@ -0,0 +1,100 @@
+"""Review dedup index and the sink wrapper in front of the outputs"""
+import pytest
+
+import dedup
+
+
+class FailingSink:
+    def __init__(self, failures=1):
+        self.failures = failures
+        self.rows = []
+
+    def write_batch(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.rows.extend(rows)
+
+    def close(self):
+        pass
+
+
+def review(n):
+    return {'id': str(n), 'title': f"Review {n}"}
+
+
+def test_failed_write_is_not_marked_seen():
+    sink = FailingSink()
+    with pytest.raises(OSError):
+        with dedup.DedupSink(sink, dedup.open_output_index('out', incremental=True)) as dedup_sink:
+            dedup_sink.write_batch([review(1)])
+
+    with dedup.DedupSink(sink, dedup.open_output_index('out', incremental=True)) as dedup_sink:
+        dedup_sink.write_batch([review(1), review(1)])
+    assert sink.rows == [review(1)]
+    assert (dedup_sink.written, dedup_sink.duplicates) == (1, 1)
+
+
+def test_failed_write_can_be_retried_in_the_same_run():
+    sink = FailingSink()
+    dedup_sink = dedup.DedupSink(sink, dedup.DedupIndex())
+    with pytest.raises(OSError):
+        dedup_sink.write_batch([review(1), review(2)])
+    dedup_sink.write_batch([review(2), review(1)])
+    dedup_sink.write_batch([review(1)])
+
+    assert sink.rows == [review(2), review(1)]
+    assert (dedup_sink.written, dedup_sink.duplicates) == (2, 1)
+
+
+def test_duplicates_dropped_across_runs():
+    for run in range(2):
+        sink = FailingSink(failures=0)
+        with dedup.DedupSink(sink, dedup.open_output_index('out', incremental=True)) as dedup_sink:
+            dedup_sink.write_batch([review(n) for n in range(run * 5, run * 5 + 10)])
+        assert len(sink.rows) == (10 if run == 0 else 5)
+
+
+def test_same_review_from_rss_and_storefront_is_one_key():
+    rss = {'id': '123', 'author': 'a', 'source': 'RSS Feed (us)'}
+    storefront = {'id': '123', 'author': 'a', 'source': 'StoreFront API (us)'}
+    assert dedup.review_key(rss) == dedup.review_key(storefront)
+    assert dedup.review_key({'id': 'appstore_review_1', 'content': 'x'}).startswith('hash:')
+
+
+def test_in_memory_index_has_no_bloom_filter():
+    assert dedup.DedupIndex().bloom is None
+
+
+def test_bloom_filter_sized_from_the_index(tmp_path):
+    path = str(tmp_path / 'index.sqlite')
+    with dedup.DedupIndex(path) as index:
+        assert index.bloom.capacity == pytest.approx(dedup.BLOOM_MIN_ITEMS, rel=0.01)
+        assert len(index.bloom.bits) < 200_000
+
+    with dedup.DedupIndex(path) as index:
+        index.conn.executemany("INSERT INTO seen (key) VALUES (?)",
+                               ((dedup._digest(str(n)),) for n in range(dedup.BLOOM_MIN_ITEMS + 1)))
+        index.count = dedup.BLOOM_MIN_ITEMS + 1
+        index.filter_new([review('new')])
+        index.commit()
+        assert index.bloom.capacity >= index.count * dedup.BLOOM_GROWTH * 0.99
+        assert dedup._digest(str(0)) in index.bloom
+
+
+def test_bloom_false_positive_rate():
+    bloom = dedup.BloomFilter(10_000)
+    for n in range(10_000):
+        bloom.add(dedup._digest(f"seen{n}"))
+
+    assert all(dedup._digest(f"seen{n}") in bloom for n in range(10_000))
+    false_positives = sum(dedup._digest(f"new{n}") in bloom for n in range(10_000))
+    assert false_positives < 10_000 * dedup.BLOOM_FALSE_POSITIVE_RATE * 2
+
+
+def test_bloom_false_positive_still_new():
+    index = dedup.DedupIndex(bloom=False)
+    index.bloom = dedup.BloomFilter(8)
+    index.bloom.bits = bytearray(b'\xff' * len(index.bloom.bits))  # Every digest "may be seen"
+
+    assert index.filter_new([review(1)]) == [review(1)]
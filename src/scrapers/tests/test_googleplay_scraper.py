@@ -0,0 +1,47 @@
+"""A Play crawl that fails midway keeps its checkpoint and resumes from it"""
+import json
+
+import pytest
+import synthetic
+from google_play_scraper.exceptions import ExtraHTTPError
+
+import googleplay_scraper
+import sync_state
+
+PACKAGE_NAME = 'com.example.app'
+MARK_KEY = f"{PACKAGE_NAME}/{googleplay_scraper.LANG}/{googleplay_scraper.COUNTRY}"
+
+
+def read_checkpoint():
+    path = googleplay_scraper.checkpoint_path(PACKAGE_NAME, googleplay_scraper.LANG, googleplay_scraper.COUNTRY)
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_checkpoint_kept_after_failed_page_and_used_on_resume(cassette, rng, server, throttle_after, tmp_path):
+    synthetic.add_play(cassette, rng, PACKAGE_NAME, reviews=600, page_size=googleplay_scraper.PAGE_SIZE)
+    output = str(tmp_path / 'play_reviews')
+
+    with pytest.raises(ExtraHTTPError):
+        googleplay_scraper.sync_reviews(PACKAGE_NAME, incremental=True, formats=['ndjson'], output_file_base=output,
+                                        extra_sinks=[throttle_after(pages=1)])
+
+    checkpoint = read_checkpoint()
+    assert (checkpoint['token'], checkpoint['rows'], checkpoint['done']) == ('page1', 200, False)
+    assert sync_state.get_mark(googleplay_scraper.SYNC_SOURCE, MARK_KEY) is None
+
+    server.throttle_rate = 0.0
+    requests = server.requests
+    total = googleplay_scraper.sync_reviews(PACKAGE_NAME, incremental=True, formats=['ndjson'],
+                                            output_file_base=output)
+
+    # Only the two pages after the checkpoint are fetched again
+    assert total == 600
+    assert server.requests - requests == 2
+    assert server.misses == 0
+    with open(f"{output}.ndjson") as f:
+        ids = [json.loads(line)['reviewId'] for line in f]
+    assert ids == [f"gp:{PACKAGE_NAME}:{n:07d}" for n in range(600)]
+    assert sync_state.get_mark(googleplay_scraper.SYNC_SOURCE, MARK_KEY)['id'] == ids[0]
+    with pytest.raises(FileNotFoundError):
+        read_checkpoint()
@@ -0,0 +1,35 @@
+"""Batched iTunes lookups"""
+import synthetic
+
+import itunes_lookup
+
+
+def app_ids(count, first=1_000_000_000):
+    return [str(first + i) for i in range(count)]
+
+
+def test_lookup_batches_ids_and_drops_duplicates(cassette, server):
+    ids = app_ids(450)
+    synthetic.add_lookup(cassette, ids)
+
+    results = itunes_lookup.lookup_apps(ids + ids[:50])
+
+    assert sorted(results) == sorted(int(app_id) for app_id in ids)
+    assert results[int(ids[0])]['trackName'] == f"App {ids[0]}"
+    assert server.requests == 3
+
+
+def test_failed_chunk_keeps_other_chunks(cassette, server):
+    answered = app_ids(200)
+    synthetic.add_lookup(cassette, answered)
+
+    results = itunes_lookup.lookup_apps(answered + app_ids(10, first=2_000_000_000))
+
+    assert sorted(results) == sorted(int(app_id) for app_id in answered)
+
+
+def test_single_app_metadata(cassette, server):
+    synthetic.add_lookup(cassette, ['6499447981'])
+
+    assert itunes_lookup.fetch_app_metadata('6499447981')['trackId'] == 6499447981
+    assert itunes_lookup.fetch_app_metadata('1') == {}
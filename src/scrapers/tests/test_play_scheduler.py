@@ -0,0 +1,28 @@
+"""High-water marks of the Play scheduler"""
+import synthetic
+
+import play_scheduler
+import sync_state
+
+PACKAGE_NAME = 'com.example.app'
+
+
+def test_play_scheduler_mark_kept_after_failed_page(cassette, rng, server, throttle_after):
+    synthetic.add_play(cassette, rng, PACKAGE_NAME, reviews=600, page_size=play_scheduler.PAGE_SIZE)
+    throttler = throttle_after(pages=1)
+
+    counts = play_scheduler.crawl_many([(PACKAGE_NAME, 'en', 'us')], workers=1, worker_rate=1000,
+                                       incremental=True, on_page=throttler)
+
+    assert counts == {(PACKAGE_NAME, 'en', 'us'): 200}
+    assert sync_state.get_mark(play_scheduler.SYNC_SOURCE, f"{PACKAGE_NAME}/en/us") is None
+
+
+def test_play_scheduler_mark_advanced_after_full_crawl(cassette, rng, server):
+    synthetic.add_play(cassette, rng, PACKAGE_NAME, reviews=600, page_size=play_scheduler.PAGE_SIZE)
+
+    results = play_scheduler.crawl_many([(PACKAGE_NAME, 'en', 'us')], workers=1, worker_rate=1000, incremental=True)
+
+    assert len(results[(PACKAGE_NAME, 'en', 'us')]) == 600
+    mark = sync_state.get_mark(play_scheduler.SYNC_SOURCE, f"{PACKAGE_NAME}/en/us")
+    assert mark['id'] == f"gp:{PACKAGE_NAME}:0000000"
@@ -0,0 +1,68 @@
+"""AIMD token buckets and retries"""
+import time
+
+import httpx
+import pytest
+
+import rate_limit
+
+
+def test_bucket_rate_follows_aimd():
+    bucket = rate_limit.TokenBucket(4.0, min_rate=1.0, max_rate=4.2)
+
+    bucket.on_throttle()
+    assert bucket.rate == 2.0
+    for _ in range(100):
+        bucket.on_success()
+    assert bucket.rate == pytest.approx(4.2)
+    for _ in range(10):
+        bucket.on_throttle()
+    assert bucket.rate == 1.0
+
+
+def test_bucket_spaces_requests_and_honours_retry_after():
+    bucket = rate_limit.TokenBucket(100.0)
+    started = time.monotonic()
+    for _ in range(120):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.15  # A burst of 100, then 20 more at 100 rps
+
+    bucket.on_throttle(retry_after=0.2)
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.15
+
+
+def test_throttled_then_successful_request_retried(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'BACKOFF_BASE', 0.001)
+    answers = [httpx.Response(429, headers={'Retry-After': '0'}), httpx.Response(503), httpx.Response(200)]
+    bucket = rate_limit.TokenBucket(1000.0)
+
+    response = rate_limit.call_with_retry(lambda: answers.pop(0), 'https://example.com/', limiter=bucket)
+
+    assert response.status_code == 200
+    assert not answers
+    assert bucket.rate == pytest.approx(1000.0 / 4 + rate_limit.ADDITIVE_INCREASE)
+
+
+def test_retries_give_up_with_last_response(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'BACKOFF_BASE', 0.001)
+    calls = []
+
+    def send():
+        calls.append(1)
+        return httpx.Response(503)
+
+    assert rate_limit.call_with_retry(send, 'https://example.com/', max_retries=2).status_code == 503
+    assert len(calls) == 3
+
+
+def test_retry_exceptions_raised_after_last_attempt(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'BACKOFF_BASE', 0.001)
+
+    def send():
+        raise httpx.ConnectError("refused")
+
+    with pytest.raises(httpx.ConnectError):
+        rate_limit.call_with_retry(send, 'https://example.com/', retry_exceptions=(httpx.TransportError,),
+                                   max_retries=1)
@@ -0,0 +1,152 @@
+"""On-disk HTTP response cache"""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import http_client
+import response_cache
+
+LOOKUP_URL = 'https://itunes.apple.com/lookup'
+REVIEWS_URL = 'https://amp-api.apps.apple.com/v1/catalog/us/apps/1/reviews'
+TOKEN_PAGE_URL = 'https://apps.apple.com/us/app/id1'
+
+
+class Origin:
+    """Stand-in server: counts requests and answers 304 to a matching If-None-Match"""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if request.headers.get('If-None-Match') == '"v1"':
+            return httpx.Response(304, headers={'ETag': '"v1"'})
+        return httpx.Response(200, headers={'ETag': '"v1"'}, content=f"body of {request.url.path}".encode())
+
+
+class SyncTransport(httpx.BaseTransport):
+    def __init__(self, origin):
+        self.origin = origin
+
+    def handle_request(self, request):
+        return self.origin(request)
+
+
+class AsyncTransport(httpx.AsyncBaseTransport):
+    def __init__(self, origin):
+        self.origin = origin
+
+    async def handle_async_request(self, request):
+        return self.origin(request)
+
+
+@pytest.fixture
+def origin():
+    return Origin()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = response_cache.ResponseCache(str(tmp_path / 'http'))
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def client(origin, cache):
+    with httpx.Client(transport=response_cache.CachingTransport(SyncTransport(origin), cache)) as client:
+        yield client
+
+
+@pytest.fixture
+def shared_client(origin, cache, monkeypatch):
+    """http_client's own pool, with the network replaced by `origin`"""
+    monkeypatch.setattr(http_client, '_response_cache', cache)
+    monkeypatch.setattr(http_client, '_transport_wrapper', lambda transport: (
+        AsyncTransport(origin) if isinstance(transport, httpx.AsyncBaseTransport) else SyncTransport(origin)))
+    http_client.close()
+    yield http_client
+    http_client.close()
+
+
+@pytest.fixture
+def lookups(cache, monkeypatch):
+    """Threads each index lookup ran on"""
+    threads = []
+    lookup = cache._lookup
+
+    def spy(key):
+        threads.append(threading.current_thread())
+        return lookup(key)
+
+    monkeypatch.setattr(cache, '_lookup', spy)
+    return threads
+
+
+def test_key_ignores_query_order_but_not_language():
+    def key(url, language='en-US'):
+        return response_cache.request_key(httpx.Request('GET', url, headers={'Accept-Language': language}))
+
+    assert key(f"{LOOKUP_URL}?id=1&country=us") == key(f"{LOOKUP_URL}?country=us&id=1")
+    assert key(f"{LOOKUP_URL}?id=1") != key(f"{LOOKUP_URL}?id=1", language='de-DE')
+
+
+def test_fresh_response_served_locally(client, origin):
+    assert client.get(f"{LOOKUP_URL}?id=1").headers[response_cache.CACHE_STATUS_HEADER] == 'miss'
+    response = client.get(f"{LOOKUP_URL}?id=1")
+
+    assert response.headers[response_cache.CACHE_STATUS_HEADER] == 'hit'
+    assert response.text == 'body of /lookup'
+    assert len(origin.requests) == 1
+
+
+def test_stale_response_revalidated(client, origin):
+    # Review pages have a short TTL of their own; an expired copy is revalidated, not downloaded again
+    client.get(REVIEWS_URL)
+    client.get(REVIEWS_URL)
+    assert len(origin.requests) == 1
+
+    cache = client._transport.cache
+    cache.conn.execute("UPDATE entries SET expires = 0")
+    response = client.get(REVIEWS_URL)
+    assert response.headers[response_cache.CACHE_STATUS_HEADER] == 'revalidated'
+    assert response.text == f"body of {httpx.URL(REVIEWS_URL).path}"
+    assert origin.requests[-1].headers['If-None-Match'] == '"v1"'
+
+
+def test_no_cache_request_skips_fresh_copy(client, origin):
+    client.get(TOKEN_PAGE_URL)
+    response = client.get(TOKEN_PAGE_URL, headers={'Cache-Control': 'no-cache'})
+
+    assert len(origin.requests) == 2
+    assert response.headers[response_cache.CACHE_STATUS_HEADER] == 'revalidated'
+
+
+def test_shared_client_looks_each_request_up_once(shared_client, origin, lookups):
+    assert shared_client.get(f"{LOOKUP_URL}?id=1").headers[response_cache.CACHE_STATUS_HEADER] == 'miss'
+    assert len(lookups) == 1
+    assert shared_client.get(f"{LOOKUP_URL}?id=1").headers[response_cache.CACHE_STATUS_HEADER] == 'hit'
+    assert len(lookups) == 2
+    assert len(origin.requests) == 1
+
+
+def test_async_client_does_cache_io_off_the_event_loop(shared_client, origin, lookups, cache, monkeypatch):
+    writes = []
+    write_body = cache._write_body
+    monkeypatch.setattr(cache, '_write_body', lambda body: writes.append(threading.current_thread()) or write_body(body))
+
+    async def fetch_twice():
+        async with shared_client.create_async_client() as client:
+            first = await shared_client.async_get(client, f"{LOOKUP_URL}?id=2")
+            second = await shared_client.async_get(client, f"{LOOKUP_URL}?id=2")
+            return first, second, threading.current_thread()
+
+    first, second, loop_thread = asyncio.run(fetch_twice())
+
+    assert first.headers[response_cache.CACHE_STATUS_HEADER] == 'miss'
+    assert second.headers[response_cache.CACHE_STATUS_HEADER] == 'hit'
+    assert len(origin.requests) == 1
+    assert len(lookups) == 2 and len(writes) == 1
+    assert loop_thread not in lookups + writes
@@ -0,0 +1,51 @@
+"""One review schema for every scraper's record shape"""
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import review_schema
+
+RECORDS = [
+    # google-play-scraper's raw dict
+    {'reviewId': 'gp-1', 'userName': 'Ana', 'content': 'Great', 'score': 5, 'at': datetime(2025, 3, 1, 12, 0),
+     'reviewCreatedVersion': '2.3.1', 'replyContent': 'Thanks!'},
+    # RSS leaves the rating as a string and tags the storefront in the source label
+    {'id': '111', 'title': 'Meh', 'content': 'Okay', 'rating': '3', 'author': 'Bo',
+     'date': '2025-03-02T08:00:00-07:00', 'version': '2.3.0', 'source': 'RSS Feed (gb)'},
+    # appstore_final_scraper writes `review` instead of `content`, and the browser path a display date
+    {'id': '222', 'title': 'Nice', 'review': 'Fine app', 'rating': None, 'author': 'Cy',
+     'date': 'Mar 3, 2025', 'version': 'N/A', 'source': 'App Store Browser Automation'},
+    {'id': 'api_fallback_1', 'title': 'API Access Restricted', 'source': 'API Fallback'},
+]
+
+
+def test_records_of_every_shape_normalized():
+    frame = review_schema.normalize_batch(RECORDS, app_id='6499447981')
+
+    assert dict(frame.dtypes.map(str)) == {name: str(pd.Series(dtype=dtype).dtype)
+                                           for name, dtype in review_schema.DTYPES.items()}
+    assert list(frame['id']) == ['gp-1', '111', '222']
+    assert list(frame['source']) == ['googleplay', 'rss', 'browser']
+    assert list(frame['storefront'].astype(object).fillna('')) == ['', 'gb', '']
+    assert list(frame['content']) == ['Great', 'Okay', 'Fine app']
+    assert list(frame['rating']) == [5, 3, review_schema.MISSING_RATING]
+    assert list(frame['replied']) == [True, False, False]
+    assert list(frame['version'].astype(object).fillna('')) == ['2.3.1', '2.3.0', '']
+    assert list(frame['date']) == [
+        datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc),
+        datetime(2025, 3, 2, 15, 0, tzinfo=timezone.utc),
+        datetime(2025, 3, 3, tzinfo=timezone.utc),
+    ]
+    assert set(frame['app_id']) == {'6499447981'}
+
+
+def test_frame_and_records_normalize_alike():
+    pd.testing.assert_frame_equal(review_schema.normalize_batch(pd.DataFrame(RECORDS)),
+                                  review_schema.normalize_batch(RECORDS))
+
+
+def test_placeholder_batch_is_empty_but_typed():
+    frame = review_schema.normalize_batch(RECORDS[-1:])
+
+    assert frame.empty
+    assert list(frame.columns) == list(review_schema.DTYPES)
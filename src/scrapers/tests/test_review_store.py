@@ -0,0 +1,48 @@
+"""Partitioned review store: appends, partition pruning and compaction"""
+import glob
+import os
+from datetime import date
+
+import pyarrow.dataset as ds
+
+import review_schema
+import review_store
+
+
+def reviews(ids, day, source='RSS Feed (us)'):
+    return [{'id': str(n), 'title': f"Review {n}", 'content': 'Text', 'rating': str(n % 5 + 1), 'author': f"user{n}",
+             'date': f"{day}T10:00:00Z", 'version': '2.3.1', 'source': source} for n in ids]
+
+
+def parquet_files(root):
+    return glob.glob(os.path.join(root, '**', '*.parquet'), recursive=True)
+
+
+def test_appends_partitioned_by_source_app_and_day(tmp_path):
+    store = review_store.ReviewStore(str(tmp_path / 'store'))
+    with store.sink(app_id='42') as sink:
+        sink.write_batch(reviews(range(3), '2025-03-01'))
+        sink.write_batch(reviews(range(3, 5), '2025-03-02'))
+
+    assert {os.path.relpath(os.path.dirname(path), store.root) for path in parquet_files(store.root)} == {
+        os.path.join('source=rss', 'app_id=42', 'day=2025-03-01'),
+        os.path.join('source=rss', 'app_id=42', 'day=2025-03-02'),
+    }
+    table = store.read(['id', 'rating'], ds.field('day') == date(2025, 3, 2))
+    assert sorted(table.column('id').to_pylist()) == ['3', '4']
+    assert str(table.schema.field('rating').type) == 'int8'
+
+
+def test_compaction_merges_files_and_keeps_last_copy(tmp_path):
+    store = review_store.ReviewStore(str(tmp_path / 'store'))
+    store.append(review_schema.normalize_batch(reviews(range(4), '2025-03-01'), app_id='42'))
+    edited = reviews([1], '2025-03-01')
+    edited[0]['title'] = 'Edited'
+    store.append(review_schema.normalize_batch(edited + reviews([4], '2025-03-01'), app_id='42'))
+
+    assert store.compact() == 1
+    assert len(parquet_files(store.root)) == 1
+    rows = {row['id']: row for row in store.read().to_pylist()}
+    assert sorted(rows) == ['0', '1', '2', '3', '4']
+    assert rows['1']['title'] == 'Edited'
+    assert store.compact() == 0
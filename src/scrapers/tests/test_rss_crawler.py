@@ -0,0 +1,26 @@
+"""High-water marks of the RSS fan-out"""
+import synthetic
+
+import rss_crawler
+import sync_state
+
+APP_ID = '1234567890'
+
+
+def test_rss_mark_kept_after_failed_page(cassette, rng, server, throttle_after):
+    synthetic.add_rss(cassette, rng, APP_ID, ['us'], storefronts=['us'], pages=3, per_page=10)
+    throttler = throttle_after(pages=1)
+
+    counts = rss_crawler.run_crawl(APP_ID, storefronts=['us'], rate=1000, incremental=True, on_page=throttler)
+
+    assert counts == {'us': 10}
+    assert sync_state.get_mark(rss_crawler.SYNC_SOURCE, f"{APP_ID}/us") is None
+
+
+def test_rss_mark_advanced_after_full_crawl(cassette, rng, server):
+    synthetic.add_rss(cassette, rng, APP_ID, ['us'], storefronts=['us'], pages=3, per_page=10)
+
+    results = rss_crawler.run_crawl(APP_ID, storefronts=['us'], rate=1000, incremental=True)
+
+    assert len(results['us']) == 30
+    assert sync_state.get_mark(rss_crawler.SYNC_SOURCE, f"{APP_ID}/us")['id'] == f"us{APP_ID}000000"
@@ -0,0 +1,49 @@
+"""Full-text review search: upserts, queries and filters"""
+import pytest
+
+import search_index
+
+APP_STORE = [
+    {'id': '1', 'title': 'Crashes on login', 'content': 'The app crashed twice today', 'rating': '1',
+     'author': 'ana', 'date': '2025-03-01T10:00:00Z', 'version': '2.3.0', 'source': 'RSS Feed (us)'},
+    {'id': '2', 'title': 'Love it', 'content': 'Booking a gym class is quick', 'rating': '5',
+     'author': 'bo', 'date': '2025-03-05T10:00:00Z', 'version': '2.3.1', 'source': 'RSS Feed (gb)'},
+]
+PLAY = [
+    {'reviewId': 'gp-1', 'userName': 'cy', 'content': 'Keeps crashing when I open the gym class list', 'score': 2,
+     'at': '2025-03-03T10:00:00Z', 'reviewCreatedVersion': '2.3.1'},
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    with search_index.ReviewIndex(str(tmp_path / 'index.sqlite')) as index:
+        index.upsert(APP_STORE, app_id='42')
+        index.upsert(PLAY, app_id='com.example.app')
+        yield index
+
+
+def test_query_matches_stems_and_filters(index):
+    assert {row['key'] for row in index.search('crash*')} == {'appstore:1', 'googleplay:gp-1'}
+    assert [row['key'] for row in index.search('crash*', platform='googleplay')] == ['googleplay:gp-1']
+    assert [row['key'] for row in index.search('crash*', since='2025-03-02')] == ['googleplay:gp-1']
+    assert [row['key'] for row in index.search('"gym class"', max_rating=3)] == ['googleplay:gp-1']
+    assert [row['key'] for row in index.search(order='date', until='2025-03-03')] == ['googleplay:gp-1',
+                                                                                       'appstore:1']
+    assert '[crash' in index.search('crash*', platform='appstore')[0]['snippet'].lower()
+
+
+def test_counts_grouped(index):
+    assert index.count('gym') == 2
+    assert index.count(group_by='version') == {'2.3.1': 2, '2.3.0': 1}
+    with pytest.raises(ValueError):
+        index.count(group_by='author')
+
+
+def test_upsert_updates_rows_and_their_index_entries(index):
+    edited = dict(APP_STORE[0], title='Fixed now', content='No more problems')
+    index.upsert([edited], app_id='42')
+
+    assert len(index) == 3
+    assert [row['key'] for row in index.search('crash*')] == ['googleplay:gp-1']
+    assert [row['title'] for row in index.search('problems')] == ['Fixed now']
@@ -0,0 +1,101 @@
+"""Shard leases: expiry, re-leasing and completion"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import rate_limit
+import shard_coordinator
+
+APP_ID = '1234567890'
+
+
+@pytest.fixture
+def table(tmp_path):
+    with shard_coordinator.ShardTable(str(tmp_path / 'shards.sqlite'), lease_seconds=0.05) as table:
+        table.plan(APP_ID, 'us', estimate=shard_coordinator.SHARD_SIZE)
+        yield table
+
+
+def test_expired_lease_is_leased_again(table):
+    first = table.lease('worker-1')
+    assert table.lease('worker-2') is None
+    time.sleep(0.1)
+
+    second = table.lease('worker-2')
+    assert second['shard'] == first['shard']
+    assert second['lease'] != first['lease']
+    assert not table.renew(first['shard'], first['lease'])
+    assert table.renew(second['shard'], second['lease'])
+
+
+def test_complete_requires_the_current_lease(table):
+    first = table.lease('worker-1')
+    time.sleep(0.1)
+    second = table.lease('worker-2')
+
+    assert not table.complete(first['shard'], first['lease'], [{'id': 'stale'}], None)
+    assert table.complete(second['shard'], second['lease'], [{'id': 'fresh'}], None)
+    assert table.status()['reviews'] == 1
+
+
+def test_complete_is_idempotent(table):
+    shard = table.lease('worker-1')
+
+    assert table.complete(shard['shard'], shard['lease'], [{'id': 'a'}, {'id': 'b'}], None)
+    assert not table.complete(shard['shard'], shard['lease'], [{'id': 'a'}, {'id': 'b'}, {'id': 'c'}], None)
+    assert table.status() == {'shards': {'done': 1}, 'reviews': 2, 'remaining': 0}
+
+
+def test_failed_shard_goes_back_to_the_queue(table):
+    shard = table.lease('worker-1')
+    table.fail(shard['shard'], 'not-the-lease', 'ignored')
+    assert table.status()['shards'] == {'leased': 1}
+
+    table.fail(shard['shard'], shard['lease'], 'stopped at offset 10')
+    again = table.lease('worker-2')
+    assert again['shard'] == shard['shard']
+
+
+class UnreachableCoordinator:
+    def __init__(self):
+        self.calls = []
+
+    async def call(self, path, **payload):
+        self.calls.append(path)
+        raise httpx.ConnectError("coordinator unreachable")
+
+
+def test_coordinator_calls_retried(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'BACKOFF_BASE', 0.001)
+    answers = [httpx.ConnectError("refused"), httpx.Response(503), httpx.Response(200, json={'renewed': True})]
+
+    def respond(request):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    async def renew():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(respond)) as rpc:
+            return await shard_coordinator.CoordinatorClient('http://coordinator', rpc).call('/renew', shard=1, lease='x')
+
+    assert asyncio.run(renew()) == {'renewed': True}
+    assert not answers
+
+
+def test_unreachable_coordinator_only_loses_the_shard(table, monkeypatch):
+    async def crawl_app_reviews(client, tokens, app_id, storefront, on_page, offset=0, stop=None):
+        on_page([{'id': 'a'}])
+        return 1, None, None
+
+    monkeypatch.setattr(shard_coordinator.storefront_crawler, 'crawl_app_reviews', crawl_app_reviews)
+    coordinator = UnreachableCoordinator()
+    shard = table.lease('worker-1')
+
+    assert asyncio.run(shard_coordinator.work_shard(coordinator, None, None, shard)) == 0
+    assert coordinator.calls == ['/complete']
+    # The lease runs out and the shard goes to the next worker
+    time.sleep(0.1)
+    assert table.lease('worker-2')['shard'] == shard['shard']
@@ -0,0 +1,22 @@
+"""Output sinks"""
+from datetime import datetime
+
+import pyarrow.parquet as pq
+
+import sinks
+
+
+def test_parquet_column_empty_in_first_row_group(tmp_path):
+    path = str(tmp_path / 'reviews.parquet')
+    sink = sinks.ParquetSink(path, row_group_size=2)
+    sink.write_batch([{'reviewId': 'a', 'score': 5, 'replyContent': None, 'repliedAt': None},
+                      {'reviewId': 'b', 'score': 4, 'replyContent': None, 'repliedAt': None}])
+    sink.write_batch([{'reviewId': 'c', 'score': 1, 'replyContent': 'Thanks', 'repliedAt': datetime(2025, 3, 1)},
+                      {'reviewId': 'd', 'replyContent': None}])
+    sink.close()
+
+    table = pq.read_table(path)
+    assert table.num_rows == 4
+    assert table.column('replyContent').to_pylist() == [None, None, 'Thanks', None]
+    assert table.column('repliedAt').to_pylist() == [None, None, '2025-03-01T00:00:00', None]
+    assert table.column('score').to_pylist() == [5, 4, 1, None]
@@ -0,0 +1,28 @@
+"""High-water marks of StoreFront crawls"""
+import synthetic
+
+import storefront_crawler
+import sync_state
+
+APP_ID = '1234567890'
+
+
+def test_storefront_mark_kept_after_failed_page(cassette, rng, server, throttle_after):
+    synthetic.add_storefront(cassette, rng, APP_ID, 'us', reviews=3 * storefront_crawler.PAGE_SIZE)
+    throttler = throttle_after(pages=1)
+
+    counts = storefront_crawler.run_crawl([(APP_ID, 'us')], token='token', incremental=True, on_page=throttler)
+
+    assert counts == {(APP_ID, 'us'): storefront_crawler.PAGE_SIZE}
+    assert server.throttled
+    assert sync_state.get_mark(storefront_crawler.SYNC_SOURCE, f"{APP_ID}/us") is None
+
+
+def test_storefront_mark_advanced_after_full_crawl(cassette, rng, server):
+    synthetic.add_storefront(cassette, rng, APP_ID, 'us', reviews=3 * storefront_crawler.PAGE_SIZE)
+
+    results = storefront_crawler.run_crawl([(APP_ID, 'us')], token='token', incremental=True)
+
+    assert len(results[(APP_ID, 'us')]) == 3 * storefront_crawler.PAGE_SIZE
+    mark = sync_state.get_mark(storefront_crawler.SYNC_SOURCE, f"{APP_ID}/us")
+    assert mark['id'] == f"{APP_ID}us0000000"
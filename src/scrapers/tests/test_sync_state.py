@@ -0,0 +1,29 @@
+"""High-water marks"""
+from concurrent.futures import ThreadPoolExecutor
+
+import sync_state
+
+
+def test_take_unseen_stops_at_the_mark():
+    page = [{'id': '3', 'date': '2025-03-03'}, {'id': '2', 'date': '2025-03-02'}, {'id': '1', 'date': '2025-03-01'}]
+    mark = {'id': '2', 'date': '2025-03-02T00:00:00+00:00'}
+
+    assert sync_state.take_unseen(page, mark) == (page[:1], True)
+    assert sync_state.take_unseen(page, None) == (page, False)
+
+
+def test_mark_only_moves_forward():
+    sync_state.update_mark('rss', 'app', [{'id': '2', 'date': '2025-03-02'}])
+    sync_state.update_mark('rss', 'app', [{'id': '1', 'date': '2025-03-01'}])
+
+    assert sync_state.get_mark('rss', 'app')['id'] == '2'
+
+
+def test_concurrent_updates_keep_every_mark():
+    def update(n):
+        sync_state.update_mark('googleplay', f"app{n}", [{'id': str(n), 'date': '2025-03-01'}])
+
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        list(executor.map(update, range(32)))
+
+    assert all(sync_state.get_mark('googleplay', f"app{n}")['id'] == str(n) for n in range(32))
@@ -0,0 +1,53 @@
+"""StoreFront bearer token cache"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import synthetic
+
+import token_cache
+
+STOREFRONTS = [f"s{n:02d}" for n in range(60)]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(token_cache, '_tokens', None)
+
+
+@pytest.fixture
+def token(cassette):
+    token = synthetic.fake_token()
+    synthetic.add_app_pages(cassette, [f"https://apps.apple.com/{storefront}/app/id{token_cache.TOKEN_PAGE_APP_ID}"
+                                       for storefront in STOREFRONTS], token)
+    return token
+
+
+def test_token_expiry_decoded_from_jwt():
+    expires_at = token_cache.decode_token_expiry(synthetic.fake_token(lifetime_days=1))
+    assert expires_at == pytest.approx(time.time() + 86400, abs=5)
+    assert token_cache.decode_token_expiry('not-a-jwt') is None
+
+
+def test_token_served_from_cache_until_invalidated(server, token, monkeypatch):
+    assert token_cache.get_token('s00') == token
+    assert token_cache.get_token('s00') == token
+    assert server.requests == 1
+
+    # A later process reads the token back from disk
+    monkeypatch.setattr(token_cache, '_tokens', None)
+    assert token_cache.get_token_expiry('s00') == token_cache.decode_token_expiry(token)
+
+    token_cache.invalidate('s00')
+    assert token_cache.get_token_expiry('s00') is None
+    assert token_cache.get_token('s00') == token
+    assert server.requests == 2
+
+
+def test_concurrent_refreshes_of_many_storefronts(server, token, monkeypatch):
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        tokens = list(executor.map(token_cache.get_token, STOREFRONTS))
+
+    assert tokens == [token] * len(STOREFRONTS)
+    monkeypatch.setattr(token_cache, '_tokens', None)
+    assert all(token_cache.get_token_expiry(storefront) for storefront in STOREFRONTS)
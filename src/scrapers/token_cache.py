@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+On-disk cache for the StoreFront (media-api) bearer token.
+
+The token is scraped from an App Store web page, is the same for every app
+and stays valid for months, so it is cached per storefront together with
+the expiry decoded from its JWT `exp` claim and only re-scraped shortly
+before it expires or after the API rejects it with a 401.
+"""
+import base64
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+import http_client
+from paths import cache_path
+
+TOKEN_CACHE_FILE = 'storefront_tokens.json'
+REFRESH_MARGIN = 3600  # Refresh this many seconds before the token expires
+DEFAULT_TTL = 12 * 3600  # Used when the token carries no readable `exp` claim
+TOKEN_PAGE_APP_ID = '375380948'  # Any app page embeds the token; this is Apple's own Apple Store app
+
+TOKEN_PATTERNS = [
+    r'token%22%3A%22([^%]+)%22',
+    r'"token":"([^"]+)"',
+]
+
+_tokens = None
+_lock = threading.Lock()  # Crawls refresh storefronts on several threads at once
+
+
+def decode_token_expiry(token):
+    """Return the JWT `exp` claim as a Unix timestamp, or None if it can't be read"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims['exp'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _load():
+    global _tokens
+    if _tokens is None:
+        try:
+            with open(cache_path(TOKEN_CACHE_FILE)) as f:
+                _tokens = json.load(f)
+        except (OSError, ValueError):
+            _tokens = {}
+    return _tokens
+
+
+def _save():
+    """Write the tokens; call with _lock held"""
+    path = cache_path(TOKEN_CACHE_FILE)
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), prefix=f"{TOKEN_CACHE_FILE}.",
+                                     suffix='.tmp', delete=False) as f:
+        json.dump(_tokens, f, indent=2)
+    os.replace(f.name, path)
+
+
+def scrape_token(storefront='us', app_id=TOKEN_PAGE_APP_ID):
+    """Download an App Store page and extract the media-api token embedded in it"""
+    url = f"https://apps.apple.com/{storefront}/app/id{app_id}"
+    headers = {
+        'Accept': 'text/html,application/xhtml+xml,application/xml',
+        'Accept-Language': 'en-US,en;q=0.9',
+        # Only called when the cached token is missing, expiring or rejected: the page must be the current one
+        'Cache-Control': 'no-cache',
+    }
+
+    try:
+        print(f"Getting App Store page to extract token ({storefront})...")
+        response = http_client.get(url, headers=headers)
+        response.raise_for_status()
+    except Exception as e:
+        print(f"Error getting token: {e}")
+        return None
+
+    for pattern in TOKEN_PATTERNS:
+        match = re.search(pattern, response.text)
+        if match:
+            token = match.group(1)
+            print(f"Found token: {token[:10]}...{token[-10:]}")
+            return token
+
+    print("Could not extract token from App Store page")
+    return None
+
+
+def get_token(storefront='us', app_id=TOKEN_PAGE_APP_ID, force_refresh=False):
+    """
+    Return a valid bearer token for the storefront.
+
+    Serves the cached token until it is within REFRESH_MARGIN of expiry, then
+    scrapes a fresh one from the App Store page of `app_id`.
+    """
+    with _lock:
+        entry = _load().get(storefront)
+    if entry and not force_refresh and entry['expires_at'] - REFRESH_MARGIN > time.time():
+        return entry['token']
+
+    # The page is fetched outside the lock so other storefronts aren't held up behind it
+    token = scrape_token(storefront, app_id)
+    if not token:
+        return None
+
+    with _lock:
+        _load()[storefront] = {
+            'token': token,
+            'expires_at': decode_token_expiry(token) or time.time() + DEFAULT_TTL,
+            'fetched_at': time.time(),
+        }
+        _save()
+    return token
+
+
+def get_token_expiry(storefront='us'):
+    """Return the cached expiry timestamp for the storefront, or None if nothing is cached"""
+    with _lock:
+        entry = _load().get(storefront)
+    return entry['expires_at'] if entry else None
+
+
+def invalidate(storefront='us'):
+    """Drop the cached token, e.g. after the API answered 401"""
+    with _lock:
+        if _load().pop(storefront, None) is not None:
+            _save()